@@ -0,0 +1,49 @@
+"""add table blog_views
+
+Revision ID: 65857ac8ab83
+Revises: 5739f080fdc9
+Create Date: 2026-10-19 10:00:12.418305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "65857ac8ab83"
+down_revision: Union[str, None] = "5739f080fdc9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blog_views",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("blog_id", sa.Integer(), nullable=False),
+        sa.Column("views", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["blog_id"], ["blogs.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("blog_id"),
+    )
+    op.create_index(op.f("ix_blog_views_views"), "blog_views", ["views"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_blog_views_views"), table_name="blog_views")
+    op.drop_table("blog_views")
@@ -0,0 +1,29 @@
+"""add users list indexes
+
+Revision ID: 3b9d2c7e41a6
+Revises: f7da83e3c99e
+Create Date: 2026-10-19 12:00:12.408317
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3b9d2c7e41a6"
+down_revision: Union[str, None] = "f7da83e3c99e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_users_role_id_id", "users", ["role_id", "id"], unique=False)
+    op.create_index("ix_users_created_at_id", "users", ["created_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_created_at_id", table_name="users")
+    op.drop_index("ix_users_role_id_id", table_name="users")
@@ -0,0 +1,63 @@
+"""add table tag stats
+
+Revision ID: a6f3e9d2b871
+Revises: d42a7b6f1c90
+Create Date: 2026-10-19 15:00:48.730215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a6f3e9d2b871"
+down_revision: Union[str, None] = "d42a7b6f1c90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tag_stats",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "published_count", sa.Integer(), server_default=sa.text("0"), nullable=False
+        ),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("tag_id"),
+    )
+    op.create_index(
+        op.f("ix_tag_stats_published_count"), "tag_stats", ["published_count"], unique=False
+    )
+    # Начальные значения по существующим блогам
+    op.execute(
+        """
+        INSERT INTO tag_stats (tag_id, published_count)
+        SELECT blog_tags.tag_id, count(*)
+        FROM blog_tags JOIN blogs ON blogs.id = blog_tags.blog_id
+        WHERE blogs.status = 'published'
+        GROUP BY blog_tags.tag_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_tag_stats_published_count"), table_name="tag_stats")
+    op.drop_table("tag_stats")
@@ -0,0 +1,102 @@
+"""compress blog content
+
+Revision ID: 5e2b8d4f7a13
+Revises: a6f3e9d2b871
+Create Date: 2026-10-19 16:00:12.417093
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from core.models.types import content_codec
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e2b8d4f7a13"
+down_revision: Union[str, None] = "a6f3e9d2b871"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _convert(connection, where: str, convert, **params) -> int:
+    """Переписывает content подходящих блогов пачками по id."""
+    last_id, total = 0, 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                f"SELECT id, content FROM blogs WHERE id > :last_id AND {where} "
+                "ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": content_codec.config.batch_size, **params},
+        ).all()
+        if not rows:
+            return total
+        connection.execute(
+            sa.text("UPDATE blogs SET content = :content WHERE id = :id"),
+            [{"id": row.id, "content": convert(row.content)} for row in rows],
+        )
+        last_id = rows[-1].id
+        total += len(rows)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "content_dictionaries",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("codec", sa.String(length=10), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    if not content_codec.config.enabled:
+        return
+    connection = op.get_bind()
+    threshold = content_codec.config.threshold
+
+    # Словарь обучается на последних длинных текстах
+    samples = connection.execute(
+        sa.text(
+            "SELECT content FROM blogs WHERE typeof(content) = 'text' "
+            "AND length(CAST(content AS BLOB)) >= :threshold ORDER BY id DESC LIMIT :limit"
+        ),
+        {"threshold": threshold, "limit": content_codec.config.dictionary_samples},
+    ).scalars().all()
+    dictionary = content_codec.train_dictionary([sample.encode() for sample in samples])
+    if dictionary is not None:
+        dictionary_id = connection.execute(
+            sa.text(
+                "INSERT INTO content_dictionaries (codec, data) VALUES (:codec, :data) "
+                "RETURNING id"
+            ),
+            {"codec": content_codec.codec, "data": dictionary},
+        ).scalar_one()
+        content_codec.register(dictionary_id, content_codec.codec, dictionary)
+
+    _convert(
+        connection,
+        "typeof(content) = 'text' AND length(CAST(content AS BLOB)) >= :threshold",
+        content_codec.encode,
+        threshold=threshold,
+    )
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    for row in connection.execute(sa.text("SELECT id, codec, data FROM content_dictionaries")):
+        content_codec.register(row.id, row.codec, row.data)
+    _convert(connection, "typeof(content) = 'blob'", content_codec.decode)
+    op.drop_table("content_dictionaries")
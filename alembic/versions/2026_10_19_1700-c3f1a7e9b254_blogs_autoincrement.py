@@ -0,0 +1,35 @@
+"""blogs autoincrement
+
+Revision ID: c3f1a7e9b254
+Revises: 5e2b8d4f7a13
+Create Date: 2026-10-19 17:00:21.584310
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c3f1a7e9b254"
+down_revision: Union[str, None] = "5e2b8d4f7a13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Без AUTOINCREMENT SQLite выдаёт новому блогу id удалённого последним,
+    # а он может быть занят блогом в архиве (core.archive). Включить его
+    # можно только пересозданием таблицы; sqlite_sequence получает max(id).
+    with op.batch_alter_table(
+        "blogs", recreate="always", table_kwargs={"sqlite_autoincrement": True}
+    ):
+        pass
+
+
+def downgrade() -> None:
+    with op.batch_alter_table(
+        "blogs", recreate="always", table_kwargs={"sqlite_autoincrement": False}
+    ):
+        pass
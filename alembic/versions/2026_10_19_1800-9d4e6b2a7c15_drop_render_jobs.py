@@ -0,0 +1,28 @@
+"""drop render jobs
+
+Revision ID: 9d4e6b2a7c15
+Revises: c3f1a7e9b254
+Create Date: 2026-10-19 18:00:07.318442
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4e6b2a7c15"
+down_revision: Union[str, None] = "c3f1a7e9b254"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Рендер и сброс HTML блогов теперь идут по журналу изменений в каждом
+    # воркере (pages.render): такие задачи больше никто не захватит
+    op.execute("DELETE FROM jobs WHERE job_type IN ('blog.render', 'blog.purge')")
+
+
+def downgrade() -> None:
+    pass
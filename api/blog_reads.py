@@ -0,0 +1,34 @@
+from core.changes import change_feed, BlogChangeEvent
+from core.models.db_helper import db_helper
+from core.replica import read_replica
+from core.singleflight import SingleFlight
+from .crud import check_blog_access, load_full_blog
+
+blog_reads = SingleFlight("Чтение блогов")
+
+
+async def get_full_blog_info_shared(blog_id: int, author_id: int | None = None):
+    """
+    get_full_blog_info с объединением одновременных чтений одного блога.
+    Блог читается один раз без учёта прав, доступ к черновику проверяется
+    для каждого вызова отдельно.
+    """
+
+    async def load():
+        if read_replica.fresh():
+            async with read_replica.session_factory() as session:
+                blog = await load_full_blog(session=session, blog_id=blog_id)
+            if blog is not None:
+                return blog
+        # черновиков и только что созданных блогов в копии нет
+        async with db_helper.session_factory() as session:
+            return await load_full_blog(session=session, blog_id=blog_id)
+
+    blog = await blog_reads.do(blog_id, load)
+    return check_blog_access(blog, blog_id=blog_id, author_id=author_id)
+
+
+@change_feed.subscribe
+def forget_changed_blogs(events: list[BlogChangeEvent]) -> None:
+    for event in events:
+        blog_reads.forget(event.blog_id)
@@ -0,0 +1,104 @@
+import asyncio
+from contextlib import suppress
+from logging import getLogger
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from core.config import settings, ViewCounterConfig
+from core.models.base import Blog, BlogViews
+from core.models.db_helper import db_helper
+
+logger = getLogger(__name__)
+
+# id попадает в запрос дважды (CASE и IN), держимся ниже лимита переменных SQLite
+FLUSH_CHUNK_SIZE = 5000
+
+
+class ViewCounter:
+    """
+    Счётчик просмотров с отложенной записью.
+    Просмотры копятся в памяти воркера и сбрасываются в blog_views одним
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE: по таймеру, при достижении
+    порога и при остановке приложения. В БД прибавляется дельта, поэтому
+    несколько воркеров не затирают просмотры друг друга.
+    """
+
+    def __init__(self, config: ViewCounterConfig):
+        self.config = config
+        self._pending: dict[int, int] = {}
+        self._pending_total = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._threshold_flush: asyncio.Task | None = None
+
+    def hit(self, blog_id: int) -> None:
+        if not self.config.enabled:
+            return
+        self._pending[blog_id] = self._pending.get(blog_id, 0) + 1
+        self._pending_total += 1
+        if self._pending_total >= self.config.flush_threshold and (
+            self._threshold_flush is None or self._threshold_flush.done()
+        ):
+            self._threshold_flush = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self._pending_total = 0
+
+            items = list(batch.items())
+            try:
+                async with db_helper.session_factory() as session:
+                    for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+                        chunk = dict(items[start:start + FLUSH_CHUNK_SIZE])
+                        await session.execute(self._upsert_statement(chunk))
+                    await session.commit()
+            except Exception as e:
+                # Возвращаем просмотры в буфер, чтобы не потерять их до следующего сброса
+                for blog_id, views in batch.items():
+                    self._pending[blog_id] = self._pending.get(blog_id, 0) + views
+                    self._pending_total += views
+                logger.error("Ошибка при сохранении просмотров: %s" % e)
+                return
+            logger.info("Сохранены просмотры для %s блогов" % len(batch))
+
+    @staticmethod
+    def _upsert_statement(chunk: dict[int, int]):
+        # Только существующие блоги: удалённый за время буферизации блог пропускается
+        increments = case(chunk, value=Blog.id)
+        stmt = insert(BlogViews).from_select(
+            ["blog_id", "views"],
+            select(Blog.id, increments).where(Blog.id.in_(chunk)),
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=[BlogViews.blog_id],
+            set_={
+                "views": BlogViews.views + stmt.excluded.views,
+                "updated_at": func.now(),
+            },
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        # Lock привязан к циклу событий: у каждого запуска приложения свой
+        self._lock = asyncio.Lock()
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+
+
+view_counter = ViewCounter(settings.view_counter)
@@ -1,107 +1,166 @@
+from datetime import datetime
 from logging import getLogger
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, delete, tuple_, union_all
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm import selectinload, joinedload, aliased, load_only
 from pydantic import BaseModel
 
-from core.models.base import Blog, Tag, BlogTag
+from core.archive import blog_archive
+from core.changes import record_blog_changes
+from core.models.archive import ArchivedBlog, ArchivedBlogTag
+from core.models.base import Blog, Tag, BlogTag, BlogViews, TagStats, User
 from .schemes import BlogFullResponse
 
 logger = getLogger(__name__)
 
+# Поля автора, которые читаются вместе с блогом (их же хранит core.replica)
+BLOG_AUTHOR_COLUMNS = (User.id, User.first_name, User.last_name)
+
+# Размер пачки id в одном запросе (лимит переменных SQLite)
+BULK_CHUNK_SIZE = 500
+
+
+def normalize_tag_names(tag_names: list[str]) -> list[str]:
+    # Приводим теги к нижнему регистру и убираем повторы, сохраняя порядок
+    return list(dict.fromkeys(tag_name.lower() for tag_name in tag_names))
+
 
 async def add_tags_to_bd(session: AsyncSession, tag_names: list[str]) -> list[int]:
     """
     Метод для добавления тегов в базу данных.
-    Принимает список строк (тегов), проверяет, существуют ли они в базе данных,
-    добавляет новые и возвращает список ID тегов.
+    Принимает список строк (тегов), добавляет отсутствующие одним
+    INSERT ... ON CONFLICT DO NOTHING и возвращает список ID тегов
+    (вторым запросом, независимо от количества тегов).
     Args:
         session (AsyncSession): Сессия базы данных.
-        tag_names (list[str]): Список тегов в нижнем регистре.
+        tag_names (list[str]): Список тегов.
     Returns:
-        list[int]: Список ID тегов.
-    """
-    tag_ids = []
-    for tag_name in tag_names:
-        tag_name = tag_name.lower()  # Приводим тег к нижнему регистру
-        # Пытаемся найти тег в базе данных
-        stmt = select(Tag).filter_by(name=tag_name)
-        result = await session.execute(stmt)
-        tag = result.scalars().first()
-
-        if tag:
-            # Если тег найден, добавляем его ID в список
-            tag_ids.append(tag.id)
-        else:
-            # Если тег не найден, создаем новый тег
-            new_tag = Tag(name=tag_name)
-            session.add(new_tag)
-            try:
-                await session.flush()  # Это создает новый тег и позволяет получить его ID
-                logger.info("Тег '%s' добавлен в базу данных." % tag_name)
-                tag_ids.append(new_tag.id)
-            except SQLAlchemyError as e:
-                await session.rollback()
-                logger.error("Ошибка при добавлении тега '%s': %s" % (tag_name, e))
-                raise e
-
-    return tag_ids
-
-
-async def add_blog_to_bd(session: AsyncSession, values: BaseModel):
-    # Добавить одну запись
+        list[int]: Список ID тегов в порядке tag_names (без повторов).
+    """
+    names = normalize_tag_names(tag_names)
+    if not names:
+        return []
+
+    stmt = (
+        insert(Tag)
+        .values([{"name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=[Tag.name])
+        .returning(Tag.name)
+    )
+    try:
+        created = (await session.execute(stmt)).scalars().all()
+    except SQLAlchemyError as e:
+        logger.error("Ошибка при добавлении тегов %s: %s" % (names, e))
+        raise e
+    if created:
+        logger.info("Теги %s добавлены в базу данных." % created)
+
+    result = await session.execute(select(Tag.id, Tag.name).where(Tag.name.in_(names)))
+    ids_by_name = {row.name: row.id for row in result}
+    return [ids_by_name[name] for name in names]
+
+
+async def add_blog_to_bd(session: AsyncSession, values: BaseModel) -> int:
+    """
+    Добавить одну запись без коммита: INSERT ... RETURNING id.
+    Коммит выполняет вызывающий код, чтобы блог и его теги фиксировались вместе.
+    """
     values_dict = values.model_dump(exclude_unset=True)
 
     logger.info("Добавление записи с параметрами: %s" % values_dict)
 
-    new_blogs = Blog(**values_dict)
-    session.add(new_blogs)
-
-    await session.commit()
+    stmt = insert(Blog).values(**values_dict).returning(Blog.id)
+    blog_id = (await session.execute(stmt)).scalar_one()
     logger.info(f"Запись успешно добавлена.")
-    return new_blogs
+    return blog_id
+
+
+async def _adjust_tag_stats(session: AsyncSession, delta: int, *criteria) -> None:
+    """
+    Прибавляет delta к published_count тегов связей blog_tags, выбранных criteria
+    (условия по BlogTag и Blog), по одному на связь. Один INSERT ... SELECT
+    ... ON CONFLICT DO UPDATE в текущей транзакции.
+    """
+    counts = (
+        select(BlogTag.tag_id, func.count() * delta)
+        .join(Blog, Blog.id == BlogTag.blog_id)
+        .where(*criteria)
+        .group_by(BlogTag.tag_id)
+    )
+    stmt = insert(TagStats).from_select(["tag_id", "published_count"], counts)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TagStats.tag_id],
+        set_={
+            "published_count": TagStats.published_count + stmt.excluded.published_count,
+            "updated_at": func.now(),
+        },
+    )
+    await session.execute(stmt)
 
 
 async def add_blog_tags_to_bd(
     session: AsyncSession, blog_tag_pairs: list[dict]
 ) -> None:
     """
-    Функция добавляет связки блогов и тегов в базу данных.
+    Функция добавляет связки блогов и тегов в базу данных одним INSERT.
     Args:
         session (AsyncSession): Объект сессии базы данных.
         blog_tag_pairs (list[dict]): Список словарей, где каждый словарь содержит пару blog_id и tag_id.
     Returns:
         None
     """
-    # Сначала создаем все объекты BlogTag
-    blog_tag_instances = []
+    rows = []
     for pair in blog_tag_pairs:
         blog_id = pair.get("blog_id")
         tag_id = pair.get("tag_id")
         if blog_id and tag_id:
-            # Создаем объект BlogTag
-            blog_tag = BlogTag(blog_id=blog_id, tag_id=tag_id)
-            blog_tag_instances.append(blog_tag)
+            rows.append({"blog_id": blog_id, "tag_id": tag_id})
         else:
             logger.warning(f"Пропущен неверный параметр в паре: {pair}")
 
-    if blog_tag_instances:
-        session.add_all(blog_tag_instances)  # Добавляем все объекты за один раз
+    if rows:
         try:
-            await session.flush()  # Применяем изменения и сохраняем записи в базе данных
-            logger.info(
-                "%s связок блогов и тегов успешно добавлено." % len(blog_tag_instances)
+            await session.execute(insert(BlogTag).values(rows))
+            await _adjust_tag_stats(
+                session,
+                1,
+                tuple_(BlogTag.blog_id, BlogTag.tag_id).in_(
+                    [(row["blog_id"], row["tag_id"]) for row in rows]
+                ),
+                Blog.status == "published",
             )
+            logger.info("%s связок блогов и тегов успешно добавлено." % len(rows))
         except SQLAlchemyError as e:
-            await session.rollback()
             logger.error("Ошибка при добавлении связок блогов и тегов: %s" % e)
             raise e
     else:
         logger.warning("Нет валидных данных для добавления в таблицу blog_tags.")
 
 
+async def create_blog_with_tags(
+    session: AsyncSession, values: BaseModel, tag_names: list[str]
+) -> int:
+    """
+    Создание блога вместе с тегами как одна единица работы.
+    Все запросы выполняются в одной транзакции сессии; коммит (один на блог)
+    делает вызывающий код, ошибка на любом шаге откатывает всё целиком.
+    Returns:
+        int: ID созданного блога.
+    """
+    blog_id = await add_blog_to_bd(session=session, values=values)
+    if tag_names:
+        tag_ids = await add_tags_to_bd(session=session, tag_names=tag_names)
+        await add_blog_tags_to_bd(
+            session=session,
+            blog_tag_pairs=[{"blog_id": blog_id, "tag_id": i} for i in tag_ids],
+        )
+    await record_blog_changes(session, "created", [blog_id])
+    return blog_id
+
+
 async def get_full_blog_info(
     session: AsyncSession, blog_id: int, author_id: int | None = None
 ):
@@ -110,22 +169,62 @@ async def get_full_blog_info(
     Для опубликованных блогов доступ к информации открыт всем пользователям.
     Для черновиков доступ открыт только автору блога.
     """
-    query = (
-        select(Blog)
-        .options(
-            joinedload(Blog.user),  # Подгружаем данные о пользователе (авторе)
-            selectinload(Blog.tags),  # Подгружаем связанные теги
-        )
-        .filter_by(id=blog_id)
+    blog = await load_full_blog(session=session, blog_id=blog_id)
+    return check_blog_access(blog, blog_id=blog_id, author_id=author_id)
+
+
+async def get_full_blogs_info(
+    session: AsyncSession, ids: list[int], author_id: int | None = None
+) -> dict[int, Blog | ArchivedBlog | dict]:
+    """
+    Несколько блогов как get_full_blog_info: один запрос IN (и один запрос
+    тегов к нему) на каждые BULK_CHUNK_SIZE id, архив - только для
+    ненайденных. Права проверяются для каждого id отдельно.
+    """
+    unique = list(dict.fromkeys(ids))
+    blogs = {}
+    for chunk in _chunks(unique):
+        query = _full_blog_query().where(Blog.id.in_(chunk))
+        blogs.update((blog.id, blog) for blog in (await session.execute(query)).scalars())
+    missing = [i for i in unique if i not in blogs]
+    if missing and blog_archive.available:
+        for chunk in _chunks(missing):
+            query = _full_blog_query(ArchivedBlog).where(ArchivedBlog.id.in_(chunk))
+            blogs.update((blog.id, blog) for blog in (await session.execute(query)).scalars())
+    return {
+        blog_id: check_blog_access(blogs.get(blog_id), blog_id=blog_id, author_id=author_id)
+        for blog_id in unique
+    }
+
+
+def _full_blog_query(model=Blog):
+    return select(model).options(
+        # Подгружаем автора: только поля, нужные ответу (UserBase)
+        joinedload(model.user).load_only(*BLOG_AUTHOR_COLUMNS),
+        selectinload(model.tags),  # Подгружаем связанные теги
     )
 
+
+async def load_full_blog(session: AsyncSession, blog_id: int) -> Blog | ArchivedBlog | None:
+    """
+    Блог с автором и тегами без проверки прав (её делает check_blog_access).
+    Блога нет в основной БД - ищем в архиве (core.archive).
+    """
+    query = _full_blog_query().filter_by(id=blog_id)
+
     # Выполняем запрос
     result = await session.execute(query)
 
     blog = result.scalar_one_or_none()
+    if blog is None and blog_archive.available:
+        query = _full_blog_query(ArchivedBlog).filter_by(id=blog_id)
+        blog = (await session.execute(query)).scalar_one_or_none()
 
     logger.info("Blog %s" % blog)
+    return blog
 
+
+def check_blog_access(blog: Blog | None, blog_id: int, author_id: int | None = None):
     if not blog:
         return {
             "message": f"Блог с ID {blog_id} не найден или у вас нет прав на его просмотр.",
@@ -146,18 +245,34 @@ async def delete_blog(
     author_id: int,
     session: AsyncSession,
 ):
-    query = select(Blog).filter_by(id=id_blog)
-    result = await session.execute(query)
-    blog = result.scalar_one_or_none()
+    """
+    Удаление блога одним запросом DELETE ... WHERE id AND author RETURNING.
+    Если ничего не удалено, отдельный лёгкий запрос определяет причину.
+    """
+    # Связи удалятся каскадно, поэтому счётчики тегов и журнал (теги блога)
+    # обновляются до удаления с тем же условием, что и у DELETE
+    await _adjust_tag_stats(
+        session,
+        -1,
+        BlogTag.blog_id == id_blog,
+        Blog.author == author_id,
+        Blog.status == "published",
+    )
+    await record_blog_changes(session, "deleted", [id_blog], Blog.author == author_id)
+    stmt = (
+        delete(Blog)
+        .where(Blog.id == id_blog, Blog.author == author_id)
+        .returning(Blog.id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = (await session.execute(stmt)).scalar_one_or_none()
 
-    if not blog:
-        return {"message": f"Блог с ID {id_blog} не найден.", "status": "error"}
-    if blog.author != author_id:
+    if deleted is None:
+        owner = await session.scalar(select(Blog.author).filter_by(id=id_blog))
+        if owner is None:
+            return {"message": f"Блог с ID {id_blog} не найден.", "status": "error"}
         return {"message": "У вас нет прав на удаление этого блога.", "status": "error"}
 
-    await session.delete(blog)
-    await session.flush()
-
     return {"message": f"Блог с ID {id_blog} успешно удален.", "status": "success"}
 
 
@@ -186,67 +301,184 @@ async def change_blog_status(
             "status": "error",
         }
     try:
-        query = select(Blog).filter_by(id=blog_id)
-        result = await session.execute(query)
-        blog = result.scalar_one_or_none()
-
-        if not blog:
-            return {"message": f"Блог с ID {blog_id} не найден.", "status": "error"}
-        if blog.author != author_id:
-            return {
-                "message": "У вас нет прав на изменение статуса этого блога.",
-                "status": "error",
-            }
-        if blog.status == new_status:
+        # Проверки автора и текущего статуса - в условии UPDATE, без загрузки блога
+        stmt = (
+            update(Blog)
+            .where(Blog.id == blog_id, Blog.author == author_id, Blog.status != new_status)
+            .values(status=new_status)
+            .returning(Blog.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated = (await session.execute(stmt)).scalar_one_or_none()
+
+        if updated is None:
+            query = select(Blog.author, Blog.status).filter_by(id=blog_id)
+            blog = (await session.execute(query)).one_or_none()
+            if not blog:
+                return {"message": f"Блог с ID {blog_id} не найден.", "status": "error"}
+            if blog.author != author_id:
+                return {
+                    "message": "У вас нет прав на изменение статуса этого блога.",
+                    "status": "error",
+                }
             return {
                 "message": f"Статус блога с ID {blog_id} уже {new_status}.",
                 "status": "error",
             }
 
-        blog.status = new_status
-        await session.flush()
+        await _adjust_tag_stats(
+            session, 1 if new_status == "published" else -1, BlogTag.blog_id == blog_id
+        )
+        await record_blog_changes(session, "status", [blog_id])
         return {
             "message": f"Статус блога с ID {blog_id} успешно изменен на {new_status}.",
             "status": "success",
         }
 
     except SQLAlchemyError as e:
-        await session.rollback()
-        return {
-            "message": f"Произошла ошибка при изменении статуса блога: {str(e)}",
-            "status": "error",
-        }
+        # Откат - за тем, кто открыл транзакцию (SAVEPOINT единицы db_helper.write)
+        logger.error("Ошибка при изменении статуса блога %s: %s" % (blog_id, e))
+        raise e
     
     
+def _filter_published_blogs(
+        query,
+        author_id: int | None = None,
+        tag: str | None = None,
+        tags: list[str] | None = None,
+        match_all: bool = False,
+        model=Blog,
+):
+    """
+    Общие фильтры ленты опубликованных блогов (для выборки и метаданных).
+    model - Blog или ArchivedBlog для той же выборки из архива.
+    """
+    query = query.where(model.status == 'published')
+
+    # Фильтрация по автору
+    if author_id is not None:
+        query = query.where(model.author == author_id)
+
+    # Фильтрация по тегу (подстрока). EXISTS без join, чтобы блог не повторялся
+    # столько раз, сколько у него тегов
+    if tag:
+        query = query.filter(model.tags.any(Tag.name.ilike(f"%{tag.lower()}%")))
+
+    # Фильтрация по точным названиям тегов: любой из них или все сразу
+    if tags:
+        names = [name.lower() for name in tags]
+        if match_all:
+            for name in names:
+                query = query.filter(model.tags.any(Tag.name == name))
+        else:
+            query = query.filter(model.tags.any(Tag.name.in_(names)))
+    return query
+
+
+async def get_tag_groups(
+        session: AsyncSession,
+        tag: str | None = None,
+        tags: list[str] | None = None,
+        match_all: bool = False,
+) -> list[list[int]]:
+    """
+    id тегов для фильтров ленты в виде групп для TagIndex.select:
+    внутри группы подходит любой тег, блог должен попасть в каждую группу.
+    Читается только таблица tags.
+    """
+    groups = []
+    if tag:
+        query = select(Tag.id).where(Tag.name.ilike(f"%{tag.lower()}%"))
+        groups.append(list((await session.execute(query)).scalars().all()))
+    if tags:
+        names = list(dict.fromkeys(name.lower() for name in tags))
+        rows = await session.execute(select(Tag.id, Tag.name).where(Tag.name.in_(names)))
+        ids_by_name = {row.name: row.id for row in rows}
+        if match_all:
+            groups.extend([ids_by_name[name]] if name in ids_by_name else [] for name in names)
+        else:
+            groups.append(list(ids_by_name.values()))
+    return groups
+
+
+async def get_blog_meta(session: AsyncSession, blog_id: int):
+    """
+    Лёгкий запрос метаданных блога для условных GET-запросов.
+    Не загружает content, автора и теги.
+    """
+    query = select(Blog.id, Blog.author, Blog.status, Blog.updated_at).filter_by(id=blog_id)
+    meta = (await session.execute(query)).one_or_none()
+    if meta is None and blog_archive.available:
+        query = select(
+            ArchivedBlog.id, ArchivedBlog.author, ArchivedBlog.status, ArchivedBlog.updated_at
+        ).filter_by(id=blog_id)
+        meta = (await session.execute(query)).one_or_none()
+    return meta
+
+
+async def get_blog_list_meta(
+        session: AsyncSession,
+        author_id: int | None = None,
+        tag: str | None = None,
+        tags: list[str] | None = None,
+        match_all: bool = False,
+        model=Blog,
+) -> tuple[int, datetime | None]:
+    """
+    Количество блогов в ленте и время последнего изменения среди них.
+    Используется для ETag/Last-Modified ленты и заменяет подсчёт в get_blog_list.
+    С model=ArchivedBlog считает ту же ленту в архиве.
+    """
+    base_query = _filter_published_blogs(
+        select(model.id, model.updated_at),
+        author_id=author_id,
+        tag=tag,
+        tags=tags,
+        match_all=match_all,
+        model=model,
+    ).subquery()
+    query = select(func.count(), func.max(base_query.c.updated_at))
+    total_result, last_modified = (await session.execute(query)).one()
+    return total_result, last_modified
+
+
+def clamp_page(page: int, page_size: int) -> tuple[int, int]:
+    # Ограничение параметров
+    return max(1, page), max(3, min(page_size, 100))
+
+
 async def get_blog_list(
         session: AsyncSession, 
         author_id: int | None = None, 
         tag: str | None = None,
         page: int = 1, 
-        page_size: int = 10
+        page_size: int = 10,
+        total_result: int | None = None,
+        tags: list[str] | None = None,
+        match_all: bool = False,
+        archived_total: int | None = None,
 ):
-    
-    # Ограничение параметров
-    page_size = max(3, min(page_size, 100))
-    page = max(1, page)
+    """
+    Страница ленты опубликованных блогов. Архивные блоги (core.archive) -
+    самые старые и идут первыми, поэтому архив читается, только если
+    страница начинается в его пределах. archived_total - число блогов ленты
+    в архиве, total_result - всего, вместе с архивом.
+    """
+    page, page_size = clamp_page(page, page_size)
+    filters = dict(author_id=author_id, tag=tag, tags=tags, match_all=match_all)
 
     # Начальная сборка базового запроса
-    base_query = select(Blog).options(
-        joinedload(Blog.user),
-        selectinload(Blog.tags)
-    ).filter_by(status='published')
-
-    # Фильтрация по автору
-    if author_id is not None:
-        base_query = base_query.filter_by(author=author_id)
+    base_query = _filter_published_blogs(_full_blog_query(), **filters).order_by(Blog.id)
 
-    # Фильтрация по тегу
-    if tag:
-        base_query = base_query.join(Blog.tags).filter(Blog.tags.any(Tag.name.ilike(f"%{tag.lower()}%")))
+    if archived_total is None:
+        archived_total = 0
+        if blog_archive.available:
+            archived_total, _ = await get_blog_list_meta(session, **filters, model=ArchivedBlog)
 
-    # Подсчет общего количества записей
-    count_query = select(func.count()).select_from(base_query.subquery())
-    total_result = await session.scalar(count_query)
+    # Подсчет общего количества записей (если он не был получен заранее)
+    if total_result is None:
+        count_query = select(func.count()).select_from(base_query.subquery())
+        total_result = await session.scalar(count_query) + archived_total
 
     # Если записей нет, возвращаем пустой результат
     if not total_result:
@@ -260,13 +492,23 @@ async def get_blog_list(
     # Расчет количества страниц
     total_page = (total_result + page_size - 1) // page_size
 
-    # Применение пагинации
+    # Применение пагинации: сначала архив, затем основная БД
     offset = (page - 1) * page_size
-    paginated_query = base_query.offset(offset).limit(page_size)
+    blogs = []
+    if offset < archived_total:
+        archived_query = _filter_published_blogs(
+            _full_blog_query(ArchivedBlog), **filters, model=ArchivedBlog
+        ).order_by(ArchivedBlog.id)
+        result = await session.execute(archived_query.offset(offset).limit(page_size))
+        blogs.extend(result.scalars().all())
+    if len(blogs) < page_size:
+        paginated_query = base_query.offset(max(0, offset - archived_total)).limit(
+            page_size - len(blogs)
+        )
 
-    # Выполнение запроса и получение результатов
-    result = await session.execute(paginated_query)
-    blogs = result.scalars().all()
+        # Выполнение запроса и получение результатов
+        result = await session.execute(paginated_query)
+        blogs.extend(result.scalars().all())
 
     # Удаление дубликатов блогов по их ID
     unique_blogs = []
@@ -282,6 +524,8 @@ async def get_blog_list(
         filters.append(f"author_id={author_id}")
     if tag:
         filters.append(f"tag={tag}")
+    if tags:
+        filters.append(f"tags={tags}")
     filter_str = " & ".join(filters) if filters else "no filters"
 
     logger.info(f"Page {page} fetched with {len(blogs)} blogs, filters: {filter_str}")
@@ -291,4 +535,365 @@ async def get_blog_list(
         "total_page": total_page,
         "total_result": total_result,
         "blogs": unique_blogs
-    }
\ No newline at end of file
+    }
+
+
+async def get_blogs_by_ids(session: AsyncSession, ids: list[int]) -> list[BlogFullResponse]:
+    """Блоги по первичному ключу в порядке ids (страница ленты из индекса тегов)."""
+    if not ids:
+        return []
+    query = _full_blog_query().where(Blog.id.in_(ids), Blog.status == 'published')
+    blogs = {blog.id: blog for blog in (await session.execute(query)).scalars().all()}
+    missing = [i for i in ids if i not in blogs]
+    if missing and blog_archive.available:
+        query = _full_blog_query(ArchivedBlog).where(ArchivedBlog.id.in_(missing))
+        blogs.update((blog.id, blog) for blog in (await session.execute(query)).scalars().all())
+    return [BlogFullResponse.model_validate(blogs[i]) for i in ids if i in blogs]
+
+
+async def get_most_viewed_blogs(session: AsyncSession, limit: int = 10) -> list[BlogFullResponse]:
+    """
+    Самые просматриваемые опубликованные блоги.
+    Использует индекс по blog_views.views, поэтому не сканирует все блоги.
+    """
+    query = (
+        select(Blog)
+        .options(
+            joinedload(Blog.user).load_only(*BLOG_AUTHOR_COLUMNS),
+            selectinload(Blog.tags),
+        )
+        .join(BlogViews, BlogViews.blog_id == Blog.id)
+        .where(Blog.status == 'published')
+        .order_by(BlogViews.views.desc())
+        .limit(limit)
+    )
+    result = await session.execute(query)
+    return [BlogFullResponse.model_validate(blog) for blog in result.scalars().all()]
+
+
+async def get_related_blog_ids(
+    session: AsyncSession, blog_id: int, limit: int = 5
+) -> list[int]:
+    """
+    Похожие блоги SQL-запросом по числу общих тегов.
+    Используется, когда индекс тегов в памяти (api.tag_index) отключён.
+    """
+    source = aliased(BlogTag)
+    query = (
+        select(BlogTag.blog_id)
+        .join(source, source.tag_id == BlogTag.tag_id)
+        .join(Blog, Blog.id == BlogTag.blog_id)
+        .where(
+            source.blog_id.in_(select(Blog.id).filter_by(id=blog_id, status="published")),
+            BlogTag.blog_id != blog_id,
+            Blog.status == "published",
+        )
+        .group_by(BlogTag.blog_id)
+        .order_by(func.count().desc(), BlogTag.blog_id.desc())
+        .limit(limit)
+    )
+    return list((await session.execute(query)).scalars().all())
+
+
+async def reconcile_tag_stats(session: AsyncSession) -> int:
+    """
+    Пересчёт tag_stats по blog_tags и blogs. Меняет только расходящиеся строки
+    и возвращает их число; коммит за вызывающим.
+    """
+    tag_ids = select(BlogTag.tag_id).join(Blog, Blog.id == BlogTag.blog_id).where(
+        Blog.status == "published"
+    )
+    if blog_archive.available:
+        # перенос в архив не меняет счётчики: архивные блоги остаются опубликованными
+        tag_ids = union_all(tag_ids, select(ArchivedBlogTag.tag_id)).subquery()
+    else:
+        tag_ids = tag_ids.subquery()
+    published = (
+        select(tag_ids.c.tag_id, func.count().label("n"))
+        .group_by(tag_ids.c.tag_id)
+        .subquery()
+    )
+    actual = select(Tag.id, func.coalesce(published.c.n, 0)).outerjoin(
+        published, published.c.tag_id == Tag.id
+    ).where(Tag.id.is_not(None))  # WHERE отделяет SELECT от ON CONFLICT для парсера SQLite
+    stmt = insert(TagStats).from_select(["tag_id", "published_count"], actual)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TagStats.tag_id],
+        set_={"published_count": stmt.excluded.published_count, "updated_at": func.now()},
+        where=TagStats.published_count != stmt.excluded.published_count,
+    ).returning(TagStats.tag_id)
+    fixed = (await session.execute(stmt)).scalars().all()
+    return len(fixed)
+
+
+async def get_tag_stats_page(session: AsyncSession, page: int = 1, page_size: int = 20) -> dict:
+    """Теги с опубликованными блогами, самые популярные первыми."""
+    total_result = await session.scalar(
+        select(func.count()).select_from(TagStats).where(TagStats.published_count > 0)
+    )
+    query = (
+        select(Tag.id, Tag.name, TagStats.published_count.label("count"))
+        .join(TagStats, TagStats.tag_id == Tag.id)
+        .where(TagStats.published_count > 0)
+        .order_by(TagStats.published_count.desc(), Tag.name)
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+    )
+    rows = (await session.execute(query)).all()
+    return {
+        "page": page,
+        "total_page": (total_result + page_size - 1) // page_size,
+        "total_result": total_result,
+        "tags": rows,
+    }
+
+
+async def get_top_tags(session: AsyncSession, limit: int = 30):
+    """Облако тегов: самые популярные теги по индексу tag_stats.published_count."""
+    query = (
+        select(Tag.id, Tag.name, TagStats.published_count.label("count"))
+        .join(TagStats, TagStats.tag_id == Tag.id)
+        .where(TagStats.published_count > 0)
+        .order_by(TagStats.published_count.desc(), Tag.name)
+        .limit(limit)
+    )
+    return (await session.execute(query)).all()
+
+
+async def get_tag_id(session: AsyncSession, name: str) -> int | None:
+    return await session.scalar(select(Tag.id).where(Tag.name == name.lower()))
+
+
+async def get_feed_blog_ids(
+    session: AsyncSession,
+    author_id: int | None = None,
+    tag_id: int | None = None,
+    limit: int = 20,
+) -> list[int]:
+    """id последних опубликованных блогов ленты RSS, новые первыми."""
+
+    def query(model):
+        q = select(model.id).where(model.status == "published")
+        if author_id is not None:
+            q = q.where(model.author == author_id)
+        if tag_id is not None:
+            q = q.where(model.tags.any(Tag.id == tag_id))
+        return q.order_by(model.id.desc())
+
+    ids = list((await session.execute(query(Blog).limit(limit))).scalars())
+    # Архивные блоги старше всех в основной БД, они дополняют короткую ленту
+    if len(ids) < limit and blog_archive.available:
+        archived = query(ArchivedBlog).where(ArchivedBlog.id.not_in(ids)).limit(limit - len(ids))
+        ids.extend((await session.execute(archived)).scalars())
+    return ids
+
+
+async def get_feed_blogs(session: AsyncSession, ids: list[int]) -> list[Blog | ArchivedBlog]:
+    """Блоги для записей ленты RSS: с автором и тегами, без content."""
+
+    def query(model):
+        return _full_blog_query(model).options(
+            load_only(
+                model.id,
+                model.author,
+                model.title,
+                model.short_description,
+                model.created_at,
+                model.updated_at,
+            )
+        )
+
+    blogs = {
+        blog.id: blog
+        for blog in (await session.execute(query(Blog).where(Blog.id.in_(ids)))).scalars()
+    }
+    missing = [i for i in ids if i not in blogs]
+    if missing and blog_archive.available:
+        archived = query(ArchivedBlog).where(ArchivedBlog.id.in_(missing))
+        blogs.update((blog.id, blog) for blog in (await session.execute(archived)).scalars())
+    return [blogs[i] for i in ids if i in blogs]
+
+
+async def get_sitemap_rows(session: AsyncSession, ids: list[int] | None = None):
+    """
+    id и время изменения опубликованных блогов для sitemap, вместе с архивом:
+    все (ids не задан) или только из ids.
+    """
+    queries = []
+    if blog_archive.available:
+        queries.append(select(ArchivedBlog.id, ArchivedBlog.updated_at))
+    # основная БД последней: её данные важнее копии, оставшейся после сбоя переноса
+    queries.append(select(Blog.id, Blog.updated_at).where(Blog.status == "published"))
+    rows = {}
+    for query in queries:
+        chunks = [None] if ids is None else list(_chunks(ids))
+        for chunk in chunks:
+            q = query if chunk is None else query.where(query.selected_columns[0].in_(chunk))
+            rows.update((row.id, row.updated_at) for row in await session.execute(q))
+    return rows
+
+
+async def get_max_tag_id(session: AsyncSession) -> int:
+    return await session.scalar(select(func.max(Tag.id))) or 0
+
+
+async def get_tag_usage(session: AsyncSession):
+    """Все теги с числом блогов, в которых они используются."""
+    query = (
+        select(Tag.name, func.count(BlogTag.id).label("count"))
+        .outerjoin(BlogTag, BlogTag.tag_id == Tag.id)
+        .group_by(Tag.id)
+    )
+    return (await session.execute(query)).all()
+
+
+async def get_tag_suggestions(session: AsyncSession, prefix: str, limit: int = 10):
+    """
+    Подсказки тегов SQL-запросом: диапазон по уникальному индексу tags.name
+    и подсчёт использований. Используется, когда api.tag_suggest отключён.
+    """
+    prefix = prefix.lower()
+    query = (
+        select(Tag.name, func.count(BlogTag.id).label("count"))
+        .outerjoin(BlogTag, BlogTag.tag_id == Tag.id)
+        .where(Tag.name >= prefix, Tag.name < prefix + "\U0010ffff")
+        .group_by(Tag.id)
+        .order_by(func.count(BlogTag.id).desc(), Tag.name)
+        .limit(limit)
+    )
+    return (await session.execute(query)).all()
+
+
+async def get_blog_titles(session: AsyncSession, ids: list[int]):
+    """id, заголовок и описание блогов в порядке ids (для блоков со ссылками)."""
+    if not ids:
+        return []
+    query = select(Blog.id, Blog.title, Blog.short_description).where(
+        Blog.id.in_(ids), Blog.status == "published"
+    )
+    rows = {row.id: row for row in await session.execute(query)}
+    missing = [blog_id for blog_id in ids if blog_id not in rows]
+    if missing and blog_archive.available:
+        query = select(
+            ArchivedBlog.id, ArchivedBlog.title, ArchivedBlog.short_description
+        ).where(ArchivedBlog.id.in_(missing))
+        rows.update((row.id, row) for row in await session.execute(query))
+    return [rows[blog_id] for blog_id in ids if blog_id in rows]
+
+
+def _chunks(ids: list[int]):
+    for start in range(0, len(ids), BULK_CHUNK_SIZE):
+        yield ids[start:start + BULK_CHUNK_SIZE]
+
+
+async def _classify_skipped_blogs(
+    session: AsyncSession, ids: list[int], author_id: int
+) -> dict[str, list[int]]:
+    """
+    Причины, по которым блоги не попали под массовую операцию.
+    Вызывается только для id, не затронутых основным запросом.
+    """
+    report = {"not_found": [], "forbidden": [], "unchanged": []}
+    found = {}
+    for chunk in _chunks(ids):
+        rows = await session.execute(select(Blog.id, Blog.author).where(Blog.id.in_(chunk)))
+        found.update({row.id: row.author for row in rows})
+
+    for blog_id in ids:
+        if blog_id not in found:
+            report["not_found"].append(blog_id)
+        elif found[blog_id] != author_id:
+            report["forbidden"].append(blog_id)
+        else:
+            report["unchanged"].append(blog_id)
+    return report
+
+
+async def bulk_change_blog_status(
+    session: AsyncSession,
+    ids: list[int],
+    new_status: str,
+    author_id: int,
+) -> dict:
+    """
+    Массовое изменение статуса блогов автора.
+    Каждая пачка id - один UPDATE ... WHERE id IN (...) AND author = :me RETURNING id;
+    коммит остаётся за вызывающим, поэтому вся операция - одна транзакция.
+
+    Returns:
+        dict: updated - изменённые id, not_found/forbidden/unchanged - пропущенные.
+    """
+    if new_status not in ["draft", "published"]:
+        return {
+            "message": "Недопустимый статус. Используйте 'draft' или 'published'.",
+            "status": "error",
+        }
+    ids = list(dict.fromkeys(ids))
+
+    updated = []
+    for chunk in _chunks(ids):
+        stmt = (
+            update(Blog)
+            .where(Blog.id.in_(chunk), Blog.author == author_id, Blog.status != new_status)
+            .values(status=new_status)
+            .returning(Blog.id)
+            .execution_options(synchronize_session=False)
+        )
+        changed = (await session.execute(stmt)).scalars().all()
+        if changed:
+            await _adjust_tag_stats(
+                session, 1 if new_status == "published" else -1, BlogTag.blog_id.in_(changed)
+            )
+        updated.extend(changed)
+
+    await record_blog_changes(session, "status", updated)
+
+    updated_set = set(updated)
+    skipped = [blog_id for blog_id in ids if blog_id not in updated_set]
+    report = await _classify_skipped_blogs(session, skipped, author_id) if skipped else {
+        "not_found": [], "forbidden": [], "unchanged": []
+    }
+    logger.info("Статус %s установлен для %s блогов" % (new_status, len(updated)))
+    return {"status": "success", "updated": updated, **report}
+
+
+async def bulk_delete_blogs(
+    session: AsyncSession,
+    ids: list[int],
+    author_id: int,
+) -> dict:
+    """
+    Массовое удаление блогов автора: DELETE ... WHERE id IN (...) AND author = :me RETURNING id.
+    Связи blog_tags и просмотры удаляются каскадно (ON DELETE CASCADE).
+
+    Returns:
+        dict: deleted - удалённые id, not_found/forbidden - пропущенные.
+    """
+    ids = list(dict.fromkeys(ids))
+
+    deleted = []
+    for chunk in _chunks(ids):
+        await _adjust_tag_stats(
+            session,
+            -1,
+            BlogTag.blog_id.in_(chunk),
+            Blog.author == author_id,
+            Blog.status == "published",
+        )
+        await record_blog_changes(session, "deleted", chunk, Blog.author == author_id)
+        stmt = (
+            delete(Blog)
+            .where(Blog.id.in_(chunk), Blog.author == author_id)
+            .returning(Blog.id)
+            .execution_options(synchronize_session=False)
+        )
+        deleted.extend((await session.execute(stmt)).scalars().all())
+
+    deleted_set = set(deleted)
+    skipped = [blog_id for blog_id in ids if blog_id not in deleted_set]
+    report = await _classify_skipped_blogs(session, skipped, author_id) if skipped else {
+        "not_found": [], "forbidden": [], "unchanged": []
+    }
+    report.pop("unchanged")
+    logger.info("Удалено %s блогов" % len(deleted))
+    return {"status": "success", "deleted": deleted, **report}
@@ -21,7 +21,7 @@ def get_token_optional(request: Request) -> str | None:
 
 async def get_current_user_optional(
     token: str | None = Depends(get_token_optional),
-    session: AsyncSession = Depends(db_helper.get_scoped_session),
+    session: AsyncSession = Depends(db_helper.session_dependency),
 ):
     try:
         payload = decoded_jwt(token) # type: ignore
@@ -30,6 +30,10 @@ async def get_current_user_optional(
     user_id: str = payload.get('sub') # type: ignore
 
     user = await find_one_or_none_by_id(user_id=int(user_id), session=session)
+    # Соединение возвращаем в пул сразу: записи (db_helper.write) и общие чтения
+    # идут в своих сессиях, и занятое здесь соединение при нагрузке оставило бы
+    # их ждать pool_timeout. Обработчик, которому сессия нужна, возьмёт его снова
+    await session.close()
 
     logger.info("Найден пользователь %s" % user)
     
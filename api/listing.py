@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.archive import blog_archive
+from core.models.archive import ArchivedBlog
+from .crud import (
+    clamp_page,
+    get_blog_list,
+    get_blog_list_meta,
+    get_blogs_by_ids,
+    get_tag_groups,
+)
+from .tag_index import tag_index
+
+
+@dataclass
+class BlogListFilters:
+    author_id: int | None = None
+    tag: str | None = None
+    tags: list[str] | None = None
+    match_all: bool = False
+
+    @property
+    def by_tags(self) -> bool:
+        return bool(self.tag or self.tags)
+
+
+@dataclass
+class BlogListing:
+    """
+    Состояние ленты для ETag и выборки страницы.
+    ids заполнен, если лента собрана индексом тегов, иначе страница
+    выбирается SQL-запросом. total_result включает archived_total блогов из архива.
+    """
+
+    filters: BlogListFilters
+    total_result: int
+    last_modified: datetime | None = None
+    ids: list[int] | None = None
+    archived_total: int = 0
+
+    def etag_parts(self, page: int, page_size: int) -> tuple:
+        f = self.filters
+        filters = (f.author_id, f.tag, f.tags, f.match_all)
+        if self.ids is None:
+            return (*filters, page, page_size, self.total_result, self.last_modified)
+        # Для ленты из индекса страница однозначно задаётся своими id
+        return (*filters, self.total_result, self.window(page, page_size))
+
+    def window(self, page: int, page_size: int) -> list[int]:
+        page, page_size = clamp_page(page, page_size)
+        offset = (page - 1) * page_size
+        return self.ids[offset:offset + page_size]
+
+
+async def get_blog_listing(session: AsyncSession, filters: BlogListFilters) -> BlogListing:
+    """
+    Ленты с фильтром по тегам берутся из индекса в памяти (без join blogs,
+    blog_tags и tags), остальные и все ленты при выключенном индексе - из SQL.
+    """
+    if tag_index.loaded and filters.by_tags:
+        groups = await get_tag_groups(
+            session, tag=filters.tag, tags=filters.tags, match_all=filters.match_all
+        )
+        ids = tag_index.select(groups, author_id=filters.author_id)
+        return BlogListing(filters=filters, total_result=len(ids), ids=ids)
+
+    meta_filters = dict(
+        author_id=filters.author_id,
+        tag=filters.tag,
+        tags=filters.tags,
+        match_all=filters.match_all,
+    )
+    total_result, last_modified = await get_blog_list_meta(session=session, **meta_filters)
+    archived_total = 0
+    if blog_archive.available:
+        key = (filters.author_id, filters.tag, tuple(filters.tags or ()), filters.match_all)
+        archived_total, archived_modified = await blog_archive.meta(
+            key, lambda: get_blog_list_meta(session=session, **meta_filters, model=ArchivedBlog)
+        )
+        total_result += archived_total
+        if last_modified is None or (archived_modified and archived_modified > last_modified):
+            last_modified = archived_modified
+    return BlogListing(
+        filters=filters,
+        total_result=total_result,
+        last_modified=last_modified,
+        archived_total=archived_total,
+    )
+
+
+async def get_blog_listing_page(
+    session: AsyncSession, listing: BlogListing, page: int, page_size: int
+) -> dict:
+    """Страница ленты в формате get_blog_list."""
+    filters = listing.filters
+    if listing.ids is None:
+        return await get_blog_list(
+            session=session,
+            author_id=filters.author_id,
+            tag=filters.tag,
+            tags=filters.tags,
+            match_all=filters.match_all,
+            page=page,
+            page_size=page_size,
+            total_result=listing.total_result,
+            archived_total=listing.archived_total,
+        )
+
+    page, page_size = clamp_page(page, page_size)
+    blogs = await get_blogs_by_ids(session, listing.window(page, page_size))
+    return {
+        "page": page,
+        "total_page": (listing.total_result + page_size - 1) // page_size,
+        "total_result": listing.total_result,
+        "blogs": blogs,
+    }
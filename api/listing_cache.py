@@ -0,0 +1,237 @@
+import asyncio
+from contextlib import suppress
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from logging import getLogger
+from typing import Callable
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.changes import change_feed, BlogChangeEvent
+from core.config import settings, ListingCacheConfig
+from core.replica import read_session_factory
+from core.singleflight import SingleFlight
+from .crud import clamp_page, get_max_tag_id, get_tag_groups
+from .listing import BlogListFilters, BlogListing, get_blog_listing, get_blog_listing_page
+
+logger = getLogger(__name__)
+
+# (author_id, tag, page, page_size) с тегом в нижнем регистре, как его сравнивает фильтр
+ListingKey = tuple[int | None, str | None, int, int]
+
+
+@dataclass
+class CachedPage:
+    """
+    Страница ленты с данными для ETag и фильтром, по которому её сбрасывать.
+    data is None - страница не читалась: у клиента актуальная версия.
+    """
+
+    data: dict | None
+    etag_parts: tuple
+    last_modified: datetime | None
+    author_id: int | None = None
+    tag_ids: frozenset[int] | None = None  # теги, подходящие под фильтр tag
+    max_tag_id: int = 0  # теги новее могут подойти под фильтр tag
+    created: float = field(default_factory=time.monotonic)
+    _body: bytes | None = None
+
+    @property
+    def body(self) -> bytes:
+        """JSON страницы для /api/blogs/, сериализуется один раз."""
+        if self._body is None:
+            self._body = orjson.dumps(jsonable_encoder(self.data))
+        return self._body
+
+    def affected_by(self, event: BlogChangeEvent) -> bool:
+        if self.author_id is not None and event.author != self.author_id:
+            return False
+        if self.tag_ids is not None:
+            return any(t in self.tag_ids or t > self.max_tag_id for t in event.tag_ids)
+        return True
+
+
+class ListingCache:
+    """
+    LRU первых страниц ленты опубликованных блогов без фильтра или с фильтром
+    по автору или тегу; общий для /api/blogs/ и /blogs/.
+
+    Страницы сбрасываются по журналу изменений (core.changes.ChangeFeed):
+    создание, публикация и удаление блога затрагивают только страницы, под
+    фильтр которых блог подходит. Записи этого воркера применяются сразу после
+    коммита (ChangeFeed.catch_up), других воркеров - не позже poll_interval.
+    Просмотры и имена авторов в журнал не попадают, их обновляет ttl.
+
+    Промахи идут через SingleFlight: одновременные запросы одной страницы
+    ждут одно чтение из БД в отдельной сессии.
+
+    При stale_while_revalidate страница с истёкшим ttl отдаётся, пока одна
+    фоновая задача на ключ перечитывает её из БД. Страница, сброшенная по
+    журналу, удаляется сразу: иначе автор не увидел бы свою запись.
+    """
+
+    def __init__(self, config: ListingCacheConfig):
+        self.config = config
+        self._pages: OrderedDict[ListingKey, CachedPage] = OrderedDict()
+        self._refreshing: dict[ListingKey, asyncio.Task] = {}
+        self.flights = SingleFlight("Чтение ленты")
+        # растёт при каждом изменении ленты: страница, которую читали во время
+        # изменения, не сохраняется
+        self._version = 0
+
+    def key(self, filters: BlogListFilters, page: int, page_size: int) -> ListingKey | None:
+        """Ключ страницы или None, если такая страница не кэшируется."""
+        if not (self.config.enabled and change_feed.config.enabled) or filters.tags:
+            return None
+        page, page_size = clamp_page(page, page_size)
+        if page > self.config.max_page:
+            return None
+        return filters.author_id, filters.tag.lower() if filters.tag else None, page, page_size
+
+    async def get(
+        self,
+        filters: BlogListFilters,
+        page: int,
+        page_size: int,
+        unchanged: Callable[[tuple], bool] | None = None,
+    ) -> CachedPage:
+        """
+        Страница ленты из кэша или из БД. Одновременные промахи по одной
+        странице (в том числе некэшируемой) читают БД один раз.
+
+        unchanged(etag_parts) - совпадает ли ETag клиента. Для некэшируемой
+        страницы сначала читается только состояние ленты, и при совпадении
+        страница не загружается (data is None).
+        """
+        key = self.key(filters, page, page_size)
+        if key is None:
+            listing = None
+            if unchanged is not None:
+                async with read_session_factory()() as session:
+                    listing = await get_blog_listing(session=session, filters=filters)
+                parts = listing.etag_parts(page, page_size)
+                if unchanged(parts):
+                    return CachedPage(
+                        data=None, etag_parts=parts, last_modified=listing.last_modified
+                    )
+            flight_key = (
+                filters.author_id,
+                filters.tag,
+                tuple(filters.tags or ()),
+                filters.match_all,
+                *clamp_page(page, page_size),
+            )
+            return await self.flights.do(
+                flight_key, lambda: self._load(None, filters, page, page_size, listing)
+            )
+
+        cached = self._pages.get(key)
+        if cached is not None:
+            if self._is_fresh(cached):
+                self._pages.move_to_end(key)
+                return cached
+            if self.config.stale_while_revalidate:
+                self._pages.move_to_end(key)
+                self._revalidate(key, filters, page, page_size)
+                return cached
+
+        return await self.flights.do(key, lambda: self._load(key, filters, page, page_size))
+
+    def _is_fresh(self, cached: CachedPage) -> bool:
+        return time.monotonic() - cached.created < self.config.ttl
+
+    async def _fill(
+        self,
+        session: AsyncSession,
+        filters: BlogListFilters,
+        page: int,
+        page_size: int,
+        listing: BlogListing | None = None,
+    ) -> CachedPage:
+        if listing is None:
+            listing = await get_blog_listing(session=session, filters=filters)
+        data = await get_blog_listing_page(
+            session=session, listing=listing, page=page, page_size=page_size
+        )
+        cached = CachedPage(
+            data=data,
+            etag_parts=listing.etag_parts(page, page_size),
+            last_modified=listing.last_modified,
+            author_id=filters.author_id,
+        )
+        if filters.tag:
+            # Фильтр tag - подстрока, поэтому под него может подойти и новый тег
+            groups = await get_tag_groups(session, tag=filters.tag)
+            cached.tag_ids = frozenset(groups[0])
+            cached.max_tag_id = await get_max_tag_id(session)
+        return cached
+
+    async def _load(
+        self,
+        key: ListingKey | None,
+        filters: BlogListFilters,
+        page: int,
+        page_size: int,
+        listing: BlogListing | None = None,
+    ) -> CachedPage:
+        version = self._version
+        async with read_session_factory()() as session:
+            cached = await self._fill(session, filters, page, page_size, listing)
+        if key is not None:
+            self._store(key, cached, version)
+        return cached
+
+    def _store(self, key: ListingKey, cached: CachedPage, version: int) -> None:
+        if version != self._version:
+            return
+        self._pages[key] = cached
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.config.size:
+            self._pages.popitem(last=False)
+
+    def _revalidate(
+        self, key: ListingKey, filters: BlogListFilters, page: int, page_size: int
+    ) -> None:
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, filters, page, page_size))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(
+        self, key: ListingKey, filters: BlogListFilters, page: int, page_size: int
+    ) -> None:
+        try:
+            await self.flights.do(key, lambda: self._load(key, filters, page, page_size))
+        except SQLAlchemyError as e:
+            logger.error("Ошибка при обновлении страницы ленты %s: %s" % (key, e))
+
+    def apply(self, events: list[BlogChangeEvent]) -> None:
+        events = [event for event in events if event.affects_listing]
+        if not events:
+            return
+        self._version += 1
+        # идущие чтения могли начаться до изменения, новые запросы к ним не присоединяются
+        self.flights.forget()
+        for key, cached in list(self._pages.items()):
+            if any(cached.affected_by(event) for event in events):
+                del self._pages[key]
+
+    async def stop(self) -> None:
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._refreshing.clear()
+        self._pages.clear()
+
+
+listing_cache = ListingCache(settings.listing_cache)
+change_feed.subscribe(listing_cache.apply)
@@ -36,6 +36,7 @@ class BlogFullResponse(BaseModelConfig):
     short_description: str
     created_at: datetime
     status: str
+    views: int = 0
     tags: List[TagResponse]
     # Это поле нужно для работы computed fields, но оно не будет включено в финальный JSON
     user: UserBase = Field(exclude=True)
@@ -54,6 +55,55 @@ class BlogFullResponse(BaseModelConfig):
         return None
 
 
+class BlogLinkResponse(BaseModelConfig):
+    id: int
+    title: str
+    short_description: str
+
+
+class TagSuggestion(BaseModelConfig):
+    name: str
+    count: int
+
+
+class TagStatsResponse(BaseModelConfig):
+    id: int
+    name: str
+    count: int
+
+
+class TagStatsPage(BaseModel):
+    page: int
+    total_page: int
+    total_result: int
+    tags: List[TagStatsResponse]
+
+
+class BlogBulkIds(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=10000, description="ID блогов")
+
+
+class BlogBulkStatus(BlogBulkIds):
+    new_status: str = Field(description="Новый статус: 'draft' или 'published'")
+
+
 class BlogNotFind(BaseModel):
     message: str
     status: str
+
+
+# Сколько блогов можно запросить за раз в /api/blogs/batch
+BATCH_MAX_IDS = 500
+
+
+class BlogBatchIds(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=BATCH_MAX_IDS, description="ID блогов")
+
+
+class BlogBatchMiss(BlogNotFind):
+    id: int
+
+
+class BlogBatchResponse(BaseModel):
+    # в порядке запрошенных id; ненайденные и чужие черновики - BlogBatchMiss
+    blogs: List[BlogFullResponse | BlogBatchMiss]
@@ -0,0 +1,222 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from itertools import chain
+from logging import getLogger
+from typing import AsyncIterator
+
+import orjson
+
+from core.changes import change_feed, BlogChangeEvent
+from core.config import settings, StreamConfig
+from core.models.base import BlogChange
+
+logger = getLogger(__name__)
+
+PING = b": ping\n\n"
+# Журнал догнать не удалось (слишком много пропущено): клиенту нужно перечитать ленту
+RESET = b"event: reset\ndata: {}\n\n"
+
+
+def published_change_criteria(author_id: int | None = None, tag_id: int | None = None) -> list:
+    """Условия на журнал изменений для событий публикации с фильтрами потока."""
+    criteria = [BlogChange.kind.in_(("created", "status")), BlogChange.status == "published"]
+    if author_id is not None:
+        criteria.append(BlogChange.author == author_id)
+    if tag_id is not None:
+        criteria.append(("," + BlogChange.tag_ids + ",").contains(f",{tag_id},"))
+    return criteria
+
+
+def format_event(event: BlogChangeEvent) -> bytes:
+    data = orjson.dumps(
+        {"blog_id": event.blog_id, "author": event.author, "tag_ids": event.tag_ids}
+    )
+    return b"id: %d\nevent: published\ndata: %s\n\n" % (event.id, data)
+
+
+@dataclass
+class StreamStats:
+    """Счётчики потока публикаций (в пределах одного воркера)."""
+
+    connected: int = 0
+    rejected: int = 0
+    published: int = 0
+    delivered: int = 0
+    dropped: int = 0
+
+
+class Subscription:
+    """Один открытый поток: фильтр и ограниченная очередь готовых сообщений."""
+
+    __slots__ = ("author_id", "tag_id", "size", "buffer", "ready", "closed")
+
+    def __init__(self, author_id: int | None, tag_id: int | None, size: int):
+        self.author_id = author_id
+        self.tag_id = tag_id
+        self.size = size
+        self.buffer: deque[tuple[int, bytes]] = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def matches(self, event: BlogChangeEvent) -> bool:
+        return (self.author_id is None or event.author == self.author_id) and (
+            self.tag_id is None or self.tag_id in event.tag_ids
+        )
+
+    def push(self, event_id: int, message: bytes) -> bool:
+        if len(self.buffer) >= self.size:
+            return False
+        self.buffer.append((event_id, message))
+        self.ready.set()
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        self.ready.set()
+
+    async def next(self, timeout: float) -> list[tuple[int, bytes]]:
+        """Всё накопленное; пустой список - за timeout ничего не пришло или поток закрыт."""
+        if not self.buffer and not self.closed:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.ready.clear()
+        items = list(self.buffer)
+        self.buffer.clear()
+        return items
+
+
+class PublishedStream:
+    """
+    Раздача событий публикации блогов открытым потокам /api/blogs/stream (SSE).
+
+    Источник - журнал изменений (core.changes.ChangeFeed), поэтому поток
+    получает публикации всех воркеров, а id события SSE - это id записи
+    журнала: по Last-Event-ID поток догоняет пропущенное из blog_changes.
+    Подписчики хранятся по фильтру (автор, тег или все), и событие
+    просматривает только подходящие; сообщение кодируется один раз на всех.
+    Простаивающий поток - одна корутина, ждущая asyncio.Event. Очередь
+    подписчика ограничена buffer_size: отстающий поток закрывается, и клиент
+    переподключается с Last-Event-ID, не задерживая остальных.
+    """
+
+    def __init__(self, config: StreamConfig):
+        self.config = config
+        self.stats = StreamStats()
+        self._all: set[Subscription] = set()
+        self._by_author: dict[int, set[Subscription]] = {}
+        self._by_tag: dict[int, set[Subscription]] = {}
+        self._count = 0
+
+    def _group(self, subscription: Subscription, create: bool = False) -> set | None:
+        # подписчик хранится в одной группе: по тегу, иначе по автору, иначе среди всех
+        if subscription.tag_id is not None:
+            index, key = self._by_tag, subscription.tag_id
+        elif subscription.author_id is not None:
+            index, key = self._by_author, subscription.author_id
+        else:
+            return self._all
+        if create:
+            return index.setdefault(key, set())
+        return index.get(key)
+
+    def subscribe(self, author_id: int | None = None, tag_id: int | None = None) -> Subscription | None:
+        """Новый подписчик; None - поток выключен или воркер уже держит max_subscribers."""
+        if not self.config.enabled or self._count >= self.config.max_subscribers:
+            self.stats.rejected += 1
+            return None
+        subscription = Subscription(author_id, tag_id, self.config.buffer_size)
+        self._group(subscription, create=True).add(subscription)
+        self._count += 1
+        self.stats.connected += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        group = self._group(subscription)
+        if group is None or subscription not in group:
+            return
+        group.discard(subscription)
+        self._count -= 1
+        if not group and group is not self._all:
+            index = self._by_tag if subscription.tag_id is not None else self._by_author
+            del index[subscription.tag_id if subscription.tag_id is not None else subscription.author_id]
+
+    def apply(self, events: list[BlogChangeEvent]) -> None:
+        if not self._count:
+            return
+        slow = set()
+        for event in events:
+            if event.kind not in ("created", "status") or not event.published:
+                continue
+            self.stats.published += 1
+            message = format_event(event)
+            targets = chain(
+                self._all,
+                self._by_author.get(event.author, ()),
+                *(self._by_tag.get(tag_id, ()) for tag_id in event.tag_ids),
+            )
+            for subscription in targets:
+                if subscription in slow or not subscription.matches(event):
+                    continue
+                if subscription.push(event.id, message):
+                    self.stats.delivered += 1
+                else:
+                    slow.add(subscription)
+        for subscription in slow:
+            self.stats.dropped += 1
+            subscription.close()
+            self.unsubscribe(subscription)
+
+    async def events(
+        self, subscription: Subscription, replay: list[BlogChangeEvent], complete: bool = True
+    ) -> AsyncIterator[bytes]:
+        """
+        Тело ответа: сначала события из журнала после Last-Event-ID (replay),
+        затем новые. complete=False - журнал догнан не полностью.
+        """
+        last_id = 0
+        try:
+            yield b"retry: %d\n\n" % self.config.retry
+            if replay:
+                yield b"".join(format_event(event) for event in replay)
+                last_id = replay[-1].id
+            if not complete:
+                yield RESET
+            while True:
+                items = await subscription.next(self.config.heartbeat)
+                # события могли попасть и в replay, и в очередь
+                chunk = b"".join(message for event_id, message in items if event_id > last_id)
+                if items:
+                    last_id = max(last_id, items[-1][0])
+                if chunk:
+                    yield chunk
+                elif subscription.closed:
+                    break
+                elif not items:
+                    yield PING
+        finally:
+            self.unsubscribe(subscription)
+
+    async def stop(self) -> None:
+        """Закрывает все потоки, чтобы сервер не ждал их при остановке."""
+        for subscription in chain(self._all, *self._by_author.values(), *self._by_tag.values()):
+            subscription.close()
+
+    def log_stats(self) -> None:
+        logger.info(
+            "Поток публикаций: подключений %s, отказов %s, событий %s, доставлено %s, "
+            "закрыто отстающих %s"
+            % (
+                self.stats.connected,
+                self.stats.rejected,
+                self.stats.published,
+                self.stats.delivered,
+                self.stats.dropped,
+            )
+        )
+
+
+published_stream = PublishedStream(settings.stream)
+change_feed.subscribe(published_stream.apply)
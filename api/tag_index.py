@@ -0,0 +1,227 @@
+import heapq
+import math
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from logging import getLogger
+
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.crud import get_related_blog_ids
+from core.archive import blog_archive
+from core.changes import change_feed, BlogChangeEvent
+from core.config import settings, TagIndexConfig
+from core.models.archive import ArchivedBlog, ArchivedBlogTag
+from core.models.base import Blog, BlogTag
+
+try:
+    import numpy as np
+except ImportError:  # numpy не обязателен, без него подсчёт идёт на чистом Python
+    np = None
+
+logger = getLogger(__name__)
+
+
+class TagIndex:
+    """
+    Индекс тегов опубликованных блогов в памяти воркера.
+    Для каждого тега хранится отсортированный массив id блогов (postings),
+    для каждого блога - его теги и автор. Строится при старте из blog_tags и
+    обновляется по журналу изменений (core.changes.ChangeFeed).
+
+    Ленты с фильтром по тегам собираются пересечением и объединением
+    postings, из БД по первичному ключу читается только нужная страница.
+
+    Похожесть блогов - косинус между вектором тегов исходного блога с весами
+    IDF (редкий общий тег значит больше частого) и бинарным вектором кандидата:
+    сумма весов общих тегов, делённая на корень из числа тегов кандидата.
+    """
+
+    def __init__(self, config: TagIndexConfig):
+        self.config = config
+        self.loaded = False
+        self.version = 0  # растёт при каждом применённом изменении
+        self._postings: dict[int, array] = {}
+        self._blog_tags: dict[int, tuple[int, ...]] = {}
+        # число тегов и автор по id блога: плотные массивы для векторной выборки
+        self._sizes = array("H")
+        self._authors = array("q")
+
+    async def load(self, session: AsyncSession) -> None:
+        if not self.config.enabled:
+            return
+        rows = (
+            select(BlogTag.blog_id, BlogTag.tag_id, Blog.author)
+            .join(Blog, Blog.id == BlogTag.blog_id)
+            .where(Blog.status == "published")
+        )
+        if blog_archive.available:
+            # архивные блоги остаются в лентах по тегам; UNION убирает блог,
+            # который после сбоя переноса есть в обоих файлах
+            rows = union(
+                rows,
+                select(ArchivedBlogTag.blog_id, ArchivedBlogTag.tag_id, ArchivedBlog.author)
+                .join(ArchivedBlog, ArchivedBlog.id == ArchivedBlogTag.blog_id),
+            )
+        rows = rows.subquery()
+        query = select(rows).order_by(rows.c.blog_id)
+        blog_tags: dict[int, list[int]] = defaultdict(list)
+        authors: dict[int, int] = {}
+        postings: dict[int, array] = defaultdict(lambda: array("q"))
+        for blog_id, tag_id, author in await session.execute(query):
+            blog_tags[blog_id].append(tag_id)
+            authors[blog_id] = author
+            # строки идут по возрастанию blog_id, массивы получаются отсортированными
+            postings[tag_id].append(blog_id)
+
+        self._blog_tags = {blog_id: tuple(tags) for blog_id, tags in blog_tags.items()}
+        self._postings = dict(postings)
+        size = max(self._blog_tags, default=0) + 1
+        self._sizes = array("H", bytes(2 * size))
+        self._authors = array("q", bytes(8 * size))
+        for blog_id, tags in self._blog_tags.items():
+            self._sizes[blog_id] = len(tags)
+            self._authors[blog_id] = authors[blog_id]
+        self.loaded = True
+        self.version += 1
+        logger.info(
+            "Индекс тегов построен: %s блогов, %s тегов"
+            % (len(self._blog_tags), len(self._postings))
+        )
+
+    def apply(self, events: list[BlogChangeEvent]) -> None:
+        if not self.loaded:
+            return
+        for event in events:
+            self._remove(event.blog_id)
+            if event.published and event.tag_ids:
+                self._add(event.blog_id, event.tag_ids, event.author)
+        self.version += 1
+
+    def _add(self, blog_id: int, tag_ids: tuple[int, ...], author: int) -> None:
+        self._blog_tags[blog_id] = tag_ids
+        if blog_id >= len(self._sizes):
+            grow = blog_id + 1 - len(self._sizes)
+            self._sizes.frombytes(bytes(2 * grow))
+            self._authors.frombytes(bytes(8 * grow))
+        self._sizes[blog_id] = len(tag_ids)
+        self._authors[blog_id] = author
+        for tag_id in tag_ids:
+            insort(self._postings.setdefault(tag_id, array("q")), blog_id)
+
+    def _remove(self, blog_id: int) -> None:
+        if blog_id < len(self._sizes):
+            self._sizes[blog_id] = 0
+        for tag_id in self._blog_tags.pop(blog_id, ()):
+            posting = self._postings[tag_id]
+            i = bisect_left(posting, blog_id)
+            if i < len(posting) and posting[i] == blog_id:
+                del posting[i]
+            if not posting:
+                del self._postings[tag_id]
+
+    def tags_of(self, blog_id: int) -> tuple[int, ...]:
+        return self._blog_tags.get(blog_id, ())
+
+    def select(self, groups: list[list[int]], author_id: int | None = None) -> list[int]:
+        """
+        Отсортированные id опубликованных блогов, у которых в каждой группе
+        есть хотя бы один тег: объединение внутри группы, пересечение между группами.
+        """
+        if not groups or not all(groups):
+            return []
+        if np is not None:
+            return self._select_numpy(groups, author_id)
+        return self._select_python(groups, author_id)
+
+    def _select_numpy(self, groups: list[list[int]], author_id: int | None) -> list[int]:
+        result = None
+        # сначала самые узкие группы: пересечение быстрее сужается
+        for group in sorted(groups, key=self._group_size):
+            postings = [
+                np.frombuffer(self._postings[t], dtype=np.int64)
+                for t in group
+                if t in self._postings
+            ]
+            if not postings:
+                return []
+            ids = postings[0] if len(postings) == 1 else np.unique(np.concatenate(postings))
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if not len(result):
+                return []
+        if author_id is not None:
+            result = result[np.frombuffer(self._authors, dtype=np.int64)[result] == author_id]
+        return result.tolist()
+
+    def _select_python(self, groups: list[list[int]], author_id: int | None) -> list[int]:
+        result = None
+        for group in sorted(groups, key=self._group_size):
+            ids = set()
+            for tag_id in group:
+                ids.update(self._postings.get(tag_id, ()))
+            result = ids if result is None else result & ids
+            if not result:
+                return []
+        if author_id is not None:
+            result = {blog_id for blog_id in result if self._authors[blog_id] == author_id}
+        return sorted(result)
+
+    def _group_size(self, group: list[int]) -> int:
+        return sum(len(self._postings.get(t, ())) for t in group)
+
+    def related(self, blog_id: int, limit: int = 5) -> list[int]:
+        """id похожих опубликованных блогов, лучшие первыми. Черновиков в индексе нет."""
+        tag_ids = self._blog_tags.get(blog_id)
+        if not tag_ids:
+            return []
+        total = len(self._blog_tags)
+        weights = {t: math.log(1 + total / len(self._postings[t])) for t in tag_ids}
+        if np is not None:
+            return self._related_numpy(blog_id, weights, limit)
+        return self._related_python(blog_id, weights, limit)
+
+    def _related_numpy(self, blog_id: int, weights: dict[int, float], limit: int) -> list[int]:
+        postings = [np.frombuffer(self._postings[t], dtype=np.int64) for t in weights]
+        ids = np.concatenate(postings)
+        tag_weights = np.repeat(
+            np.fromiter(weights.values(), dtype=np.float64, count=len(weights)),
+            [len(p) for p in postings],
+        )
+        candidates, inverse = np.unique(ids, return_inverse=True)
+        overlap = np.bincount(inverse, weights=tag_weights)
+        sizes = np.frombuffer(self._sizes, dtype=np.uint16)[candidates]
+        scores = overlap / np.sqrt(sizes)
+        scores[candidates == blog_id] = -1.0
+
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        # при равной похожести первыми идут более новые блоги
+        order = top[np.lexsort((-candidates[top], -scores[top]))]
+        return [int(c) for c, s in zip(candidates[order], scores[order]) if s > 0]
+
+    def _related_python(self, blog_id: int, weights: dict[int, float], limit: int) -> list[int]:
+        overlap: dict[int, float] = defaultdict(float)
+        for tag_id, weight in weights.items():
+            for candidate in self._postings[tag_id]:
+                overlap[candidate] += weight
+        overlap.pop(blog_id, None)
+        top = heapq.nlargest(
+            limit,
+            overlap.items(),
+            key=lambda item: (item[1] / math.sqrt(len(self._blog_tags[item[0]])), item[0]),
+        )
+        return [candidate for candidate, _ in top]
+
+
+tag_index = TagIndex(settings.tag_index)
+change_feed.subscribe(tag_index.apply)
+
+
+async def related_blog_ids(session: AsyncSession, blog_id: int, limit: int = 5) -> list[int]:
+    """Похожие блоги из индекса, а если он отключён - SQL-запросом."""
+    if tag_index.loaded:
+        return tag_index.related(blog_id, limit)
+    return await get_related_blog_ids(session=session, blog_id=blog_id, limit=limit)
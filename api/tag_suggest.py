@@ -0,0 +1,112 @@
+import asyncio
+from contextlib import suppress
+import heapq
+from bisect import bisect_left, insort
+from collections import defaultdict
+from logging import getLogger
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings, TagSuggestConfig
+from core.models.db_helper import db_helper
+from .crud import get_tag_usage
+
+logger = getLogger(__name__)
+
+
+class TagSuggest:
+    """
+    Подсказки тегов по префиксу, самые используемые первыми.
+    Названия хранятся отсортированным списком: префикс - это диапазон,
+    найденный двоичным поиском. Для префиксов не длиннее prefix_depth
+    (самые широкие диапазоны) лучшие top_size тегов посчитаны заранее.
+
+    Новые теги и использования этого воркера добавляются сразу после
+    коммита (add_usage), удаления и теги других воркеров подхватываются
+    полным перечитыванием раз в refresh_interval.
+    """
+
+    def __init__(self, config: TagSuggestConfig):
+        self.config = config
+        self.loaded = False
+        self._names: list[str] = []
+        self._counts: dict[str, int] = {}
+        self._tops: dict[str, list[str]] = {}
+        self._task: asyncio.Task | None = None
+
+    async def load(self, session: AsyncSession) -> None:
+        if not self.config.enabled:
+            return
+        rows = await get_tag_usage(session)
+        counts = {row.name: row.count for row in rows}
+
+        groups: dict[str, list[str]] = defaultdict(list)
+        for name in counts:
+            for depth in range(self.config.prefix_depth + 1):
+                if depth <= len(name):
+                    groups[name[:depth]].append(name)
+
+        self._names = sorted(counts)
+        self._counts = counts
+        self._tops = {
+            prefix: heapq.nsmallest(self.config.top_size, names, key=self._rank)
+            for prefix, names in groups.items()
+        }
+        self.loaded = True
+        logger.info("Индекс подсказок тегов построен: %s тегов" % len(counts))
+
+    def _rank(self, name: str) -> tuple[int, str]:
+        return -self._counts[name], name
+
+    def add_usage(self, names: list[str]) -> None:
+        """Учитывает теги нового блога: новые названия добавляются в индекс."""
+        if not self.loaded:
+            return
+        for name in names:
+            if name not in self._counts:
+                insort(self._names, name)
+                self._counts[name] = 0
+            self._counts[name] += 1
+            for depth in range(min(self.config.prefix_depth, len(name)) + 1):
+                self._update_top(name[:depth], name)
+
+    def _update_top(self, prefix: str, name: str) -> None:
+        top = self._tops.setdefault(prefix, [])
+        if name not in top:
+            top.append(name)
+        top.sort(key=self._rank)
+        del top[self.config.top_size:]
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+        prefix = prefix.strip().lower()
+        limit = min(limit, self.config.top_size)
+        if len(prefix) <= self.config.prefix_depth:
+            names = self._tops.get(prefix, [])[:limit]
+        else:
+            start = bisect_left(self._names, prefix)
+            end = bisect_left(self._names, prefix + "\U0010ffff", start)
+            names = heapq.nsmallest(limit, self._names[start:end], key=self._rank)
+        return [(name, self._counts[name]) for name in names]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.refresh_interval)
+            try:
+                async with db_helper.session_factory() as session:
+                    await self.load(session)
+            except Exception as e:
+                logger.error("Ошибка при обновлении подсказок тегов: %s" % e)
+
+    def start(self) -> None:
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+tag_suggest = TagSuggest(settings.tag_suggest)
@@ -0,0 +1,76 @@
+import sqlite3
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+
+from fastapi import Request
+from sqlalchemy.exc import IntegrityError
+
+
+def make_etag(*parts) -> str:
+    """
+    Слабый ETag из набора значений, однозначно определяющих ответ
+    (например id, updated_at и статус блога). Содержимое блога не читается.
+    """
+    digest = blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite хранит CURRENT_TIMESTAMP в UTC без указания зоны
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_as_utc(value), usegmt=True)
+
+
+def cache_headers(
+    etag: str, last_modified: datetime | None = None, private: bool = False
+) -> dict[str, str]:
+    """
+    Заголовки валидации кэша. Черновики видит только автор,
+    поэтому их нельзя сохранять в общих кэшах (CDN, прокси).
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache" if private else "public, no-cache",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: datetime | None = None
+) -> bool:
+    """
+    Проверка If-None-Match / If-Modified-Since (RFC 9110).
+    If-None-Match имеет приоритет; If-Modified-Since учитывается только без него
+    и только если передан last_modified.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # слабое сравнение: префикс W/ не учитывается
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    """Нарушение UNIQUE по коду ошибки драйвера, а не по тексту сообщения."""
+    return getattr(error.orig, "sqlite_errorcode", None) == sqlite3.SQLITE_CONSTRAINT_UNIQUE
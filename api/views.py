@@ -1,40 +1,85 @@
 from logging import getLogger
 
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import IntegrityError
-from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from api.dependencies import get_current_user_optional
 
+from core.archive import blog_archive
+from core.changes import change_feed, read_blog_changes
+from core.config import settings
+from core.jobs import job_queue
 from core.models.base import User
 from core.models.db_helper import db_helper
+from core.replica import read_session_dependency
 from .schemes import (
     BlogCreateSchemaBase,
     BlogCreateSchemaAdd,
     BlogFullResponse,
+    BlogLinkResponse,
     BlogNotFind,
+    TagSuggestion,
+    TagStatsPage,
+    BlogBulkIds,
+    BlogBulkStatus,
+    BlogBatchIds,
+    BlogBatchMiss,
+    BlogBatchResponse,
+    BATCH_MAX_IDS,
 )
 from .crud import (
-    add_blog_to_bd,
-    add_tags_to_bd,
-    add_blog_tags_to_bd,
-    get_full_blog_info,
+    create_blog_with_tags,
     delete_blog,
     change_blog_status,
-    get_blog_list,
+    get_blog_meta,
+    get_most_viewed_blogs,
+    get_blog_titles,
+    get_tag_suggestions,
+    get_tag_stats_page,
+    reconcile_tag_stats,
+    normalize_tag_names,
+    bulk_change_blog_status,
+    bulk_delete_blogs,
+    get_tag_id,
+    get_full_blogs_info,
 )
+from .blog_reads import get_full_blog_info_shared
+from .counters import view_counter
+from .listing import BlogListFilters
+from .listing_cache import listing_cache
+from .stream import published_stream, published_change_criteria
+from .tag_index import related_blog_ids
+from .tag_suggest import tag_suggest
+from .utils import make_etag, cache_headers, is_not_modified, is_unique_violation
 
 router = APIRouter(prefix="/api", tags=["API"])
 
 logger = getLogger(__name__)
 
 
+@job_queue.register("tags.reconcile_stats", concurrency=1)
+async def reconcile_tag_stats_job(payload: dict) -> None:
+    """Фоновая задача: исправление расхождений tag_stats с blog_tags."""
+    async with db_helper.session_factory() as session:
+        fixed = await reconcile_tag_stats(session)
+        await session.commit()
+    if fixed:
+        logger.warning("Исправлены счётчики %s тегов" % fixed)
+
+
+@job_queue.register("blogs.archive", concurrency=1, max_attempts=1)
+async def archive_blogs_job(payload: dict) -> None:
+    """Фоновая задача: перенос старых блогов в архив (core.archive)."""
+    if await blog_archive.run():
+        await change_feed.catch_up()
+
+
 @router.post("/add_post/", summary="Добавление нового блога с тегами")
 async def add_blog(
     add_data: BlogCreateSchemaBase,
     user_data: User = Depends(get_current_user_optional),
-    session: AsyncSession = Depends(db_helper.session_dependency),
 ):
     logger.info("Информация о юзере: %s" % user_data)
 
@@ -42,26 +87,26 @@ async def add_blog(
     blog_dict["author"] = int(user_data.id)
     tags = blog_dict.pop("tags", [])
 
-    try:
-        blog = await add_blog_to_bd(
-            session=session, values=BlogCreateSchemaAdd.model_validate(blog_dict)
+    async def write(session: AsyncSession) -> int:
+        return await create_blog_with_tags(
+            session=session,
+            values=BlogCreateSchemaAdd.model_validate(blog_dict),
+            tag_names=tags,
         )
-        blog_id = blog.id
 
-        if tags:
-            tags_ids = await add_tags_to_bd(session=session, tag_names=tags)
-            await add_blog_tags_to_bd(
-                session=session,
-                blog_tag_pairs=[{"blog_id": blog_id, "tag_id": i} for i in tags_ids],
-            )
-            await session.commit()
+    try:
+        # Единственный коммит: блог, теги и связи фиксируются вместе. Рендер HTML
+        # и сброс кэшей - по журналу изменений в каждом воркере (pages.render)
+        blog_id = await db_helper.write(write)
+        await change_feed.catch_up()
+        tag_suggest.add_usage(normalize_tag_names(tags))
 
         return {
             "status": "success",
             "message": f"Блог с ID {blog_id} успешно добавлен с тегами.",
         }
     except IntegrityError as e:
-        if "UNIQUE constraint failed" in str(e.orig):
+        if is_unique_violation(e):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Блог с таким заголовком уже существует.",
@@ -72,22 +117,34 @@ async def add_blog(
         )
 
 
-async def get_blog_info(
-    blog_id: int,
+@router.get("/get_blog/{blog_id}", summary="Получить информацию по блогу")
+async def get_blog_endpoint(
+    blog_id: int, 
+    request: Request,
+    response: Response,
     session: AsyncSession = Depends(db_helper.session_dependency),
     user_data: User = Depends(get_current_user_optional),
-):
+) -> BlogFullResponse | BlogNotFind:
     author_id = user_data.id if user_data else None
-    return await get_full_blog_info(
-        session=session, blog_id=blog_id, author_id=author_id
-    )
 
+    # Сначала дешёвый запрос метаданных: при совпадении ETag тело не загружаем
+    meta = await get_blog_meta(session=session, blog_id=blog_id)
+    if meta and (meta.status == "published" or meta.author == author_id):
+        # Просмотры в ETag не входят: иначе он менялся бы при каждом сбросе
+        # счётчика, и повторные запросы не получали бы 304
+        etag = make_etag("blog", meta.id, meta.updated_at, meta.status)
+        headers = cache_headers(etag, meta.updated_at, private=meta.status != "published")
+        if is_not_modified(request, etag, meta.updated_at):
+            # проверка актуальности кэша - не просмотр
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+        if meta.status == "published":
+            view_counter.hit(blog_id)
 
-@router.get("/get_blog/{blog_id}", summary="Получить информацию по блогу")
-async def get_blog_endpoint(
-    blog_id: int, 
-    blog_info: BlogFullResponse | BlogNotFind = Depends(get_blog_info)
-) -> BlogFullResponse | BlogNotFind:
+    # Общее чтение открывает свою сессию: соединение этой возвращаем в пул,
+    # иначе при занятом пуле запросы ждут друг друга до pool_timeout
+    await session.close()
+    blog_info = await get_full_blog_info_shared(blog_id=blog_id, author_id=author_id)
     logger.info("Blog_info %s" % blog_info)
     return blog_info
 
@@ -95,12 +152,11 @@ async def get_blog_endpoint(
 async def delete_blog_endpoint(
     blog_id: int,
     author: User = Depends(get_current_user_optional),
-    session: AsyncSession = Depends(db_helper.session_dependency),
 ):
-    result = await delete_blog(blog_id, author.id, session)
+    result = await db_helper.write(lambda s: delete_blog(blog_id, author.id, s))
     if result['status'] == 'error':
         raise HTTPException(status_code=400, detail=result['message'])
-    await session.commit()
+    await change_feed.catch_up()
     return result
 
 @router.put("/change_blog_status/{blog_id}", summary="Обновить блог")
@@ -108,27 +164,220 @@ async def change_blog_status_endpoint(
     blog_id: int,
     new_status: str,
     author: User = Depends(get_current_user_optional),
-    session: AsyncSession = Depends(db_helper.session_dependency),
 ):
-    
-    result = await change_blog_status(blog_id, new_status, author.id, session)
+    try:
+        result = await db_helper.write(
+            lambda s: change_blog_status(blog_id, new_status, author.id, s)
+        )
+    except SQLAlchemyError as e:
+        result = {
+            "message": f"Произошла ошибка при изменении статуса блога: {str(e)}",
+            "status": "error",
+        }
     if result['status'] == 'error':
         raise HTTPException(status_code=400, detail=result['message'])
-    await session.commit()
+    await change_feed.catch_up()
     return result
     
+@router.put("/blogs/bulk_status", summary="Изменить статус нескольких блогов")
+async def bulk_change_blog_status_endpoint(
+    data: BlogBulkStatus,
+    author: User = Depends(get_current_user_optional),
+):
+    result = await db_helper.write(
+        lambda s: bulk_change_blog_status(s, data.ids, data.new_status, author.id)
+    )
+    if result['status'] == 'error':
+        raise HTTPException(status_code=400, detail=result['message'])
+    await change_feed.catch_up()
+    return result
+
+
+@router.post("/blogs/bulk_delete", summary="Удалить несколько блогов")
+async def bulk_delete_blogs_endpoint(
+    data: BlogBulkIds,
+    author: User = Depends(get_current_user_optional),
+):
+    result = await db_helper.write(lambda s: bulk_delete_blogs(s, data.ids, author.id))
+    await change_feed.catch_up()
+    return result
+
+
 @router.get('/blogs/', summary="Получить все блоги в статусе 'publish'")
 async def get_blogs_info(
+        request: Request,
+        response: Response,
         author_id: int | None = None,
         tag: str | None = None,
+        tags: list[str] | None = Query(None, description="Точные названия тегов"),
+        match: str = Query("any", pattern="^(any|all)$", description="Любой из tags или все"),
         page: int = Query(1, ge=1, description="Номер страницы"),
         page_size: int = Query(10, ge=10, le=100, description="Записей на странице"),
         session: AsyncSession = Depends(db_helper.session_dependency),
 ):
     try:
-        result = await get_blog_list(session=session, author_id=author_id, tag=tag, page=page,
-                                             page_size=page_size)
-        return result if result['blogs'] else BlogNotFind(message="Блоги не найдены", status='error')
+        filters = BlogListFilters(
+            author_id=author_id, tag=tag, tags=tags, match_all=match == "all"
+        )
+        # Удаление блога не меняет max(updated_at), поэтому в ETag входит и количество,
+        # а If-Modified-Since для ленты не проверяем
+        cached = await listing_cache.get(
+            filters,
+            page,
+            page_size,
+            unchanged=lambda parts: is_not_modified(request, make_etag("blogs", *parts)),
+        )
+        etag = make_etag("blogs", *cached.etag_parts)
+        headers = cache_headers(etag, cached.last_modified)
+        if is_not_modified(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+        if not cached.data['blogs']:
+            return BlogNotFind(message="Блоги не найдены", status='error')
+        return Response(content=cached.body, media_type="application/json", headers=headers)
     except Exception as e:
         logger.error(f"Ошибка при получении блогов: {e}")
-        return JSONResponse(status_code=500, content={"detail": "Ошибка сервера"})
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"detail": "Ошибка сервера"})
+
+
+async def _blogs_batch(
+    session: AsyncSession, ids: list[int], author_id: int | None
+) -> tuple[BlogBatchResponse, list]:
+    """Ответ в порядке ids и части ETag; просмотры не засчитываются."""
+    found = await get_full_blogs_info(session=session, ids=ids, author_id=author_id)
+    blogs, etag_parts = [], []
+    for blog_id in ids:
+        blog = found[blog_id]
+        if isinstance(blog, dict):
+            blogs.append(BlogBatchMiss(id=blog_id, **blog))
+            etag_parts.append(blog_id)
+        else:
+            blogs.append(BlogFullResponse.model_validate(blog))
+            # просмотры в ETag не входят, как и у /api/get_blog/: иначе каждый
+            # сброс счётчика обесценивал бы кэш клиента
+            etag_parts.append((blog.id, blog.updated_at, blog.status))
+    return BlogBatchResponse(blogs=blogs), etag_parts
+
+
+@router.get('/blogs/batch', summary="Несколько блогов по id за один запрос")
+async def get_blogs_batch_endpoint(
+        request: Request,
+        response: Response,
+        ids: str = Query(..., pattern=r"^\d+(,\d+)*$", description="ID блогов через запятую"),
+        session: AsyncSession = Depends(db_helper.session_dependency),
+        user_data: User | None = Depends(get_current_user_optional),
+) -> BlogBatchResponse:
+    blog_ids = [int(blog_id) for blog_id in ids.split(",")]
+    if len(blog_ids) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Можно запросить не больше {BATCH_MAX_IDS} блогов",
+        )
+    author_id = user_data.id if user_data else None
+    result, etag_parts = await _blogs_batch(session, blog_ids, author_id)
+    # Черновики и недоступность чужих черновиков зависят от пользователя
+    etag = make_etag("blogs-batch", author_id, etag_parts)
+    headers = cache_headers(
+        etag, private=any(blog.status == "draft" for blog in result.blogs)
+    )
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return result
+
+
+@router.post('/blogs/batch', summary="Несколько блогов по id из тела запроса")
+async def post_blogs_batch_endpoint(
+        data: BlogBatchIds,
+        session: AsyncSession = Depends(db_helper.session_dependency),
+        user_data: User | None = Depends(get_current_user_optional),
+) -> BlogBatchResponse:
+    author_id = user_data.id if user_data else None
+    result, _ = await _blogs_batch(session, data.ids, author_id)
+    return result
+
+
+@router.get('/blogs/most_viewed/', summary="Самые просматриваемые блоги")
+async def get_most_viewed_endpoint(
+        limit: int = Query(10, ge=1, le=100, description="Количество блогов"),
+        session: AsyncSession = Depends(read_session_dependency),
+) -> list[BlogFullResponse]:
+    return await get_most_viewed_blogs(session=session, limit=limit)
+
+
+@router.get('/blogs/stream', summary="Поток новых опубликованных блогов (Server-Sent Events)")
+async def stream_published_blogs(
+        author_id: int | None = None,
+        tag: str | None = None,
+        last_event_id: str | None = Header(None, description="id последнего полученного события"),
+):
+    # Сессия не берётся зависимостью: поток открыт долго, а соединение нужно на миг
+    tag_id = None
+    if tag is not None:
+        async with db_helper.session_factory() as session:
+            tag_id = await get_tag_id(session, tag)
+        if tag_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тег не найден")
+
+    subscription = published_stream.subscribe(author_id, tag_id)
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Слишком много открытых потоков",
+            headers={"Retry-After": str(settings.admission.retry_after)},
+        )
+    # Подписка оформлена до чтения журнала: события между ними придут дважды
+    # и будут отброшены по id, но не потеряются
+    replay, complete = [], True
+    if last_event_id and last_event_id.isdigit():
+        limit = settings.stream.replay_limit
+        try:
+            async with db_helper.session_factory() as session:
+                replay = await read_blog_changes(
+                    session,
+                    int(last_event_id),
+                    limit,
+                    *published_change_criteria(author_id, tag_id),
+                )
+        except Exception:
+            published_stream.unsubscribe(subscription)
+            raise
+        complete = len(replay) < limit
+    return StreamingResponse(
+        published_stream.events(subscription, replay, complete),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get('/blogs/{blog_id}/related', summary="Похожие блоги по тегам")
+async def get_related_blogs_endpoint(
+        blog_id: int,
+        limit: int = Query(5, ge=1, le=50, description="Количество блогов"),
+        session: AsyncSession = Depends(db_helper.session_dependency),
+) -> list[BlogLinkResponse]:
+    ids = await related_blog_ids(session=session, blog_id=blog_id, limit=limit)
+    return await get_blog_titles(session=session, ids=ids)
+
+
+@router.get('/tags/suggest', summary="Подсказки тегов по началу названия")
+async def suggest_tags_endpoint(
+        prefix: str = Query("", max_length=50, description="Начало названия тега"),
+        limit: int = Query(10, ge=1, le=20, description="Количество подсказок"),
+        session: AsyncSession = Depends(db_helper.session_dependency),
+) -> list[TagSuggestion]:
+    if tag_suggest.loaded:
+        suggestions = tag_suggest.suggest(prefix, limit)
+        return [TagSuggestion(name=name, count=count) for name, count in suggestions]
+    rows = await get_tag_suggestions(session=session, prefix=prefix.strip(), limit=limit)
+    return [TagSuggestion.model_validate(row) for row in rows]
+
+
+@router.get('/tags', summary="Теги по числу опубликованных блогов")
+async def get_tags_endpoint(
+        page: int = Query(1, ge=1, description="Номер страницы"),
+        page_size: int = Query(20, ge=1, le=100, description="Записей на странице"),
+        session: AsyncSession = Depends(db_helper.session_dependency),
+) -> TagStatsPage:
+    return await get_tag_stats_page(session=session, page=page, page_size=page_size)
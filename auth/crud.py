@@ -6,6 +6,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
 from core.models.base import User, Role
+from core.models.db_helper import db_helper
+from .roles import role_registry
+from .schemes import UserListFilters
 
 
 logger = getLogger(__name__)
@@ -43,22 +46,76 @@ async def find_one_or_none_users(session: AsyncSession, filters: BaseModel):
         logger.info("Запись не найдена по фильтрам: %s" % filter_dict)
     return user
 
-async def get_all_users(session: AsyncSession, filters: BaseModel | None):
-    if filters:
-        filter_dict = filters.model_dump(exclude_unset=True)
-    else:
-        filter_dict = {}
-
-    logger.info("Поиск одной записи по фильтрам: %s" % filter_dict)
-
-    query = select(User).filter_by(**filter_dict)
-    result = await session.execute(query)
-    users = result.scalars().all()
-    if users:
-        logger.info("Запись найдена по фильтрам: %s" % filter_dict)
-    else:
-        logger.info("Запись не найдена по фильтрам: %s" % filter_dict)
-    return users
+# Выгрузка читается пачками, каждая в своей короткой сессии
+USER_EXPORT_BATCH = 1000
+
+
+def _filter_users(filters: UserListFilters):
+    # Проекция колонок вместо ORM-объектов; имя роли - из справочника в памяти
+    query = select(
+        User.id,
+        User.email,
+        User.phone_number,
+        User.first_name,
+        User.last_name,
+        User.role_id,
+        User.created_at,
+    )
+
+    if filters.role_id is not None:
+        query = query.where(User.role_id == filters.role_id)
+    if filters.email_prefix:
+        # Диапазон вместо LIKE: так SQLite использует уникальный индекс по email
+        query = query.where(
+            User.email >= filters.email_prefix,
+            User.email < filters.email_prefix + "\U0010ffff",
+        )
+    if filters.created_from is not None:
+        query = query.where(User.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.where(User.created_at < filters.created_to)
+    return query.order_by(User.id)
+
+
+async def get_users_page(
+    session: AsyncSession,
+    filters: UserListFilters,
+    cursor: int | None = None,
+    limit: int = 50,
+):
+    """
+    Страница пользователей с пагинацией по ключу: cursor - id последнего
+    пользователя предыдущей страницы. Возвращает (строки, следующий cursor).
+    """
+    logger.info(
+        "Список пользователей по фильтрам: %s, cursor=%s"
+        % (filters.model_dump(exclude_none=True), cursor)
+    )
+
+    query = _filter_users(filters)
+    if cursor is not None:
+        query = query.where(User.id > cursor)
+    # Лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+    rows = (await session.execute(query.limit(limit + 1))).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def iter_users(filters: UserListFilters, batch_size: int = USER_EXPORT_BATCH):
+    """
+    Все пользователи по фильтрам для потоковой выгрузки.
+    Соединение не удерживается на время отправки ответа клиенту.
+    """
+    query = _filter_users(filters)
+    cursor = 0
+    while True:
+        async with db_helper.session_factory() as session:
+            rows = (await session.execute(query.where(User.id > cursor).limit(batch_size))).all()
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        cursor = rows[-1].id
 
 
 async def add_users(session: AsyncSession, values: BaseModel):
@@ -69,8 +126,8 @@ async def add_users(session: AsyncSession, values: BaseModel):
 
     new_user = User(**values_dict)
     session.add(new_user)
+    await session.flush()
 
-    await session.commit()
     logger.info(f"Запись успешно добавлена.")
     return new_user
 
@@ -88,7 +145,6 @@ async def change_user_role(session: AsyncSession, values: BaseModel):
             .values(role_id=values_dict["role_id"])
             )
     await session.execute(stmt)
-    await session.commit()
 
 
 async def add_new_role(session: AsyncSession, values: BaseModel):
@@ -98,8 +154,8 @@ async def add_new_role(session: AsyncSession, values: BaseModel):
 
     new_role = Role(**values_dict)
     session.add(new_role)
+    await role_registry.bump_version(session)
 
-    await session.commit()
     logger.info(f"Роль успешно добавлена.")
     return new_role
 
@@ -116,9 +172,18 @@ async def delete_role(
             'message': f"Роль с ID {role_id} не найдена.",
             'status': 'error'
         }
-    
+
+    # users.role_id ссылается на роль: удаление нарушило бы внешний ключ
+    in_use = await session.scalar(select(User.id).where(User.role_id == role_id).limit(1))
+    if in_use is not None:
+        return {
+            'message': f"Роль с ID {role_id} назначена пользователям.",
+            'status': 'conflict'
+        }
+
     await session.delete(role)
     await session.flush()
+    await role_registry.bump_version(session)
 
     return {
             'message': f"Роль с ID {role_id} успешно удален.",
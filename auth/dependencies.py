@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.models.base import User
 
+from .roles import role_registry
 from .utils import decoded_jwt
 from .crud import find_one_or_none_by_id
 from core.models.db_helper import db_helper
@@ -23,7 +24,7 @@ def get_token(request: Request) -> str:
 
 async def get_current_user(
         token: str = Depends(get_token),
-        session: AsyncSession = Depends(db_helper.get_scoped_session),
+        session: AsyncSession = Depends(db_helper.session_dependency),
 ):
     try:
         payload = decoded_jwt(token)
@@ -35,11 +36,17 @@ async def get_current_user(
     user = await find_one_or_none_by_id(user_id=int(user_id), session=session)
 
     logger.info("Найден пользователь %s" % user)
+    # сверяем версию справочника ролей, пока сессия запроса открыта
+    await role_registry.current(session)
     
     return user
 
-async def get_current_admin(user: User = Depends(get_current_user)):
-    if user.role_id in [2, 3]:
+async def get_current_admin(
+        user: User = Depends(get_current_user),
+        session: AsyncSession = Depends(db_helper.session_dependency),
+):
+    roles = await role_registry.current(session)
+    if roles.is_admin(user.role_id):
         return user
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail=f'У вас недостаточно прав')
@@ -0,0 +1,88 @@
+import time
+from dataclasses import dataclass, field
+from logging import getLogger
+from types import MappingProxyType
+from typing import Mapping
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings, RolesConfig
+from core.models.base import CacheVersion, Role
+
+logger = getLogger(__name__)
+
+VERSION_NAME = "roles"
+
+
+@dataclass(frozen=True)
+class RoleSnapshot:
+    """Неизменяемый снимок справочника ролей; заменяется целиком при перечитывании."""
+
+    version: int = -1
+    names: Mapping[int, str] = field(default_factory=lambda: MappingProxyType({}))
+    admin_ids: frozenset[int] = frozenset()
+
+    def role_name(self, role_id: int) -> str | None:
+        return self.names.get(role_id)
+
+    def is_admin(self, role_id: int) -> bool:
+        return role_id in self.admin_ids
+
+
+class RoleRegistry:
+    """
+    Справочник ролей и прав в памяти воркера.
+    Загружается при старте, после изменения ролей в этом воркере
+    перечитывается сразу, а изменения из других воркеров замечает
+    по версии в cache_versions, которую сверяет не чаще check_interval.
+    """
+
+    def __init__(self, config: RolesConfig):
+        self.config = config
+        self.snapshot = RoleSnapshot()
+        self._checked_at = 0.0
+
+    async def load(self, session: AsyncSession) -> RoleSnapshot:
+        version = await self._get_version(session)
+        rows = (await session.execute(select(Role.id, Role.name))).all()
+        self.snapshot = RoleSnapshot(
+            version=version,
+            names=MappingProxyType({row.id: row.name for row in rows}),
+            admin_ids=frozenset(self.config.admin_role_ids),
+        )
+        self._checked_at = time.monotonic()
+        logger.info(
+            "Загружен справочник ролей, версия %s: %s" % (version, dict(self.snapshot.names))
+        )
+        return self.snapshot
+
+    async def current(self, session: AsyncSession) -> RoleSnapshot:
+        """Актуальный снимок; версия в БД проверяется не чаще check_interval."""
+        if time.monotonic() - self._checked_at < self.config.check_interval:
+            return self.snapshot
+        self._checked_at = time.monotonic()
+        if await self._get_version(session) != self.snapshot.version:
+            return await self.load(session)
+        return self.snapshot
+
+    @staticmethod
+    async def bump_version(session: AsyncSession) -> None:
+        """Отмечает изменение ролей в текущей транзакции; коммит за вызывающим."""
+        stmt = insert(CacheVersion).values(name=VERSION_NAME, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CacheVersion.name],
+            set_={"version": CacheVersion.version + 1, "updated_at": func.now()},
+        )
+        await session.execute(stmt)
+
+    @staticmethod
+    async def _get_version(session: AsyncSession) -> int:
+        version = await session.scalar(
+            select(CacheVersion.version).where(CacheVersion.name == VERSION_NAME)
+        )
+        return version or 0
+
+
+role_registry = RoleRegistry(settings.roles)
@@ -1,4 +1,5 @@
 import re
+from datetime import datetime
 from typing import Self
 
 from pydantic import (
@@ -11,6 +12,7 @@ from pydantic import (
     model_validator,
 )
 
+from auth.roles import role_registry
 from auth.utils import hash_password
 
 
@@ -81,12 +83,40 @@ class RoleAddDB(BaseModel):
 
 class UserInfo(UserBase):
     id: int = Field(description="Идентификатор пользователя")
-    role: RoleModel = Field(exclude=True)
+    role_id: int = Field(description="Идентификатор роли")
 
     @computed_field
-    def role_name(self) -> str:
-        return self.role.name
+    def role_name(self) -> str | None:
+        # справочник ролей в памяти вместо джойна с roles
+        return role_registry.snapshot.role_name(self.role_id)
+
+
+class UserListFilters(BaseModel):
+    role_id: int | None = Field(None, description="Идентификатор роли")
+    email_prefix: str | None = Field(
+        None, min_length=1, max_length=100, description="Начало электронной почты"
+    )
+    created_from: datetime | None = Field(None, description="Зарегистрирован не раньше")
+    created_to: datetime | None = Field(None, description="Зарегистрирован раньше")
+
+
+class UserListItem(BaseModel):
+    id: int
+    email: str
+    phone_number: str
+    first_name: str
+    last_name: str
+    role_id: int
+    created_at: datetime
+    model_config = ConfigDict(from_attributes=True)
 
     @computed_field
-    def role_id(self) -> int:
-        return self.role.id
+    def role_name(self) -> str | None:
+        return role_registry.snapshot.role_name(self.role_id)
+
+
+class UserPage(BaseModel):
+    items: list[UserListItem]
+    next_cursor: int | None = Field(
+        description="Передайте в cursor для следующей страницы; null - страниц больше нет"
+    )
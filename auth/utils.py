@@ -1,29 +1,58 @@
 from datetime import datetime, timezone, timedelta
 from logging import getLogger
 
-import bcrypt
 import jwt
 
-from core.config import settings
+from core.config import settings, AuthJWT
 
 logger = getLogger(__name__)
 
+# Ключи читаются с диска при первом использовании (или в lifespan приложения),
+# а не при импорте модуля
+_jwt_config: AuthJWT = settings.auth_jwt
+_keys: dict[str, str] = {}
+
+
+def configure_jwt(config: AuthJWT) -> None:
+    global _jwt_config
+    _jwt_config = config
+    _keys.clear()
+
+
+def load_jwt_keys() -> None:
+    _keys["private"] = _jwt_config.private_key_path.read_text()
+    _keys["public"] = _jwt_config.public_key_path.read_text()
+
+
+def _get_key(name: str) -> str:
+    if name not in _keys:
+        load_jwt_keys()
+    return _keys[name]
+
+
 def hash_password(password: str) -> bytes:
+    import bcrypt  # нужен только при регистрации и входе
+
     salt = bcrypt.gensalt() 
     pwd_byts: bytes = password.encode() 
     return bcrypt.hashpw(pwd_byts, salt)  #создаём хэш пароля
 
 def validate_password(password: str, hash_password: bytes) -> bool:
+    import bcrypt
+
     return bcrypt.checkpw(password.encode(), hash_password) #проверяем хэш пароля
 
 #создаём jwt
 def encoded_jwt(
         payload: dict, 
-        private_key: str = settings.auth_jwt.private_key_path.read_text(),
-        algorithm: str = settings.auth_jwt.algorithms,
+        private_key: str | None = None,
+        algorithm: str | None = None,
         expire_timedelta: timedelta | None = None,
-        expire_days: int = settings.auth_jwt.access_token_expire_day, 
+        expire_days: int | None = None, 
 ):
+    private_key = private_key or _get_key("private")
+    algorithm = algorithm or _jwt_config.algorithms
+    expire_days = expire_days or _jwt_config.access_token_expire_day
     to_encoded = payload.copy() 
     now = datetime.now(tz=timezone.utc)
     if expire_timedelta:
@@ -37,10 +66,12 @@ def encoded_jwt(
 #создаём расшифровщик
 def decoded_jwt(
         token: str | bytes,
-        public_key: str = settings.auth_jwt.public_key_path.read_text(),
-        algorithm: str = settings.auth_jwt.algorithms,
+        public_key: str | None = None,
+        algorithm: str | None = None,
 ) -> dict[str, str]:
     logger.info("token: %s" % token)
     
+    public_key = public_key or _get_key("public")
+    algorithm = algorithm or _jwt_config.algorithms
     decoded = jwt.decode(token, public_key, algorithms=[algorithm])
-    return decoded
\ No newline at end of file
+    return decoded
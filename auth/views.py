@@ -1,12 +1,16 @@
 
 from logging import getLogger
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, HTTPException, Response, status, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Form
+from fastapi.responses import StreamingResponse
 
-from .crud import add_users, find_one_or_none_users, get_all_users, add_new_role, change_user_role, delete_role
+from .crud import add_users, find_one_or_none_users, get_users_page, iter_users, add_new_role, change_user_role, delete_role
+from .roles import role_registry
 from .dependencies import get_current_user, get_current_admin
 from .auth_jwt import validate_auth_user, create_access_token
 from .schemes import UserRegister, EmailModel, UserAddDB, UserAuth, UserInfo, RoleAddDB, ChangeUserRole
+from .schemes import UserListFilters, UserListItem, UserPage
 from core.models.db_helper import db_helper
 
 router = APIRouter(prefix='/auth', tags=['Auth'])
@@ -26,7 +30,9 @@ async def register_users(
     user_dict = user.model_dump()
     
     del user_dict['confirm_password']
-    await add_users(session=session, values=UserAddDB(**user_dict))
+    # запись идёт в своей сессии: соединение проверки почты возвращаем в пул
+    await session.close()
+    await db_helper.write(lambda s: add_users(session=s, values=UserAddDB(**user_dict)))
     return {'message': f'Вы успешно зарегистрированы!'}
 
 
@@ -50,7 +56,8 @@ async def add_role(
     user_data = Depends(get_current_admin),
 ):
     role_dict = role.model_dump()
-    await add_new_role(session=session, values=RoleAddDB(**role_dict))
+    await db_helper.write(lambda s: add_new_role(session=s, values=RoleAddDB(**role_dict)))
+    await role_registry.load(session)
     return {"message": "Новая роль успешно добавлена"}
 
 @router.put("/change_role/")
@@ -63,9 +70,16 @@ async def change_role(
     if not find_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail='Пользователь отсутствует')
+
+    roles = await role_registry.current(session)
+    if roles.role_name(user_role.role_id) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail='Роль не найдена')
     
     user_role_dict = user_role.model_dump()
-    await change_user_role(session=session, values=ChangeUserRole(**user_role_dict))
+    await db_helper.write(
+        lambda s: change_user_role(session=s, values=ChangeUserRole(**user_role_dict))
+    )
     return {"message": "Роль успешно изменена"}
 
 @router.delete("/delete_blog/{role_id}", summary="Удалить роль")
@@ -74,10 +88,17 @@ async def delete_role_endpoint(
     session: AsyncSession = Depends(db_helper.session_dependency),
     user_data = Depends(get_current_admin),
 ):
-    result = await delete_role(role_id, session)
+    try:
+        result = await db_helper.write(lambda s: delete_role(role_id, s))
+    except IntegrityError:
+        # роль назначили пользователю между проверкой и удалением
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"Роль с ID {role_id} назначена пользователям.")
     if result['status'] == 'error':
         raise HTTPException(status_code=400, detail=result['message'])
-    await session.commit()
+    if result['status'] == 'conflict':
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=result['message'])
+    await role_registry.load(session)
     return result
 
 @router.post("/logout/")
@@ -92,7 +113,30 @@ async def get_me(user_data = Depends(get_current_user)) -> UserInfo:
 
 @router.get("/all_users/")
 async def all_users(
+    filters: UserListFilters = Depends(),
+    cursor: int | None = Query(None, ge=0, description="next_cursor предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=500, description="Записей на странице"),
     session: AsyncSession = Depends(db_helper.session_dependency),
     user_data = Depends(get_current_admin),
-) -> list[UserInfo]:
-    return await get_all_users(session=session, filters=None) # type: ignore
\ No newline at end of file
+) -> UserPage:
+    rows, next_cursor = await get_users_page(session=session, filters=filters, cursor=cursor, limit=limit)
+    return UserPage(
+        items=[UserListItem.model_validate(row) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/all_users/export/", summary="Выгрузка пользователей в NDJSON")
+async def export_users(
+    filters: UserListFilters = Depends(),
+    user_data = Depends(get_current_admin),
+) -> StreamingResponse:
+    async def lines():
+        async for row in iter_users(filters):
+            yield UserListItem.model_validate(row).model_dump_json() + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="users.ndjson"'},
+    )
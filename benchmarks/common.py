@@ -0,0 +1,269 @@
+"""
+Общее для бенчмарков: запуск сервера (python main.py) с настройками
+из переменных окружения и генератор нагрузки на asyncio с keep-alive
+соединениями - лёгкий, чтобы клиент не отнимал процессор у сервера.
+"""
+import asyncio
+import http.client
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Без логов SQL и доступа, без контроля нагрузки: измеряем обработку запросов
+BASE_ENV = {
+    "DB__ECHO": "false",
+    "SERVER__ACCESS_LOG": "false",
+    "SERVER__HOST": "127.0.0.1",
+    "ADMISSION__ENABLED": "false",
+}
+
+# (метод, путь, тело)
+Request = tuple[str, str, bytes]
+
+
+@contextmanager
+def scratch_database(root: Path = ROOT, copy: bool = True) -> Iterator[dict[str, str]]:
+    """
+    Временная копия db_sql.db (или пустая БД) с применёнными миграциями.
+    Возвращает переменные окружения, направляющие на неё приложение.
+    """
+    with tempfile.TemporaryDirectory(prefix="blogs-bench-") as tmp:
+        path = Path(tmp) / "db_sql.db"
+        if copy and (root / "db_sql.db").exists():
+            shutil.copy(root / "db_sql.db", path)
+        env = {
+            "DB__URL": f"sqlite+aiosqlite:///{path}",
+            "ARCHIVE__PATH": str(Path(tmp) / "db_archive.db"),
+        }
+        migrate(root, env)
+        yield env
+
+
+def migrate(root: Path, env: dict[str, str], revision: str = "head", down: bool = False) -> None:
+    subprocess.run(
+        ["alembic", "downgrade" if down else "upgrade", revision],
+        cwd=root,
+        env={**os.environ, **BASE_ENV, **env},
+        check=True,
+        capture_output=True,
+    )
+
+
+@contextmanager
+def serve(port: int, env: dict[str, str] | None = None, root: Path = ROOT) -> Iterator[None]:
+    """Сервер из дерева root на port; при выходе - SIGTERM и ожидание остановки."""
+    process_env = {**os.environ, **BASE_ENV, "SERVER__PORT": str(port), **(env or {})}
+    # лог сервера - в файл: непрочитанный pipe заполнился бы и остановил сервер
+    with tempfile.TemporaryFile("w+") as log:
+        process = subprocess.Popen(
+            [sys.executable, "main.py"],
+            cwd=root,
+            env=process_env,
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+            text=True,
+        )
+        try:
+            wait_ready(port, process, log)
+            yield
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def wait_ready(port: int, process: subprocess.Popen, log, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise RuntimeError("сервер завершился при запуске:\n%s" % log.read()[-2000:])
+        try:
+            status, _, _ = request(port, "GET", "/")
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("сервер не запустился за %s с" % timeout)
+
+
+def request(
+    port: int, method: str, path: str, body: bytes | None = None, headers: dict | None = None
+) -> tuple[int, dict, bytes]:
+    """Одиночный запрос для подготовки данных (регистрация, вход и т.п.)."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def login(port: int, email: str, password: str = "secret1") -> str:
+    """Регистрирует пользователя (если его нет) и возвращает cookie access_token."""
+    user = {
+        "email": email,
+        "phone_number": "+7%010d" % (zlib.crc32(email.encode()) % 10**10),
+        "first_name": "Bench",
+        "last_name": "Mark",
+        "password": password,
+        "confirm_password": password,
+    }
+    request(port, "POST", "/auth/register/", json.dumps(user).encode(), {"Content-Type": "application/json"})
+    status, headers, body = request(
+        port,
+        "POST",
+        "/auth/login/",
+        f"email={email}&password={password}".encode(),
+        {"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    if status != 200:
+        raise RuntimeError("вход не удался: %s %s" % (status, body[:200]))
+    cookie = headers.get("set-cookie") or headers.get("Set-Cookie")
+    return cookie.split(";", 1)[0]
+
+
+@dataclass
+class LoadResult:
+    seconds: float
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[int(p) - 1]
+
+    def summary(self) -> str:
+        return "%8.1f req/s  p50 %7.2f мс  p99 %7.2f мс  ошибок %s" % (
+            self.rps,
+            self.percentile(50) * 1000,
+            self.percentile(99) * 1000,
+            self.errors,
+        )
+
+
+async def _read_response(reader: asyncio.StreamReader) -> tuple[int, bool]:
+    """Статус ответа и признак того, что сервер закрывает соединение."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get("connection", "").lower() == "close"
+
+
+async def _worker(
+    port: int,
+    make_request: Callable[[int], Request],
+    counter: Iterator[int],
+    headers: dict[str, str],
+    deadline: float,
+    limit: int | None,
+    result: LoadResult,
+) -> None:
+    extra = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer = None
+    try:
+        while time.perf_counter() < deadline:
+            number = next(counter)
+            if limit is not None and number >= limit:
+                return
+            method, path, body = make_request(number)
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            started = time.perf_counter()
+            writer.write(
+                (
+                    f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n{extra}"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                ).encode()
+                + body
+            )
+            try:
+                status, close = await _read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                result.errors += 1
+                status, close = 0, True
+            else:
+                result.latencies.append(time.perf_counter() - started)
+                result.statuses[status] = result.statuses.get(status, 0) + 1
+                if status >= 400:
+                    result.errors += 1
+            if close or status >= 500:
+                # после необработанной ошибки uvicorn закрывает соединение, не
+                # предупреждая заголовком: следующий запрос в нём потерялся бы
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def run_load(
+    port: int,
+    make_request: Callable[[int], Request],
+    concurrency: int,
+    duration: float,
+    limit: int | None = None,
+    headers: dict[str, str] | None = None,
+) -> LoadResult:
+    """
+    concurrency соединений шлют запросы подряд, пока не пройдёт duration
+    секунд или не будет отправлено limit запросов.
+    """
+
+    async def run() -> LoadResult:
+        counter = iter(range(sys.maxsize))
+        result = LoadResult(seconds=0.0)
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(
+            *(
+                _worker(port, make_request, counter, headers or {}, deadline, limit, result)
+                for _ in range(concurrency)
+            )
+        )
+        result.seconds = time.perf_counter() - started
+        return result
+
+    return asyncio.run(run())
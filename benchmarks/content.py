@@ -0,0 +1,128 @@
+"""
+Хранение текстов блогов сжатыми: размер БД и задержка страницы блога.
+Корпус синтетических markdown-блогов пишется через API без сжатия, копия БД
+пересжимается миграцией 5e2b8d4f7a13 (откат до её родителя и повторное
+применение обучают словарь на корпусе), затем обе копии сравниваются.
+
+    python benchmarks/content.py --posts 3000 --duration 15
+"""
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+
+from common import ROOT, login, migrate, run_load, scratch_database, serve
+
+PORT = 8767
+# родитель миграции, сжимающей тексты блогов
+BEFORE_COMPRESSION = "a6f3e9d2b871"
+
+WORDS = (
+    "python fastapi sqlalchemy asyncio запрос ответ сервер база данных индекс "
+    "транзакция кэш функция класс модуль тест очередь задача блог тег автор "
+    "страница шаблон миграция производительность задержка память процесс"
+).split()
+
+
+def markdown_post(rng: random.Random) -> str:
+    """Блог в markdown: заголовки, абзацы, списки и код, в среднем ~18 КБ."""
+    parts = []
+    for _ in range(rng.randint(6, 14)):
+        parts.append("## " + " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize())
+        for _ in range(rng.randint(1, 3)):
+            sentences = [
+                " ".join(rng.choices(WORDS, k=rng.randint(6, 16))).capitalize() + "."
+                for _ in range(rng.randint(3, 8))
+            ]
+            parts.append(" ".join(sentences))
+        if rng.random() < 0.5:
+            parts.append("\n".join("- " + " ".join(rng.choices(WORDS, k=4)) for _ in range(4)))
+        if rng.random() < 0.4:
+            name = rng.choice(WORDS)
+            parts.append(
+                f"```python\nasync def {name}(session):\n"
+                f"    result = await session.execute(select({name.capitalize()}))\n"
+                f"    return result.scalars().all()\n```"
+            )
+    return "\n\n".join(parts)
+
+
+def seed(port: int, posts: int, path: Path) -> list[int]:
+    cookie = login(port, "bench-content@example.com")
+    rng = random.Random(46)
+    bodies = [markdown_post(rng) for _ in range(posts)]
+    print("Корпус: %s блогов, в среднем %.1f КБ" % (
+        posts, sum(len(b.encode()) for b in bodies) / posts / 1024
+    ))
+
+    def make_request(number: int):
+        post = {
+            "title": f"Бенчмарк хранения {number}",
+            "content": bodies[number],
+            "short_description": "Блог для бенчмарка",
+            "tags": ["bench"],
+        }
+        return "POST", "/api/add_post/", json.dumps(post).encode()
+
+    # одно соединение: параллельные записи без группового коммита ловят
+    # "database is locked", а корпус нужен целиком
+    result = run_load(port, make_request, 1, duration=3600, limit=posts, headers={"Cookie": cookie})
+    if result.errors:
+        raise RuntimeError("не все блоги созданы: %s" % result.statuses)
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT id FROM blogs WHERE title LIKE 'Бенчмарк%'")]
+
+
+def vacuum(path: Path) -> int:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    conn.close()
+    return path.stat().st_size
+
+
+def detail_latency(db_env: dict, ids: list[int], duration: float):
+    rng = random.Random(1)
+    with serve(PORT, {**db_env, "SERVER__WORKERS": "1"}):
+        make_request = lambda number: ("GET", f"/api/get_blog/{rng.choice(ids)}", b"")
+        # прогрев: страницы файла БД в кэше ОС, пул соединений
+        run_load(PORT, make_request, 1, 2.0)
+        return run_load(PORT, make_request, 1, duration)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=3000)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    with scratch_database() as plain_env:
+        plain = Path(plain_env["DB__URL"].split("///", 1)[1])
+        with serve(PORT, {**plain_env, "SERVER__WORKERS": "1", "CONTENT_COMPRESSION__ENABLED": "false"}):
+            ids = seed(PORT, args.posts, plain)
+
+        # та же БД, пересжатая миграцией
+        packed = plain.with_name("packed.db")
+        packed_env = {**plain_env, "DB__URL": f"sqlite+aiosqlite:///{packed}"}
+        vacuum(plain)
+        shutil.copy(plain, packed)
+        migrate(ROOT, packed_env, BEFORE_COMPRESSION, down=True)
+        started = time.perf_counter()
+        migrate(ROOT, packed_env)
+        migration = time.perf_counter() - started
+
+        print("Размер БД после VACUUM: %.1f МБ -> %.1f МБ, пересжатие миграцией %.1f с" % (
+            vacuum(plain) / 2**20, vacuum(packed) / 2**20, migration
+        ))
+        for name, env in (("без сжатия", plain_env), ("сжатые тексты", packed_env)):
+            result = detail_latency(env, ids, args.duration)
+            print("  GET /api/get_blog/{id}, %-14s %s  p95 %.2f мс" % (
+                name, result.summary(), result.percentile(95) * 1000
+            ))
+
+
+if __name__ == "__main__":
+    main()
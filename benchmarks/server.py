@@ -0,0 +1,69 @@
+"""
+Пропускная способность сервера: однопроцессный запуск на стандартном цикле
+asyncio и h11 против запуска через core.server (uvloop, httptools) с разным
+числом воркеров. Нагрузка - чтения ленты и страницы блога по API.
+
+    python benchmarks/server.py --workers 1,2,4 --duration 10 --concurrency 64
+"""
+import argparse
+import json
+
+from common import login, request, run_load, scratch_database, serve
+
+PORT = 8765
+SEED_POSTS = 200
+
+
+def seed(port: int) -> list[int]:
+    """Блоги для чтения; возвращает их id."""
+    cookie = login(port, "bench-server@example.com")
+    for number in range(SEED_POSTS):
+        post = {
+            "title": f"Бенчмарк сервера {number}",
+            "content": "Текст блога для нагрузочного теста. " * 40,
+            "short_description": "Блог для бенчмарка",
+            "tags": ["bench", f"tag{number % 10}"],
+        }
+        request(
+            port,
+            "POST",
+            "/api/add_post/",
+            json.dumps(post).encode(),
+            {"Content-Type": "application/json", "Cookie": cookie},
+        )
+    _, _, body = request(port, "GET", "/api/blogs/?page_size=100&tag=bench")
+    return [blog["id"] for blog in json.loads(body)["blogs"]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="числа воркеров через запятую")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    with scratch_database() as db_env:
+        with serve(PORT, {**db_env, "SERVER__WORKERS": "1"}):
+            ids = seed(PORT)
+
+        def make_request(number: int):
+            if number % 2:
+                return "GET", f"/api/get_blog/{ids[number % len(ids)]}", b""
+            return "GET", "/api/blogs/?page_size=10", b""
+
+        configs = [("asyncio + h11, 1 процесс", {"SERVER__LOOP": "asyncio", "SERVER__HTTP": "h11", "SERVER__WORKERS": "1"})]
+        configs += [
+            (f"uvloop + httptools, {workers} воркер(ов)", {"SERVER__WORKERS": str(workers)})
+            for workers in map(int, args.workers.split(","))
+        ]
+        print("Чтения ленты и блогов, %s соединений, %s с" % (args.concurrency, args.duration))
+        for name, env in configs:
+            with serve(PORT, {**db_env, **env}):
+                # прогрев: кэши ленты и пул соединений
+                run_load(PORT, make_request, args.concurrency, 2.0)
+                result = run_load(PORT, make_request, args.concurrency, args.duration)
+            print("  %-32s %s" % (name, result.summary()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Время запуска приложения: импорт main, create_app, запуск подсистем
+(lifespan) и первый запрос. Каждый прогон - в отдельном процессе, чтобы
+импорты не попадали в кэш модулей.
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import json, logging, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+logging.disable(logging.INFO)
+from fastapi.testclient import TestClient
+app = main.create_app()
+with TestClient(app) as client:
+    ready = time.perf_counter()
+    status = client.get("/api/blogs/").status_code
+    first = time.perf_counter()
+print(json.dumps({
+    "import_main": imported - started,
+    "create_app": app.state.create_app_seconds,
+    "lifespan": app.state.startup["lifespan_seconds"],
+    "first_request": first - ready,
+    "status": status,
+}))
+"""
+
+METRICS = ("import_main", "create_app", "lifespan", "first_request", "total")
+
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    for run in runs:
+        # импорт TestClient в измерение не входит
+        run["total"] = sum(run[metric] for metric in METRICS[:-1])
+    if any(run["status"] != 200 for run in runs):
+        sys.exit("первый запрос завершился ошибкой: %s" % [run["status"] for run in runs])
+    print("Запуск приложения, медиана %s прогонов (мс)" % args.runs)
+    for metric in METRICS:
+        values = [run[metric] * 1000 for run in runs]
+        print("  %-14s %8.1f  (min %.1f, max %.1f)" % (metric, statistics.median(values), min(values), max(values)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Создание блогов: одновременные POST /api/add_post/ с тегами. Дерево проекта
+(--root) и настройки сервера (--env) задаются параметрами, чтобы сравнивать
+версии кода и режимы записи.
+
+    python benchmarks/writes.py --concurrency 50 --posts 2000
+    python benchmarks/writes.py --concurrency 50 --posts 2000 --env DB__GROUP_COMMIT=true
+"""
+import argparse
+import json
+from pathlib import Path
+
+from common import ROOT, login, run_load, scratch_database, serve
+
+PORT = 8766
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--root", type=Path, default=ROOT, help="дерево проекта с main.py")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE для сервера")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--tags", type=int, default=4, help="тегов у блога")
+    args = parser.parse_args()
+    extra = dict(item.split("=", 1) for item in args.env)
+
+    def make_request(number: int):
+        shared = args.tags // 2
+        post = {
+            "title": f"Бенчмарк записи {number}",
+            "content": "Текст блога для нагрузочного теста записи. " * 20,
+            "short_description": "Блог для бенчмарка",
+            # часть тегов уже есть в базе, часть создаётся вместе с блогом
+            "tags": [f"tag{i}" for i in range(shared)]
+            + [f"post{number}-{i}" for i in range(args.tags - shared)],
+        }
+        return "POST", "/api/add_post/", json.dumps(post).encode()
+
+    with scratch_database(args.root) as db_env:
+        with serve(PORT, {**db_env, "SERVER__WORKERS": "1", **extra}, root=args.root):
+            cookie = login(PORT, "bench-writer@example.com")
+            result = run_load(
+                PORT,
+                make_request,
+                args.concurrency,
+                duration=600,
+                limit=args.posts,
+                headers={"Cookie": cookie},
+            )
+    print(
+        "Создание блогов: %s запросов, %s соединений, %s"
+        % (args.posts, args.concurrency, " ".join(args.env) or "настройки по умолчанию")
+    )
+    print("  " + result.summary())
+    if result.errors:
+        print("  статусы: %s" % result.statuses)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,14 @@
 __all__ = ("base", "db_helper", "settings")
 
-from .models import base, db_helper
-from .config import settings
\ No newline at end of file
+
+def __getattr__(name: str):
+    # Модели и db_helper тянут SQLAlchemy: загружаются при обращении, а не вместе с пакетом
+    if name in ("base", "db_helper"):
+        from .models import base, db_helper
+
+        return base if name == "base" else db_helper
+    if name == "settings":
+        from .config import settings
+
+        return settings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
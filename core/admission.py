@@ -0,0 +1,178 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from logging import getLogger
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.config import AdmissionConfig, RateLimit
+
+logger = getLogger(__name__)
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+@dataclass
+class AdmissionStats:
+    """Счётчики контроля нагрузки (в пределах одного воркера)."""
+
+    admitted: int = 0
+    queued: int = 0
+    rejected: int = 0
+    rate_limited: int = 0
+
+
+admission_stats = AdmissionStats()
+
+
+class AdmissionGate:
+    """
+    Не больше concurrency одновременных запросов, остальные ждут в очереди
+    по порядку прихода. Освободившееся место передаётся первому ожидающему.
+    Ожидаемое время в очереди оценивается по скользящему среднему времени
+    обработки запроса.
+    """
+
+    def __init__(self, concurrency: int, queue: int):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.active = 0
+        self.service_time = 0.0  # экспоненциальное среднее, секунды
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def expected_wait(self) -> float:
+        if self.active < self.concurrency:
+            return 0.0
+        return (len(self._waiters) + 1) / self.concurrency * self.service_time
+
+    async def acquire(self, max_wait: float) -> bool:
+        """Занимает место; False - очередь полна или ждать дольше max_wait."""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue or self.expected_wait() > max_wait:
+            return False
+
+        admission_stats.queued += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, max_wait)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._hand_over()  # место уже передано этому запросу
+            else:
+                self._discard(waiter)
+            raise
+        return True
+
+    def release(self, elapsed: float) -> None:
+        self.service_time = 0.9 * self.service_time + 0.1 * elapsed
+        self._hand_over()
+
+    def _hand_over(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+class TokenBuckets:
+    """Ведро токенов на каждого клиента; давно не приходившие вытесняются (LRU)."""
+
+    def __init__(self, limit: RateLimit, max_clients: int):
+        self.limit = limit
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, client: str) -> float:
+        """Забирает токен; возвращает 0 или сколько секунд ждать следующего."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (self.limit.burst, now))
+        tokens = min(self.limit.burst, tokens + (now - updated) * self.limit.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.limit.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware контроля нагрузки. Чтения и записи ограничены отдельно,
+    чтобы очередь на блокировку записи SQLite не занимала пул соединений,
+    нужный чтениям. Если очередь полна или ожидание будет дольше max_wait,
+    запрос сразу получает 503 с Retry-After, а не ждёт соединение из пула.
+    Дорогие маршруты дополнительно ограничены по частоте для каждого клиента (429).
+    """
+
+    def __init__(self, app: ASGIApp, config: AdmissionConfig):
+        self.app = app
+        self.config = config
+        self.reads = AdmissionGate(config.read_concurrency, config.read_queue)
+        self.writes = AdmissionGate(config.write_concurrency, config.write_queue)
+        self.buckets = {
+            path: TokenBuckets(limit, config.rate_limit_clients)
+            for path, limit in config.rate_limits.items()
+        }
+        self.exempt_prefixes = tuple(config.exempt_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not self.config.enabled
+            or scope["path"].startswith(self.exempt_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        buckets = self.buckets.get(scope["path"])
+        if buckets is not None:
+            client = scope["client"][0] if scope.get("client") else "unknown"
+            wait = buckets.take(client)
+            if wait:
+                admission_stats.rate_limited += 1
+                response = self.reject(429, "Слишком много запросов", math.ceil(wait))
+                await response(scope, receive, send)
+                return
+
+        gate = self.reads if scope["method"] in READ_METHODS else self.writes
+        if not await gate.acquire(self.config.max_wait):
+            admission_stats.rejected += 1
+            logger.debug("Запрос %s %s отклонён: перегрузка" % (scope["method"], scope["path"]))
+            response = self.reject(503, "Сервер перегружен", self.config.retry_after)
+            await response(scope, receive, send)
+            return
+
+        admission_stats.admitted += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - started)
+
+    @staticmethod
+    def reject(status_code: int, detail: str, retry_after: int) -> JSONResponse:
+        return JSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(retry_after)},
+        )
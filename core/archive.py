@@ -0,0 +1,206 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Hashable
+
+from sqlalchemy import delete, event, func, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from core.changes import change_feed, record_blog_changes, BlogChangeEvent
+from core.config import settings, ArchiveConfig
+from core.models.archive import ArchiveBase, ArchivedBlog, ArchivedBlogTag
+from core.models.base import Blog, BlogTag, BlogViews
+from core.models.db_helper import db_helper
+
+logger = getLogger(__name__)
+
+
+class BlogArchive:
+    """
+    Архив старых опубликованных блогов в отдельном файле SQLite.
+
+    Соединения приложения подключают архив как схему archive только для
+    чтения (DBHelper.attach), поэтому таблица blogs основной БД и её индексы
+    содержат только свежие блоги. Блог, которого нет в основной БД, ищется
+    в архиве по id (api.crud.load_full_blog); лента читает архив, только
+    если страница до него доходит, а число блогов архива по фильтру берёт
+    из кэша (meta).
+
+    Перенос - фоновая задача blogs.archive: пачками копирует блоги старше
+    min_age_days вместе с тегами и просмотрами в архив отдельным соединением
+    с правом записи, затем удаляет их из основной БД с записью archived в
+    журнал изменений. В режиме WAL транзакция по двум файлам не атомарна,
+    поэтому сначала фиксируется копия: после сбоя между шагами блог временно
+    есть в обоих файлах, и следующий запуск доводит перенос до конца.
+    Архив только для чтения: менять статус и удалять перенесённые блоги нельзя.
+    """
+
+    def __init__(self, config: ArchiveConfig):
+        self.config = config
+        self.ready = False
+        self._engine: AsyncEngine | None = None
+        self._meta: OrderedDict[Hashable, Any] = OrderedDict()
+        # растёт при каждом переносе: счётчики, прочитанные во время переноса, не кэшируются
+        self._version = 0
+
+    @property
+    def available(self) -> bool:
+        return self.config.enabled and self.ready
+
+    def _create_engine(self) -> AsyncEngine:
+        engine = create_async_engine(db_helper.url, poolclass=NullPool)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def on_connect(dbapi_connection, connection_record) -> None:
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.execute(f"PRAGMA busy_timeout={int(db_helper.busy_timeout)}")
+            cursor.execute("ATTACH DATABASE ? AS archive", (str(self.config.path),))
+            # Без WAL: читателям, подключившим архив только для чтения, не нужен -shm
+            cursor.execute("PRAGMA archive.journal_mode=DELETE")
+            cursor.close()
+
+        return engine
+
+    async def prepare(self) -> None:
+        """Создаёт файл и таблицы архива; вызывается до первого соединения с БД."""
+        if not self.config.enabled:
+            return
+        self._engine = self._create_engine()
+        async with self._engine.begin() as conn:
+            # IF NOT EXISTS: воркеры готовят архив одновременно
+            for table in ArchiveBase.metadata.sorted_tables:
+                await conn.execute(CreateTable(table, if_not_exists=True))
+                for index in table.indexes:
+                    await conn.execute(CreateIndex(index, if_not_exists=True))
+            # blogs с AUTOINCREMENT не выдаёт id меньше sqlite_sequence; счётчик
+            # доводится до архивных id, если файл архива старше основной БД
+            archived_max = await conn.scalar(select(func.max(ArchivedBlog.id)))
+            if archived_max:
+                await conn.execute(
+                    text(
+                        "INSERT INTO sqlite_sequence (name, seq) SELECT 'blogs', 0 "
+                        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'blogs')"
+                    )
+                )
+                await conn.execute(
+                    text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'blogs' AND seq < :seq"),
+                    {"seq": archived_max},
+                )
+        self.ready = True
+        logger.info("Архив блогов подключён: %s" % self.config.path)
+
+    async def meta(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Счётчики архива для фильтра ленты. Архив меняется только переносом,
+        поэтому они хранятся до следующего события archived в журнале.
+        """
+        if key in self._meta:
+            self._meta.move_to_end(key)
+            return self._meta[key]
+        version = self._version
+        value = await load()
+        if version == self._version:
+            self._meta[key] = value
+            while len(self._meta) > self.config.meta_cache_size:
+                self._meta.popitem(last=False)
+        return value
+
+    def apply(self, events: list[BlogChangeEvent]) -> None:
+        if any(event.kind == "archived" for event in events):
+            self._version += 1
+            self._meta.clear()
+
+    async def run(self) -> int:
+        """Переносит до max_batches пачек; возвращает число перенесённых блогов."""
+        if not self.available:
+            return 0
+        moved = 0
+        for _ in range(self.config.max_batches):
+            ids = await self._move_batch()
+            moved += len(ids)
+            if len(ids) < self.config.batch_size:
+                break
+        return moved
+
+    async def _move_batch(self) -> list[int]:
+        # created_at хранится в UTC без зоны, как CURRENT_TIMESTAMP
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        cutoff = now - timedelta(days=self.config.min_age_days)
+        # id перенесённых блогов не выдаются повторно: blogs с AUTOINCREMENT
+        criteria = (Blog.status == "published", Blog.created_at < cutoff)
+        async with self._engine.begin() as conn:
+            ids = list(
+                (
+                    await conn.execute(
+                        select(Blog.id)
+                        .where(*criteria)
+                        .order_by(Blog.id)
+                        .limit(self.config.batch_size)
+                    )
+                ).scalars()
+            )
+            if not ids:
+                return []
+            await self._copy(conn, ids)
+
+        async def write(session: AsyncSession) -> list[int]:
+            await record_blog_changes(session, "archived", ids, *criteria)
+            stmt = (
+                delete(Blog)
+                .where(Blog.id.in_(ids), *criteria)
+                .returning(Blog.id)
+                .execution_options(synchronize_session=False)
+            )
+            return list((await session.execute(stmt)).scalars())
+
+        deleted = await db_helper.write(write)
+        # блог сняли с публикации между копированием и удалением: копия лишняя
+        stale = list(set(ids) - set(deleted))
+        if stale:
+            async with self._engine.begin() as conn:
+                await conn.execute(delete(ArchivedBlogTag).where(ArchivedBlogTag.blog_id.in_(stale)))
+                await conn.execute(delete(ArchivedBlog).where(ArchivedBlog.id.in_(stale)))
+        logger.info("В архив перенесено блогов: %s" % len(deleted))
+        return ids
+
+    @staticmethod
+    async def _copy(conn, ids: list[int]) -> None:
+        # content копируется как хранится, без распаковки (core.models.types)
+        columns = ["id", "title", "author", "content", "short_description", "status",
+                   "views", "created_at", "updated_at"]
+        blogs = select(
+            Blog.id,
+            Blog.title,
+            Blog.author,
+            Blog.content,
+            Blog.short_description,
+            Blog.status,
+            func.coalesce(BlogViews.views, 0),
+            Blog.created_at,
+            Blog.updated_at,
+        ).outerjoin(BlogViews, BlogViews.blog_id == Blog.id).where(Blog.id.in_(ids))
+        await conn.execute(delete(ArchivedBlogTag).where(ArchivedBlogTag.blog_id.in_(ids)))
+        await conn.execute(
+            insert(ArchivedBlog).prefix_with("OR REPLACE").from_select(columns, blogs)
+        )
+        await conn.execute(
+            insert(ArchivedBlogTag).from_select(
+                ["blog_id", "tag_id"],
+                select(BlogTag.blog_id, BlogTag.tag_id).where(BlogTag.blog_id.in_(ids)),
+            )
+        )
+
+    async def stop(self) -> None:
+        self.ready = False
+        self._meta.clear()
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+
+blog_archive = BlogArchive(settings.archive)
+change_feed.subscribe(blog_archive.apply)
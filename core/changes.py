@@ -0,0 +1,201 @@
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Callable
+
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings, ChangeFeedConfig
+from core.models.base import Blog, BlogChange, BlogTag
+from core.models.db_helper import db_helper
+
+logger = getLogger(__name__)
+
+# Размер пачки id в одном запросе (лимит переменных SQLite)
+RECORD_CHUNK_SIZE = 500
+
+
+@dataclass(frozen=True)
+class BlogChangeEvent:
+    id: int
+    blog_id: int
+    kind: str
+    status: str | None
+    author: int | None
+    tag_ids: tuple[int, ...]
+
+    @property
+    def published(self) -> bool:
+        return self.kind != "deleted" and self.status == "published"
+
+    @property
+    def affects_listing(self) -> bool:
+        """Меняет ли изменение ленту опубликованных: черновики в неё не попадают."""
+        return self.kind == "status" or self.status != "draft"
+
+
+ChangeSubscriber = Callable[[list[BlogChangeEvent]], None]
+
+
+async def read_blog_changes(
+    session: AsyncSession, after_id: int, limit: int, *criteria
+) -> list[BlogChangeEvent]:
+    """Изменения из журнала после after_id по возрастанию id, не больше limit."""
+    query = (
+        select(BlogChange)
+        .where(BlogChange.id > after_id, *criteria)
+        .order_by(BlogChange.id)
+        .limit(limit)
+    )
+    rows = (await session.execute(query)).scalars().all()
+    return [
+        BlogChangeEvent(
+            id=row.id,
+            blog_id=row.blog_id,
+            kind=row.kind,
+            status=row.status,
+            author=row.author,
+            tag_ids=tuple(int(i) for i in row.tag_ids.split(",")) if row.tag_ids else (),
+        )
+        for row in rows
+    ]
+
+
+async def record_blog_changes(
+    session: AsyncSession, kind: str, blog_ids: list[int], *criteria
+) -> None:
+    """
+    Записывает изменения блогов в журнал в текущей транзакции; коммит за вызывающим.
+    Состояние блога (статус, автор, теги) копируется одним INSERT ... SELECT,
+    поэтому deleted записывается до DELETE с теми же условиями (criteria).
+    """
+    tag_ids = (
+        select(func.group_concat(BlogTag.tag_id))
+        .where(BlogTag.blog_id == Blog.id)
+        .scalar_subquery()
+    )
+    for start in range(0, len(blog_ids), RECORD_CHUNK_SIZE):
+        chunk = blog_ids[start:start + RECORD_CHUNK_SIZE]
+        stmt = insert(BlogChange).from_select(
+            ["blog_id", "kind", "status", "author", "tag_ids"],
+            select(Blog.id, literal(kind), Blog.status, Blog.author, tag_ids).where(
+                Blog.id.in_(chunk), *criteria
+            ),
+        )
+        await session.execute(stmt)
+
+
+class ChangeFeed:
+    """
+    Чтение журнала blog_changes в каждом воркере.
+    Подписчики (индексы в памяти и т.п.) получают изменения пачками по
+    возрастанию id, включая сделанные этим же воркером: после коммита
+    достаточно вызвать notify(), изменения других воркеров приходят не позже
+    poll_interval. Подписчики должны применять изменения идемпотентно.
+    """
+
+    def __init__(self, config: ChangeFeedConfig):
+        self.config = config
+        self.position = 0
+        self._subscribers: list[ChangeSubscriber] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()  # фоновое чтение и catch_up не идут параллельно
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, callback: ChangeSubscriber) -> ChangeSubscriber:
+        self._subscribers.append(callback)
+        return callback
+
+    @staticmethod
+    async def latest_id(session: AsyncSession) -> int:
+        return await session.scalar(select(func.max(BlogChange.id))) or 0
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self, position: int) -> None:
+        """
+        Начинает чтение после position. Позицию нужно получить до построения
+        индексов, чтобы изменения, сделанные во время построения, не потерялись.
+        """
+        self.position = position
+        # примитивы asyncio привязаны к циклу событий: у каждого запуска приложения свои
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def catch_up(self) -> None:
+        """
+        Дочитывает журнал сразу после коммита: следующий запрос того же клиента
+        уже видит свою запись в индексах и кэшах. Ошибка чтения не ломает ответ -
+        журнал дочитает фоновая задача.
+        """
+        if self._task is None:
+            return
+        try:
+            while await self.poll() == self.config.batch_size:
+                pass
+        except SQLAlchemyError as e:
+            logger.error("Ошибка при чтении журнала изменений: %s" % e)
+            self.notify()
+
+    async def poll(self) -> int:
+        """Читает и раздаёт подписчикам одну пачку изменений; возвращает её размер."""
+        async with self._lock:
+            return await self._poll()
+
+    async def _poll(self) -> int:
+        async with db_helper.session_factory() as session:
+            events = await read_blog_changes(session, self.position, self.config.batch_size)
+        if not events:
+            return 0
+
+        self.position = events[-1].id
+        for callback in self._subscribers:
+            try:
+                callback(events)
+            except Exception as e:
+                logger.error("Ошибка подписчика журнала изменений %s: %s" % (callback, e))
+        return len(events)
+
+    async def _run(self) -> None:
+        last_cleanup = datetime.now(timezone.utc)
+        while True:
+            try:
+                while await self.poll() == self.config.batch_size:
+                    pass
+                if datetime.now(timezone.utc) - last_cleanup > timedelta(hours=1):
+                    await self._cleanup()
+                    last_cleanup = datetime.now(timezone.utc)
+            except Exception as e:
+                logger.error("Ошибка при чтении журнала изменений: %s" % e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.config.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _cleanup(self) -> None:
+        # В SQLite время хранится в UTC без зоны, как CURRENT_TIMESTAMP
+        border = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(
+            hours=self.config.retention_hours
+        )
+        async with db_helper.session_factory() as session:
+            await session.execute(delete(BlogChange).where(BlogChange.created_at < border))
+            await session.commit()
+
+
+change_feed = ChangeFeed(settings.changes)
@@ -0,0 +1,258 @@
+import gzip
+import time
+from hashlib import blake2b
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging import getLogger
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import CompressionConfig
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard не обязателен
+    zstandard = None
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class CompressionStats:
+    """Счётчики работы middleware сжатия (в пределах одного воркера)."""
+
+    compressed: int = 0
+    cache_hits: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    cpu_seconds: float = 0.0
+
+    def log_stats(self) -> None:
+        ratio = self.bytes_out / self.bytes_in if self.bytes_in else 0.0
+        logger.info(
+            "Сжатие ответов: сжато %s, из кэша %s, %s -> %s байт (%.1f%%), CPU %.3f с"
+            % (
+                self.compressed,
+                self.cache_hits,
+                self.bytes_in,
+                self.bytes_out,
+                ratio * 100,
+                self.cpu_seconds,
+            )
+        )
+
+
+compression_stats = CompressionStats()
+
+
+class CompressedBodyCache:
+    """
+    LRU-кэш уже сжатых тел ответов.
+    Ключ - (хэш тела, кодировка): тело может содержать данные вне ETag
+    (например, просмотры), поэтому любое его изменение даёт новый ключ.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size = 0
+
+    def get(self, key: tuple) -> bytes | None:
+        body = self._data.get(key)
+        if body is not None:
+            self._data.move_to_end(key)
+        return body
+
+    def put(self, key: tuple, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._data[key] = body
+        self._size += len(body)
+        while len(self._data) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self._size -= len(evicted)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._size = 0
+
+
+def available_encodings() -> set[str]:
+    encodings = {"gzip"}
+    if brotli is not None:
+        encodings.add("br")
+    if zstandard is not None:
+        encodings.add("zstd")
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware сжатия ответов (gzip, а также br и zstd, если установлены
+    соответствующие пакеты).
+    Сжимаются только целиком сформированные ответы разрешённых типов
+    размером не меньше порога; потоковые ответы пропускаются без изменений.
+    """
+
+    def __init__(self, app: ASGIApp, config: CompressionConfig):
+        self.app = app
+        self.config = config
+        supported = available_encodings()
+        self.encodings = [e for e in config.encodings if e in supported]
+        self.cache = CompressedBodyCache(
+            max_entries=config.cache_max_entries,
+            max_bytes=config.cache_max_bytes,
+        )
+        logger.info("Доступные кодировки сжатия: %s" % self.encodings)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.config.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        encoding = self.choose_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+    def choose_encoding(self, accept_encoding: str) -> str | None:
+        accepted = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            name = name.strip().lower()
+            if not name:
+                continue
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            accepted[name] = q
+        for encoding in self.encodings:
+            if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return None
+
+    def is_compressible(self, content_type: str) -> bool:
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        return media_type in self.config.content_types
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        started = time.thread_time()
+        if encoding == "zstd":
+            compressed = zstandard.ZstdCompressor(level=self.config.zstd_level).compress(body)
+        elif encoding == "br":
+            compressed = brotli.compress(body, quality=self.config.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.config.gzip_level, mtime=0)
+        spent = time.thread_time() - started
+
+        compression_stats.compressed += 1
+        compression_stats.bytes_in += len(body)
+        compression_stats.bytes_out += len(compressed)
+        compression_stats.cpu_seconds += spent
+        logger.debug(
+            "Сжатие %s: %s -> %s байт за %.3f мс CPU"
+            % (encoding, len(body), len(compressed), spent * 1000)
+        )
+        return compressed
+
+
+class _CompressionResponder:
+    def __init__(
+        self,
+        middleware: CompressionMiddleware,
+        scope: Scope,
+        send: Send,
+        encoding: str,
+    ):
+        self.middleware = middleware
+        self.scope = scope
+        self.inner_send = send
+        self.encoding = encoding
+        self.start_message: Message | None = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self.inner_send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if (
+                message["status"] != 200
+                or "content-encoding" in headers
+                or not self.middleware.is_compressible(headers.get("content-type", ""))
+            ):
+                self.passthrough = True
+                await self.inner_send(message)
+                return
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.start_message is None:
+            await self.inner_send(message)
+            return
+
+        body = message.get("body", b"")
+        if message.get("more_body", False):
+            # Потоковый ответ (NDJSON, SSE и т.п.) не буферизуем
+            self.passthrough = True
+            await self.inner_send(self.start_message)
+            await self.inner_send(message)
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if len(body) < self.middleware.config.minimum_size:
+            await self.inner_send(self.start_message)
+            await self.inner_send(message)
+            return
+
+        compressed, timing = self.compressed_body(body, headers)
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+        headers.append("Server-Timing", timing)
+        await self.inner_send(self.start_message)
+        await self.inner_send({"type": "http.response.body", "body": compressed})
+
+    def compressed_body(self, body: bytes, headers: MutableHeaders) -> tuple[bytes, str]:
+        cache_key = self.cache_key(body, headers)
+        if cache_key is not None:
+            cached = self.middleware.cache.get(cache_key)
+            if cached is not None:
+                compression_stats.cache_hits += 1
+                return cached, "compress;desc=cache-hit;dur=0"
+
+        started = time.thread_time()
+        compressed = self.middleware.compress(body, self.encoding)
+        spent_ms = (time.thread_time() - started) * 1000
+        if cache_key is not None:
+            self.middleware.cache.put(cache_key, compressed)
+        return compressed, "compress;dur=%.2f" % spent_ms
+
+    def cache_key(self, body: bytes, headers: MutableHeaders) -> tuple | None:
+        # Кэшируем только ответы, которые сами объявили себя кэшируемыми.
+        # Хэш тела на порядки дешевле сжатия и покрывает всё тело, а не только ETag
+        etag = headers.get("etag")
+        cache_control = headers.get("cache-control", "").lower()
+        if not etag or "private" in cache_control or "no-store" in cache_control:
+            return None
+        return (blake2b(body, digest_size=16).digest(), self.encoding)
@@ -1,8 +1,9 @@
+import os
 from logging import getLogger
 from pathlib import Path
 
 from pydantic import BaseModel
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 logger = getLogger(__name__)
 
@@ -13,6 +14,17 @@ DB_PATH = BASE_DIR / "db_sql.db"
 class DataBaseConfig(BaseModel):
     url: str = f"sqlite+aiosqlite:///{DB_PATH}"
     echo: bool = True
+    # без явного пула aiosqlite открывает новое соединение (и поток) на каждую сессию
+    pool_size: int = 5
+    max_overflow: int = 10
+    # WAL: чтения не блокируют запись и наоборот; ожидание блокировки вместо "database is locked"
+    journal_mode: str | None = "wal"
+    busy_timeout: int = 5000  # миллисекунды
+    # Групповой коммит: записи через db_helper.write идут одним соединением,
+    # до write_batch_size единиц работы в одной транзакции
+    group_commit: bool = False
+    write_batch_size: int = 64
+    write_linger: float = 0.002  # секунды ожидания попутных записей перед коммитом
 
 class AuthJWT(BaseModel):
 
@@ -22,10 +34,212 @@ class AuthJWT(BaseModel):
     access_token_expire_day: int = 30
 
 
+class CompressionConfig(BaseModel):
+    enabled: bool = True
+    minimum_size: int = 1024  # меньшие ответы отдаём как есть
+    # порядок предпочтения, если клиент принимает несколько кодировок
+    encodings: list[str] = ["zstd", "br", "gzip"]
+    content_types: list[str] = [
+        "application/json",
+        "text/html",
+        "text/css",
+        "text/plain",
+        "application/javascript",
+        "text/javascript",
+        "application/xml",
+        "application/rss+xml",
+    ]
+    gzip_level: int = 6
+    brotli_quality: int = 5
+    zstd_level: int = 3
+    cache_max_entries: int = 512
+    cache_max_bytes: int = 32 * 1024 * 1024
+
+
+class ContentCompressionConfig(BaseModel):
+    enabled: bool = True  # False - новые тексты пишутся как есть, сжатые по-прежнему читаются
+    codec: str = "zstd"  # zstd или zlib; без пакета zstandard - zlib
+    threshold: int = 1024  # байт UTF-8: более короткие тексты хранятся как есть
+    zlib_level: int = 9
+    zstd_level: int = 9  # пишутся блоги редко, читаются часто
+    dictionary_size: int = 32 * 1024  # zlib использует не больше 32 КБ словаря
+    dictionary_samples: int = 2000  # сколько текстов брать для обучения словаря
+    batch_size: int = 500  # строк за один проход при пересжатии в миграции
+
+
+class RateLimit(BaseModel):
+    rate: float  # токенов в секунду на клиента
+    burst: int  # ёмкость ведра: столько запросов подряд без ожидания
+
+
+class AdmissionConfig(BaseModel):
+    enabled: bool = True
+    # одновременно выполняемые чтения (GET, HEAD) и записи; остальные ждут в очереди
+    read_concurrency: int = 15  # не больше pool_size + max_overflow
+    read_queue: int = 100
+    write_concurrency: int = 2  # SQLite всё равно пишет по одному
+    write_queue: int = 50
+    max_wait: float = 1.0  # секунды: при большем ожидаемом ожидании сразу 503
+    retry_after: int = 1  # значение Retry-After для 503
+    # долгие потоки SSE не занимают места чтений, их число ограничено stream.max_subscribers
+    exempt_prefixes: list[str] = ["/static", "/api/blogs/stream"]
+    # ограничения частоты для дорогих маршрутов, по точному пути
+    rate_limits: dict[str, RateLimit] = {
+        "/auth/login/": RateLimit(rate=0.2, burst=5),
+        "/auth/register/": RateLimit(rate=0.1, burst=3),
+        "/api/add_post/": RateLimit(rate=0.5, burst=10),
+        "/api/tags/suggest": RateLimit(rate=10.0, burst=30),
+    }
+    rate_limit_clients: int = 10000  # сколько клиентов помнить на один маршрут
+
+
+class ViewCounterConfig(BaseModel):
+    enabled: bool = True
+    flush_interval: float = 5.0  # секунды между сбросами буфера в БД
+    flush_threshold: int = 1000  # сброс раньше срока при таком числе просмотров
+
+
+class JobsConfig(BaseModel):
+    enabled: bool = True
+    poll_interval: float = 1.0  # как часто воркер проверяет таблицу jobs без уведомлений
+    default_concurrency: int = 2  # одновременных задач одного типа на воркер
+    max_attempts: int = 5
+    backoff_base: float = 2.0  # задержка повтора: base * 2 ** (attempt - 1) секунд
+    backoff_max: float = 300.0
+    lease_seconds: int = 300  # после этого зависшая задача снова доступна для захвата
+    retention_hours: int = 24  # сколько хранить выполненные задачи
+    failed_retention_hours: int = 168  # неудавшиеся храним дольше, для разбора
+
+
+class ChangeFeedConfig(BaseModel):
+    enabled: bool = True
+    poll_interval: float = 1.0  # как часто воркер проверяет изменения других воркеров
+    batch_size: int = 1000
+    retention_hours: int = 24  # сколько хранить журнал изменений
+
+
+class ReplicaConfig(BaseModel):
+    enabled: bool = False  # копия опубликованных блогов для чтения в каждом воркере
+    directory: str | None = None  # None - /dev/shm, если есть, иначе временный каталог
+    refresh_interval: float = 1.0  # как часто догонять основную БД без уведомлений
+    max_lag: float = 5.0  # если копия отстала сильнее, чтения идут в основную БД
+    batch_size: int = 5000  # строк за один запрос при копировании
+    mmap_size: int = 256 * 1024 * 1024
+
+
+class ArchiveConfig(BaseModel):
+    enabled: bool = False  # старые блоги переносятся в отдельный файл, подключаемый ATTACH
+    path: Path = BASE_DIR / "db_archive.db"
+    min_age_days: int = 365  # опубликованные блоги старше этого переносятся в архив
+    batch_size: int = 500  # блогов за одну транзакцию переноса
+    max_batches: int = 20  # пачек за один запуск задачи, остальное - в следующий
+    interval: float = 3600.0  # как часто запускать перенос
+    meta_cache_size: int = 256  # счётчиков архива по фильтрам ленты в памяти воркера
+
+
+class TagIndexConfig(BaseModel):
+    enabled: bool = True  # False - похожие блоги считаются SQL-запросом
+
+
+class TagSuggestConfig(BaseModel):
+    enabled: bool = True  # False - подсказки считаются SQL-запросом
+    refresh_interval: float = 300.0  # полное перечитывание (удаления, теги других воркеров)
+    top_size: int = 20  # максимум подсказок; для коротких префиксов хранятся готовые списки
+    prefix_depth: int = 2  # до какой длины префикса списки считаются заранее
+
+
+class TagStatsConfig(BaseModel):
+    reconcile_interval: float = 3600.0  # как часто сверять tag_stats с blog_tags
+    cloud_size: int = 30  # тегов в облаке на странице /blogs/
+
+
+class ListingCacheConfig(BaseModel):
+    enabled: bool = True  # работает только вместе с журналом изменений
+    size: int = 512  # страниц ленты в LRU одного воркера
+    max_page: int = 3  # кэшируются только первые страницы
+    ttl: float = 60.0  # не дольше этого показываются старые просмотры и имена авторов
+    # отдавать страницу с истёкшим ttl, пока она обновляется; сброшенные
+    # журналом изменений страницы не отдаются никогда
+    stale_while_revalidate: bool = True
+
+
+class FeedsConfig(BaseModel):
+    enabled: bool = True  # False - /feed.xml и /sitemap.xml собираются из БД на каждый запрос
+    site_url: str | None = None  # адрес сайта для ссылок; None - из запроса
+    title: str = "Блоги"
+    size: int = 20  # записей в одной ленте RSS
+    cache_size: int = 1024  # лент (общая, по авторам, по тегам) в памяти воркера
+    entry_cache_size: int = 10000  # записей лент в памяти воркера
+    sitemap_chunk: int = 50000  # адресов в одном файле sitemap (ограничение протокола)
+
+
+class StreamConfig(BaseModel):
+    enabled: bool = True
+    max_subscribers: int = 5000  # открытых потоков /api/blogs/stream на воркер, дальше 503
+    buffer_size: int = 100  # событий в очереди подписчика; отстающий поток закрывается
+    heartbeat: float = 15.0  # секунды между комментариями-пингами в простаивающем потоке
+    retry: int = 3000  # миллисекунды до переподключения клиента (поле retry SSE)
+    replay_limit: int = 500  # событий, догоняемых из журнала по Last-Event-ID
+
+
+class RolesConfig(BaseModel):
+    admin_role_ids: list[int] = [2, 3]  # роли с доступом к административным эндпоинтам
+    check_interval: float = 5.0  # секунды между проверками версии справочника ролей
+
+
+class ServerConfig(BaseModel):
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = os.cpu_count() or 1
+    reload: bool = False  # режим разработки: один процесс с перезагрузкой
+    loop: str = "uvloop"  # при отсутствии uvloop используется стандартный цикл
+    http: str = "httptools"
+    backlog: int = 2048
+    timeout_keep_alive: int = 15
+    limit_concurrency: int | None = 1000  # на один воркер, сверх лимита - 503
+    timeout_graceful_shutdown: int = 30  # сколько ждать запросы в обработке при SIGTERM
+    access_log: bool = False
+
+
 class Settings(BaseSettings):
+    # вложенные параметры задаются как SERVER__WORKERS=4
+    model_config = SettingsConfigDict(env_nested_delimiter="__")
+
     db: DataBaseConfig = DataBaseConfig()
+
+    content_compression: ContentCompressionConfig = ContentCompressionConfig()
     
     auth_jwt: AuthJWT = AuthJWT()
 
+    compression: CompressionConfig = CompressionConfig()
+
+    admission: AdmissionConfig = AdmissionConfig()
+
+    server: ServerConfig = ServerConfig()
+
+    view_counter: ViewCounterConfig = ViewCounterConfig()
+
+    jobs: JobsConfig = JobsConfig()
+
+    roles: RolesConfig = RolesConfig()
+
+    changes: ChangeFeedConfig = ChangeFeedConfig()
+
+    tag_index: TagIndexConfig = TagIndexConfig()
+
+    tag_suggest: TagSuggestConfig = TagSuggestConfig()
+
+    tag_stats: TagStatsConfig = TagStatsConfig()
+
+    listing_cache: ListingCacheConfig = ListingCacheConfig()
+
+    feeds: FeedsConfig = FeedsConfig()
+
+    stream: StreamConfig = StreamConfig()
+
+    replica: ReplicaConfig = ReplicaConfig()
+
+    archive: ArchiveConfig = ArchiveConfig()
+
 
 settings = Settings()
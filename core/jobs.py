@@ -0,0 +1,281 @@
+import asyncio
+from contextlib import suppress
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings, JobsConfig
+from core.models.base import Job
+from core.models.db_helper import db_helper
+
+logger = getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+
+@dataclass
+class _JobType:
+    handler: JobHandler
+    concurrency: int
+    max_attempts: int
+    running: int = 0
+
+
+def _utcnow() -> datetime:
+    # В SQLite время хранится в UTC без зоны, как CURRENT_TIMESTAMP
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач внутри процесса, хранящаяся в таблице jobs.
+    Задача ставится в той же сессии, что и основная запись, поэтому
+    фиксируется одним коммитом с ней и не теряется при перезапуске.
+    Каждый воркер приложения захватывает задачи атомарным
+    UPDATE ... RETURNING, повторяет упавшие с экспоненциальной задержкой
+    и ограничивает число одновременных задач каждого типа.
+    """
+
+    def __init__(self, config: JobsConfig):
+        self.config = config
+        self._types: dict[str, _JobType] = {}
+        self._wakeup = asyncio.Event()
+        self._poller: asyncio.Task | None = None
+        self._stopping = False
+        self._running: set[asyncio.Task] = set()
+        self._schedules: dict[str, float] = {}
+        self._scheduled_slots: dict[str, int] = {}
+
+    def register(
+        self,
+        job_type: str,
+        concurrency: int | None = None,
+        max_attempts: int | None = None,
+    ) -> Callable[[JobHandler], JobHandler]:
+        def decorator(handler: JobHandler) -> JobHandler:
+            self._types[job_type] = _JobType(
+                handler=handler,
+                concurrency=concurrency or self.config.default_concurrency,
+                max_attempts=max_attempts or self.config.max_attempts,
+            )
+            return handler
+
+        return decorator
+
+    def schedule(self, job_type: str, every: float) -> None:
+        """
+        Периодическая задача раз в every секунд. Ключ идемпотентности - номер
+        интервала, поэтому из всех воркеров в очередь попадает одна задача.
+        """
+        self._schedules[job_type] = every
+
+    def unschedule(self, job_type: str) -> None:
+        self._schedules.pop(job_type, None)
+
+    async def enqueue(
+        self,
+        session: AsyncSession,
+        job_type: str,
+        payload: dict | None = None,
+        idempotency_key: str | None = None,
+        delay: float = 0,
+    ) -> None:
+        """
+        Добавляет задачу в текущую транзакцию сессии. Коммит остаётся за вызывающим;
+        после него стоит вызвать notify(), чтобы воркер не ждал следующего опроса.
+        Повторная постановка с тем же idempotency_key игнорируется.
+        """
+        job = self._types.get(job_type)
+        stmt = insert(Job).values(
+            job_type=job_type,
+            payload=json.dumps(payload or {}),
+            idempotency_key=idempotency_key,
+            max_attempts=job.max_attempts if job else self.config.max_attempts,
+            run_after=_utcnow() + timedelta(seconds=delay),
+        ).on_conflict_do_nothing(index_elements=[Job.idempotency_key])
+        await session.execute(stmt)
+        logger.info("Задача %s поставлена в очередь: %s" % (job_type, payload))
+
+    async def enqueue_many(
+        self,
+        session: AsyncSession,
+        job_type: str,
+        payloads: list[dict],
+    ) -> None:
+        """Пакетная постановка однотипных задач одним INSERT."""
+        if not payloads:
+            return
+        job = self._types.get(job_type)
+        run_after = _utcnow()
+        await session.execute(
+            insert(Job).values(
+                [
+                    {
+                        "job_type": job_type,
+                        "payload": json.dumps(payload),
+                        "max_attempts": job.max_attempts if job else self.config.max_attempts,
+                        "run_after": run_after,
+                    }
+                    for payload in payloads
+                ]
+            )
+        )
+        logger.info("Поставлено %s задач %s" % (len(payloads), job_type))
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        # Event привязан к циклу событий: у каждого запуска приложения свой
+        self._wakeup = asyncio.Event()
+        if self.config.enabled and self._poller is None:
+            self._stopping = False
+            self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if self._poller is not None:
+            # Поллер дорабатывает текущий проход: отмена посреди захвата задач
+            # оставила бы их заблокированными до истечения lease_seconds
+            self._stopping = True
+            self.notify()
+            await asyncio.wait({self._poller}, timeout=timeout)
+            self._poller.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._poller
+            self._poller = None
+        if self._running:
+            # Незавершённые задачи вернутся в очередь по истечении lease_seconds
+            _, pending = await asyncio.wait(self._running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+    async def _poll(self) -> None:
+        last_cleanup = _utcnow()
+        while not self._stopping:
+            try:
+                await self._enqueue_scheduled()
+                await self._claim_and_run()
+                if _utcnow() - last_cleanup > timedelta(hours=1):
+                    await self._cleanup()
+                    last_cleanup = _utcnow()
+            except Exception as e:
+                # Поллер не должен умирать молча: ошибка логируется, опрос продолжается
+                logger.error("Ошибка при выборке фоновых задач: %s" % e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.config.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _enqueue_scheduled(self) -> None:
+        for job_type, every in self._schedules.items():
+            slot = int(time.time() // every)
+            if self._scheduled_slots.get(job_type) == slot:
+                continue
+            async with db_helper.session_factory() as session:
+                await self.enqueue(session, job_type, idempotency_key=f"{job_type}:{slot}")
+                await session.commit()
+            self._scheduled_slots[job_type] = slot
+
+    async def _claim_and_run(self) -> None:
+        now = _utcnow()
+        for job_type, job in self._types.items():
+            free = job.concurrency - job.running
+            if free <= 0:
+                continue
+            available = (
+                select(Job.id)
+                .where(
+                    Job.job_type == job_type,
+                    or_(
+                        Job.status == "pending",
+                        # задача воркера, который упал, не успев её завершить
+                        (Job.status == "running") & (Job.locked_until < now),
+                    ),
+                    Job.run_after <= now,
+                )
+                .order_by(Job.run_after)
+                .limit(free)
+            )
+            stmt = (
+                update(Job)
+                .where(Job.id.in_(available.scalar_subquery()))
+                .values(
+                    status="running",
+                    attempts=Job.attempts + 1,
+                    locked_until=now + timedelta(seconds=self.config.lease_seconds),
+                )
+                .returning(Job.id, Job.payload, Job.attempts, Job.max_attempts)
+            )
+            async with db_helper.session_factory() as session:
+                claimed = (await session.execute(stmt)).all()
+                await session.commit()
+
+            for row in claimed:
+                job.running += 1
+                task = asyncio.create_task(self._execute(job_type, job, row))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _execute(self, job_type: str, job: _JobType, row) -> None:
+        try:
+            await job.handler(json.loads(row.payload))
+        except Exception as e:
+            logger.error("Задача %s #%s завершилась ошибкой: %s" % (job_type, row.id, e))
+            await self._finish(row, error=repr(e))
+        else:
+            await self._finish(row)
+        finally:
+            job.running -= 1
+            self.notify()
+
+    async def _finish(self, row, error: str | None = None) -> None:
+        if error is None:
+            values = {"status": "done", "locked_until": None, "last_error": None}
+        elif row.attempts >= row.max_attempts:
+            values = {"status": "failed", "locked_until": None, "last_error": error}
+        else:
+            backoff = min(
+                self.config.backoff_base * 2 ** (row.attempts - 1), self.config.backoff_max
+            )
+            values = {
+                "status": "pending",
+                "locked_until": None,
+                "last_error": error,
+                "run_after": _utcnow() + timedelta(seconds=backoff),
+            }
+        try:
+            async with db_helper.session_factory() as session:
+                await session.execute(update(Job).where(Job.id == row.id).values(**values))
+                await session.commit()
+        except SQLAlchemyError as e:
+            # Задача останется running и будет захвачена снова после lease_seconds
+            logger.error("Не удалось сохранить результат задачи #%s: %s" % (row.id, e))
+
+    async def _cleanup(self) -> None:
+        now = _utcnow()
+        done_border = now - timedelta(hours=self.config.retention_hours)
+        failed_border = now - timedelta(hours=self.config.failed_retention_hours)
+        async with db_helper.session_factory() as session:
+            await session.execute(
+                delete(Job).where(
+                    or_(
+                        (Job.status == "done") & (Job.updated_at < done_border),
+                        (Job.status == "failed") & (Job.updated_at < failed_border),
+                    )
+                )
+            )
+            await session.commit()
+
+
+job_queue = JobQueue(settings.jobs)
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from sqlalchemy import MetaData, Text, TIMESTAMP, func
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, foreign
+
+from core.models.base import Tag, User
+from core.models.types import CompressedText
+
+
+class ArchiveBase(DeclarativeBase):
+    """
+    Таблицы архива старых блогов (core.archive). Архив - отдельный файл SQLite,
+    подключаемый к соединениям основной БД как схема archive, поэтому его
+    таблицы не входят в Base.metadata и миграции alembic: схему создаёт
+    core.archive.BlogArchive.prepare. Внешних ключей между файлами нет.
+    """
+
+    metadata = MetaData(schema="archive")
+
+
+class ArchivedBlogTag(ArchiveBase):
+    __tablename__ = "blog_tags"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    blog_id: Mapped[int] = mapped_column(nullable=False, index=True)
+    tag_id: Mapped[int] = mapped_column(nullable=False, index=True)
+
+
+class ArchivedBlog(ArchiveBase):
+    """
+    Перенесённый в архив опубликованный блог. Столбцы те же, что у blogs
+    (content копируется как хранится, в том числе сжатым), просмотры
+    сохраняются на момент переноса и больше не растут.
+    """
+
+    __tablename__ = "blogs"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(nullable=False)
+    author: Mapped[int] = mapped_column(nullable=False, index=True)
+    content: Mapped[str] = mapped_column(CompressedText)
+    short_description: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(nullable=False)
+    views: Mapped[int] = mapped_column(default=0)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP)
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP)
+    archived_at: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now())
+
+    # Автор и теги остаются в основной БД
+    user: Mapped[User] = relationship(
+        User, primaryjoin=lambda: foreign(ArchivedBlog.author) == User.id, viewonly=True
+    )
+    tags: Mapped[list[Tag]] = relationship(
+        Tag,
+        secondary=ArchivedBlogTag.__table__,
+        primaryjoin=lambda: ArchivedBlog.id == foreign(ArchivedBlogTag.blog_id),
+        secondaryjoin=lambda: Tag.id == foreign(ArchivedBlogTag.tag_id),
+        viewonly=True,
+    )
@@ -1,7 +1,9 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, Text, text, TIMESTAMP, func, String, UniqueConstraint
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import ForeignKey, LargeBinary, Text, text, TIMESTAMP, func, String, UniqueConstraint, select, Index
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, column_property
+
+from core.models.types import CompressedText
 
 
 class Base(DeclarativeBase):
@@ -26,6 +28,11 @@ class Role(Base):
 
 class User(Base):
     __tablename__ = "users"
+    # Для постраничного списка пользователей (пагинация по id)
+    __table_args__ = (
+        Index("ix_users_role_id_id", "role_id", "id"),
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     phone_number: Mapped[str] = mapped_column(unique=True, nullable=False)
     first_name: Mapped[str]
@@ -35,7 +42,8 @@ class User(Base):
     role_id: Mapped[int] = mapped_column(
         ForeignKey("roles.id"), default=1, server_default=text("1")
     )
-    role: Mapped["Role"] = relationship("Role", back_populates="users", lazy="joined")
+    # Название и права роли берутся из auth.roles.role_registry, а не джойном
+    role: Mapped["Role"] = relationship("Role", back_populates="users", lazy="raise")
 
     blogs: Mapped[list["Blog"]] = relationship(back_populates="user")
 
@@ -45,10 +53,13 @@ class User(Base):
 
 class Blog(Base):
     __tablename__ = "blogs"
+    # id удалённых блогов не выдаются повторно: они могут быть заняты в архиве
+    __table_args__ = {"sqlite_autoincrement": True}
 
     title: Mapped[str] = mapped_column(unique=True, nullable=False)
     author: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
-    content: Mapped[str] = mapped_column(Text)
+    # длинные тексты хранятся сжатыми (core.models.types.ContentCodec)
+    content: Mapped[str] = mapped_column(CompressedText)
     short_description: Mapped[str] = mapped_column(Text)
     status: Mapped[str] = mapped_column(default="published", server_default="published")
 
@@ -78,3 +89,104 @@ class BlogTag(Base):
     tag_id: Mapped[int] = mapped_column(
         ForeignKey("tags.id", ondelete="CASCADE"), nullable=False
     )
+
+
+class BlogViews(Base):
+    """Счётчик просмотров блога. Пишется пачками из api.counters.ViewCounter."""
+
+    __tablename__ = "blog_views"
+
+    blog_id: Mapped[int] = mapped_column(
+        ForeignKey("blogs.id", ondelete="CASCADE"), unique=True, nullable=False
+    )
+    views: Mapped[int] = mapped_column(
+        default=0, server_default=text("0"), index=True
+    )
+
+
+class TagStats(Base):
+    """
+    Число опубликованных блогов с тегом. Меняется в api.crud в одной транзакции
+    с блогами и связями, сверяется фоновой задачей tags.reconcile_stats.
+    """
+
+    __tablename__ = "tag_stats"
+
+    tag_id: Mapped[int] = mapped_column(
+        ForeignKey("tags.id", ondelete="CASCADE"), unique=True, nullable=False
+    )
+    published_count: Mapped[int] = mapped_column(
+        default=0, server_default=text("0"), index=True
+    )
+
+
+# Просмотры подгружаются вместе с блогом коррелированным подзапросом по blog_id
+Blog.views = column_property(
+    func.coalesce(
+        select(BlogViews.views)
+        .where(BlogViews.blog_id == Blog.id)
+        .correlate_except(BlogViews)
+        .scalar_subquery(),
+        0,
+    )
+)
+
+
+class Job(Base):
+    """Фоновая задача для core.jobs.JobQueue."""
+
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+    job_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, default="{}", server_default="{}")
+    idempotency_key: Mapped[str | None] = mapped_column(String(200), unique=True)
+    status: Mapped[str] = mapped_column(default="pending", server_default="pending")
+    attempts: Mapped[int] = mapped_column(default=0, server_default=text("0"))
+    max_attempts: Mapped[int] = mapped_column(default=5, server_default=text("5"))
+    run_after: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now())
+    locked_until: Mapped[datetime | None] = mapped_column(TIMESTAMP)
+    last_error: Mapped[str | None] = mapped_column(Text)
+
+
+class CacheVersion(Base):
+    """
+    Версии редко меняющихся справочников, кэшируемых в памяти воркеров.
+    Изменивший справочник увеличивает версию в той же транзакции,
+    остальные воркеры сверяют её и перечитывают данные.
+    """
+
+    __tablename__ = "cache_versions"
+
+    name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
+    version: Mapped[int] = mapped_column(default=0, server_default=text("0"))
+
+
+class BlogChange(Base):
+    """
+    Журнал изменений блогов. Пишется в той же транзакции, что и само изменение,
+    и читается core.changes.ChangeFeed каждого воркера по возрастанию id.
+    """
+
+    __tablename__ = "blog_changes"
+    # AUTOINCREMENT: id не переиспользуются после очистки журнала, позиция читателя остаётся верной
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    # без внешнего ключа: запись об удалении переживает сам блог
+    blog_id: Mapped[int] = mapped_column(nullable=False)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)  # created, status, deleted
+    status: Mapped[str | None]
+    author: Mapped[int | None]
+    tag_ids: Mapped[str | None] = mapped_column(Text)  # id тегов через запятую
+
+
+class ContentDictionary(Base):
+    """
+    Словари сжатия текстов блогов для core.models.types.ContentCodec.
+    Не меняются: сжатая строка ссылается на словарь по id.
+    """
+
+    __tablename__ = "content_dictionaries"
+
+    codec: Mapped[str] = mapped_column(String(10), nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
@@ -1,26 +1,283 @@
+import asyncio
+from contextlib import suppress
+import os
 from asyncio import current_task
+from logging import getLogger
+from pathlib import Path
+from urllib.parse import quote
+from typing import Any, Awaitable, Callable
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
     create_async_engine,
     async_sessionmaker,
     async_scoped_session,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from core.config import settings
+from core.config import settings, ArchiveConfig, DataBaseConfig
+
+logger = getLogger(__name__)
+
+WriteUnit = Callable[[AsyncSession], Awaitable[Any]]
+
+
+def attach_read_only(cursor, attach: dict[str, Path]) -> None:
+    """
+    Подключает дополнительные файлы БД только для чтения. Ещё не созданный
+    файл пропускается: его подключат соединения, открытые после создания.
+    """
+    for name, path in attach.items():
+        if os.path.exists(path):
+            uri = f"file:{quote(str(path))}?mode=ro"
+            cursor.execute(f"ATTACH DATABASE ? AS {name}", (uri,))
+
+
+def _sqlite_pragmas(journal_mode: str | None, busy_timeout: int, attach: dict[str, Path]):
+    def on_connect(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        # Без этого SQLite игнорирует внешние ключи, в том числе ON DELETE CASCADE
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        if journal_mode:
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        attach_read_only(cursor, attach)
+        cursor.close()
+
+    return on_connect
+
+
+def _disable_driver_begin(dbapi_connection, connection_record) -> None:
+    # Драйвер sqlite3 сам начинает транзакцию только перед изменением данных
+    # и ломает SAVEPOINT; транзакцию начинает _begin_immediate
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(conn) -> None:
+    # Блокировка записи берётся сразу, а не при первом INSERT посреди пачки
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class GroupCommitWriter:
+    """
+    Единственный писатель SQLite: единицы работы из очереди выполняются на
+    одном соединении, до batch_size штук в одной транзакции с одним коммитом
+    (и одним fsync). Каждая единица работает в своём SAVEPOINT: её ошибка
+    откатывает только её и достаётся только её вызывающему. Результаты
+    отдаются после коммита, ошибка коммита - всем единицам пачки.
+    Единица не вызывает commit и rollback сама: это завершило бы транзакцию
+    всей пачки, поэтому такая пачка целиком завершается ошибкой.
+    """
+
+    def __init__(self, engine: AsyncEngine, batch_size: int, linger: float):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.linger = linger
+        self._session_factory = async_sessionmaker(
+            bind=engine, autoflush=False, expire_on_commit=False
+        )
+        self._queue: asyncio.Queue[tuple[WriteUnit, asyncio.Future]] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    async def submit(self, unit: WriteUnit) -> Any:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((unit, future))
+        return await future
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.engine.dispose()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch: list[tuple[WriteUnit, asyncio.Future]]) -> None:
+        # вызывающий мог уйти (отмена запроса), пока запись ждала в очереди
+        batch = [(unit, future) for unit, future in batch if not future.done()]
+        done = []
+        try:
+            async with self._session_factory() as session, session.begin() as outer:
+                for unit, future in batch:
+                    try:
+                        async with session.begin_nested():
+                            result = await unit(session)
+                    except Exception as e:
+                        # rollback() внутри единицы откатил всю пачку, а не её SAVEPOINT
+                        if not outer.is_active:
+                            raise
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                    if not outer.is_active:
+                        raise RuntimeError(
+                            "Единица записи завершила общую транзакцию (commit или rollback)"
+                        )
+                    done.append((future, result))
+        except Exception as e:
+            logger.error("Ошибка группового коммита (%s записей): %s" % (len(batch), e))
+            # записи пачки не зафиксированы: ошибку получают все, кто ещё ждёт
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in done:
+            if not future.done():
+                future.set_result(result)
+
+
+def archive_attachments(archive: ArchiveConfig | None) -> dict[str, Path]:
+    if archive is None or not archive.enabled:
+        return {}
+    return {"archive": archive.path}
 
 
 class DBHelper:
-    def __init__(self, url: str, echo: bool = False):
-        self.engine = create_async_engine(
-            url=url,
-            echo=echo,
+    """
+    Движок создаётся лениво при первом обращении, поэтому импорт модуля
+    ничего не открывает, а настройки можно подменить до старта приложения.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        echo: bool = False,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        **options,
+    ):
+        self.configure(url, echo, pool_size, max_overflow, **options)
+
+    def configure(
+        self,
+        url: str,
+        echo: bool = False,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        journal_mode: str | None = None,
+        busy_timeout: int = 5000,
+        group_commit: bool = False,
+        write_batch_size: int = 64,
+        write_linger: float = 0.002,
+        attach: dict[str, Path] | None = None,
+    ) -> None:
+        self.url = url
+        self.echo = echo
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.journal_mode = journal_mode
+        self.busy_timeout = busy_timeout
+        self.group_commit = group_commit
+        self.write_batch_size = write_batch_size
+        self.write_linger = write_linger
+        self.attach = attach or {}  # имя схемы -> файл, подключаемый только для чтения
+        self._engine: AsyncEngine | None = None
+        self._session_factory: async_sessionmaker | None = None
+        self._writer: GroupCommitWriter | None = None
+
+    def configure_from(self, config: DataBaseConfig, archive: ArchiveConfig | None = None) -> None:
+        self.configure(
+            url=config.url,
+            echo=config.echo,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            journal_mode=config.journal_mode,
+            busy_timeout=config.busy_timeout,
+            group_commit=config.group_commit,
+            write_batch_size=config.write_batch_size,
+            write_linger=config.write_linger,
+            attach=archive_attachments(archive),
         )
-        self.session_factory = async_sessionmaker(
-            bind=self.engine,
-            autoflush=False,
-            autocommit=False,
-            expire_on_commit=False,
+
+    def _create_engine(self, pool_size: int, max_overflow: int) -> AsyncEngine:
+        engine = create_async_engine(
+            url=self.url,
+            echo=self.echo,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
         )
+        if engine.dialect.name == "sqlite":
+            event.listen(
+                engine.sync_engine,
+                "connect",
+                _sqlite_pragmas(self.journal_mode, self.busy_timeout, self.attach),
+            )
+        return engine
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            self._engine = self._create_engine(self.pool_size, self.max_overflow)
+        return self._engine
+
+    @property
+    def writer(self) -> GroupCommitWriter | None:
+        """Писатель с групповым коммитом на отдельном соединении (если включён)."""
+        if self._writer is None and self.group_commit:
+            engine = self._create_engine(pool_size=1, max_overflow=0)
+            if engine.dialect.name == "sqlite":
+                event.listen(engine.sync_engine, "connect", _disable_driver_begin)
+                event.listen(engine.sync_engine, "begin", _begin_immediate)
+            self._writer = GroupCommitWriter(
+                engine, batch_size=self.write_batch_size, linger=self.write_linger
+            )
+        return self._writer
+
+    @property
+    def session_factory(self) -> async_sessionmaker:
+        if self._session_factory is None:
+            self._session_factory = async_sessionmaker(
+                bind=self.engine,
+                autoflush=False,
+                autocommit=False,
+                expire_on_commit=False,
+            )
+        return self._session_factory
+
+    async def write(self, unit: WriteUnit) -> Any:
+        """
+        Выполняет unit(session) и коммитит; возвращает результат unit.
+        unit не коммитит сам. С group_commit выполняется писателем вместе с
+        другими записями, иначе - в отдельной сессии.
+        """
+        if self.writer is not None:
+            return await self.writer.submit(unit)
+        async with self.session_factory() as session:
+            result = await unit(session)
+            await session.commit()
+            return result
+
+    async def dispose(self) -> None:
+        if self._writer is not None:
+            await self._writer.stop()
+        if self._engine is not None:
+            await self._engine.dispose()
+        self._engine = None
+        self._session_factory = None
+        self._writer = None
 
     def get_scoped_session(self):
         session = async_scoped_session(
@@ -39,4 +296,12 @@ class DBHelper:
 db_helper = DBHelper(
     url=settings.db.url,
     echo=settings.db.echo,
+    pool_size=settings.db.pool_size,
+    max_overflow=settings.db.max_overflow,
+    journal_mode=settings.db.journal_mode,
+    busy_timeout=settings.db.busy_timeout,
+    group_commit=settings.db.group_commit,
+    write_batch_size=settings.db.write_batch_size,
+    write_linger=settings.db.write_linger,
+    attach=archive_attachments(settings.archive),
 )
@@ -0,0 +1,211 @@
+import struct
+import zlib
+from collections import Counter
+from logging import getLogger
+
+from sqlalchemy import Text, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.types import TypeDecorator
+
+from core.config import settings, ContentCompressionConfig
+
+try:
+    import zstandard
+except ImportError:  # zstandard не обязателен
+    zstandard = None
+
+logger = getLogger(__name__)
+
+# Сжатый текст хранится как BLOB: кодек (1 байт), id словаря (4 байта, 0 - без
+# словаря) и сжатые данные. Несжатый хранится как TEXT, поэтому различаются
+# по типу значения, а не по префиксу.
+HEADER = struct.Struct(">BI")
+CODEC_IDS = {"zlib": 1, "zstd": 2}
+CODEC_NAMES = {value: key for key, value in CODEC_IDS.items()}
+
+
+class ContentCodec:
+    """
+    Сжатие длинных текстов для хранения в БД. Словари обучаются на текстах
+    блогов (train_dictionary) и хранятся в таблице content_dictionaries;
+    каждый воркер загружает их при старте (load). Словарь с наибольшим id
+    подходящего кодека используется для сжатия, остальные - только для
+    чтения старых строк. Словари не меняются и не удаляются, пока есть
+    сжатые ими строки.
+    """
+
+    def __init__(self, config: ContentCompressionConfig):
+        self.config = config
+        self._dictionaries: dict[int, tuple[str, bytes]] = {}
+        self._zstd_compressors: dict[int, "zstandard.ZstdCompressor"] = {}
+        self._zstd_decompressors: dict[int, "zstandard.ZstdDecompressor"] = {}
+        self._zlib_compressors: dict[int, "zlib._Compress"] = {}
+
+    @property
+    def codec(self) -> str:
+        if self.config.codec == "zstd" and zstandard is not None:
+            return "zstd"
+        return "zlib"
+
+    def register(self, dictionary_id: int, codec: str, data: bytes) -> None:
+        self._dictionaries[dictionary_id] = (codec, data)
+
+    async def load(self, session: AsyncSession) -> None:
+        from core.models.base import ContentDictionary
+
+        rows = await session.execute(
+            select(ContentDictionary.id, ContentDictionary.codec, ContentDictionary.data)
+        )
+        for row in rows:
+            self.register(row.id, row.codec, row.data)
+        if self._dictionaries:
+            logger.info("Загружено словарей сжатия текстов: %s" % len(self._dictionaries))
+
+    def _active_dictionary(self, codec: str) -> int:
+        return max(
+            (key for key, (name, _) in self._dictionaries.items() if name == codec),
+            default=0,
+        )
+
+    def _dictionary(self, dictionary_id: int, codec: str) -> bytes:
+        try:
+            name, data = self._dictionaries[dictionary_id]
+        except KeyError:
+            raise LookupError("Словарь сжатия %s не загружен" % dictionary_id) from None
+        if name != codec:
+            raise ValueError("Словарь %s обучен для %s, а не %s" % (dictionary_id, name, codec))
+        return data
+
+    def encode(self, value: str | None) -> str | bytes | None:
+        """Текст короче threshold остаётся строкой, длиннее - сжимается в bytes."""
+        if value is None or not self.config.enabled:
+            return value
+        raw = value.encode()
+        if len(raw) < self.config.threshold:
+            return value
+        codec = self.codec
+        dictionary_id = self._active_dictionary(codec)
+        if codec == "zstd":
+            compressed = self._zstd_compressor(dictionary_id).compress(raw)
+        else:
+            compressor = self._zlib_compressor(dictionary_id)
+            compressed = compressor.compress(raw) + compressor.flush()
+        stored = HEADER.pack(CODEC_IDS[codec], dictionary_id) + compressed
+        # несжимаемый текст дешевле читать как есть
+        return stored if len(stored) < len(raw) else value
+
+    def decode(self, value: str | bytes | None) -> str | None:
+        if value is None or isinstance(value, str):
+            return value
+        codec_id, dictionary_id = HEADER.unpack_from(value)
+        payload = memoryview(value)[HEADER.size:]
+        codec = CODEC_NAMES.get(codec_id)
+        if codec == "zstd":
+            return self._zstd_decompressor(dictionary_id).decompress(payload).decode()
+        if codec == "zlib":
+            if dictionary_id:
+                decompressor = zlib.decompressobj(
+                    -zlib.MAX_WBITS, zdict=self._dictionary(dictionary_id, codec)
+                )
+            else:
+                decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return (decompressor.decompress(payload) + decompressor.flush()).decode()
+        raise ValueError("Неизвестный кодек сжатого текста: %s" % codec_id)
+
+    def _zlib_compressor(self, dictionary_id: int):
+        # объект с уже загруженным словарём копируется, а не создаётся заново
+        base = self._zlib_compressors.get(dictionary_id)
+        if base is None:
+            options = {}
+            if dictionary_id:
+                options["zdict"] = self._dictionary(dictionary_id, "zlib")
+            base = zlib.compressobj(
+                self.config.zlib_level, zlib.DEFLATED, -zlib.MAX_WBITS, **options
+            )
+            self._zlib_compressors[dictionary_id] = base
+        return base.copy()
+
+    def _zstd_dict(self, dictionary_id: int):
+        if zstandard is None:
+            raise RuntimeError("Для чтения текстов, сжатых zstd, нужен пакет zstandard")
+        if not dictionary_id:
+            return None
+        return zstandard.ZstdCompressionDict(self._dictionary(dictionary_id, "zstd"))
+
+    def _zstd_compressor(self, dictionary_id: int):
+        compressor = self._zstd_compressors.get(dictionary_id)
+        if compressor is None:
+            dict_data = self._zstd_dict(dictionary_id)
+            compressor = zstandard.ZstdCompressor(
+                level=self.config.zstd_level,
+                dict_data=dict_data,
+                write_content_size=True,
+            )
+            self._zstd_compressors[dictionary_id] = compressor
+        return compressor
+
+    def _zstd_decompressor(self, dictionary_id: int):
+        decompressor = self._zstd_decompressors.get(dictionary_id)
+        if decompressor is None:
+            dict_data = self._zstd_dict(dictionary_id)
+            decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+            self._zstd_decompressors[dictionary_id] = decompressor
+        return decompressor
+
+    def train_dictionary(self, samples: list[bytes]) -> bytes | None:
+        """
+        Словарь для текущего кодека по образцам текстов; None, если образцов
+        слишком мало, чтобы словарь помог.
+        """
+        size = self.config.dictionary_size
+        if self.codec == "zstd":
+            try:
+                return zstandard.train_dictionary(size, samples).as_bytes()
+            except zstandard.ZstdError as e:
+                logger.warning("Словарь zstd не обучен: %s" % e)
+                return None
+        return _train_zlib_dictionary(samples, size)
+
+
+def _train_zlib_dictionary(samples: list[bytes], size: int) -> bytes | None:
+    # Словарь zlib - просто текст, на который могут ссылаться первые 32 КБ
+    # сжимаемых данных. В него попадают строки и слова, встречающиеся в разных
+    # текстах; самые выгодные ставятся в конец, ближе к данным.
+    counts: Counter[bytes] = Counter()
+    for sample in samples:
+        lines = {line.strip() for line in sample.splitlines()}
+        words = set(sample.split())
+        counts.update(part for part in lines | words if len(part) >= 4)
+    common = sorted(
+        ((count * len(part), part) for part, count in counts.items() if count > 1),
+        reverse=True,
+    )
+    chosen, total = [], 0
+    for _, part in common:
+        if total + len(part) + 1 > size:
+            continue
+        chosen.append(part)
+        total += len(part) + 1
+    if not chosen:
+        return None
+    return b"\n".join(reversed(chosen))
+
+
+content_codec = ContentCodec(settings.content_compression)
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text, длинные значения которого хранятся сжатыми (ContentCodec).
+    Для ORM и схем Pydantic это обычная строка. По сжатому столбцу нельзя
+    искать через LIKE и сравнивать в SQL.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return content_codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        return content_codec.decode(value)
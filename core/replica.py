@@ -0,0 +1,318 @@
+import asyncio
+from contextlib import suppress
+import os
+import tempfile
+import time
+from datetime import datetime
+from logging import getLogger
+
+from sqlalchemy import Column, Index, MetaData, Table, Text, delete, event, func, select, type_coerce
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from core.changes import change_feed, BlogChangeEvent
+from core.config import settings, ReplicaConfig
+from core.models.base import Base, BlogChange
+from core.models.db_helper import attach_read_only, db_helper
+from core.models.types import CompressedText
+
+logger = getLogger(__name__)
+
+# Таблицы копии и их столбцы (None - все). От пользователей нужно только
+# имя автора (api.crud.BLOG_AUTHOR_COLUMNS), пароли и контакты не копируются
+REPLICA_COLUMNS: dict[str, tuple[str, ...] | None] = {
+    "users": ("id", "first_name", "last_name"),
+    "tags": None,
+    "blogs": None,
+    "blog_tags": None,
+    "blog_views": None,
+}
+
+# Размер пачки id в одном запросе (лимит переменных SQLite)
+ID_CHUNK_SIZE = 500
+
+
+def _stored_type(column: Column):
+    # Сжатый текст копируется как хранится, без распаковки и повторного сжатия
+    if isinstance(column.type, CompressedText):
+        return Text()
+    return column.type
+
+
+replica_metadata = MetaData()
+for _name, _columns in REPLICA_COLUMNS.items():
+    Table(
+        _name,
+        replica_metadata,
+        *(
+            Column(column.name, _stored_type(column), primary_key=column.primary_key)
+            for column in Base.metadata.tables[_name].columns
+            if _columns is None or column.name in _columns
+        ),
+    )
+_tables = replica_metadata.tables
+Index("ix_replica_blogs_author", _tables["blogs"].c.author)
+Index("ix_replica_blog_tags_blog_id", _tables["blog_tags"].c.blog_id)
+Index("ix_replica_blog_tags_tag_id", _tables["blog_tags"].c.tag_id)
+Index("ix_replica_tags_name", _tables["tags"].c.name)
+Index("ix_replica_blog_views_blog_id", _tables["blog_views"].c.blog_id, unique=True)
+Index("ix_replica_blog_views_views", _tables["blog_views"].c.views)
+
+
+def _primary(name: str) -> Table:
+    return Base.metadata.tables[name]
+
+
+def _source_columns(name: str):
+    primary = _primary(name)
+    return [
+        type_coerce(primary.c[column.name], column.type).label(column.name)
+        for column in _tables[name].columns
+    ]
+
+
+class ReadReplica:
+    """
+    Копия опубликованного контента для чтения в каждом воркере: отдельная
+    SQLite в памяти (/dev/shm) с таблицами blogs (только опубликованные),
+    blog_tags, tags, blog_views и именами пользователей. Схема та же, поэтому
+    запросы api.crud выполняются на ней без изменений.
+
+    Блоги догоняются по журналу blog_changes (создание, статус, удаление),
+    пользователи и теги - по растущему id, просмотры - по updated_at.
+    Копия считается свежей (fresh), если применила все изменения, известные
+    журналу этого воркера, и синхронизировалась не позже max_lag назад;
+    иначе чтения идут в основную БД.
+    """
+
+    def __init__(self, config: ReplicaConfig):
+        self.config = config
+        self.loaded = False
+        self.position = 0  # последняя применённая запись blog_changes
+        self.synced_at = 0.0  # time.monotonic() последней полной синхронизации
+        self._max_ids = {"users": 0, "tags": 0}
+        self._views_watermark: datetime | None = None
+        self._path: str | None = None
+        self._engine: AsyncEngine | None = None
+        self._session_factory: async_sessionmaker | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def fresh(self) -> bool:
+        return (
+            self.loaded
+            and self.position >= change_feed.position
+            and time.monotonic() - self.synced_at <= self.config.max_lag
+        )
+
+    @property
+    def session_factory(self) -> async_sessionmaker:
+        return self._session_factory
+
+    def _create_engine(self) -> AsyncEngine:
+        directory = self.config.directory
+        if directory is None and os.path.isdir("/dev/shm"):
+            directory = "/dev/shm"
+        fd, self._path = tempfile.mkstemp(prefix="blog_replica_", suffix=".db", dir=directory)
+        os.close(fd)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{self._path}")
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def on_connect(dbapi_connection, connection_record) -> None:
+            # Копию можно восстановить из основной БД, поэтому fsync не нужен
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.execute(f"PRAGMA mmap_size={int(self.config.mmap_size)}")
+            # архив (core.archive) не копируется, а подключается так же, как к основной БД
+            attach_read_only(cursor, db_helper.attach)
+            cursor.close()
+
+        return engine
+
+    async def load(self, session: AsyncSession) -> None:
+        """Полное копирование из основной БД (session) при старте воркера."""
+        if not self.config.enabled:
+            return
+        self._engine = self._create_engine()
+        self._session_factory = async_sessionmaker(
+            bind=self._engine, autoflush=False, expire_on_commit=False
+        )
+        async with self._engine.begin() as conn:
+            await conn.run_sync(replica_metadata.create_all)
+
+        # Позиция журнала берётся до копирования: изменения во время копирования
+        # будут применены повторно, а не потеряны
+        self.position = await change_feed.latest_id(session)
+        blogs, blog_tags = _primary("blogs"), _primary("blog_tags")
+        copied = {
+            "users": await self._copy(session, "users"),
+            "tags": await self._copy(session, "tags"),
+            "blogs": await self._copy(session, "blogs", blogs.c.status == "published"),
+            "blog_tags": await self._copy(
+                session,
+                "blog_tags",
+                blog_tags.c.blog_id.in_(
+                    select(blogs.c.id).where(blogs.c.status == "published")
+                ),
+            ),
+            "blog_views": await self._copy(session, "blog_views"),
+        }
+        self._views_watermark = await session.scalar(
+            select(func.max(_primary("blog_views").c.updated_at))
+        )
+        self.loaded = True
+        self.synced_at = time.monotonic()
+        logger.info("Копия для чтения построена в %s: %s" % (self._path, copied))
+
+    async def _copy(self, session: AsyncSession, name: str, *criteria) -> int:
+        primary = _primary(name)
+        last_id, total = 0, 0
+        while True:
+            query = (
+                select(*_source_columns(name))
+                .where(primary.c.id > last_id, *criteria)
+                .order_by(primary.c.id)
+                .limit(self.config.batch_size)
+            )
+            rows = (await session.execute(query)).mappings().all()
+            if not rows:
+                break
+            async with self._engine.begin() as conn:
+                await conn.execute(insert(_tables[name]).prefix_with("OR REPLACE"), rows)
+            last_id = rows[-1]["id"]
+            total += len(rows)
+        if name in self._max_ids:
+            self._max_ids[name] = max(self._max_ids[name], last_id)
+        return total
+
+    async def refresh(self) -> int:
+        """Догоняет основную БД; возвращает число применённых записей журнала."""
+        blogs, blog_tags, blog_views = (
+            _primary("blogs"), _primary("blog_tags"), _primary("blog_views")
+        )
+        async with db_helper.session_factory() as session:
+            changes = (
+                await session.execute(
+                    select(BlogChange.id, BlogChange.blog_id)
+                    .where(BlogChange.id > self.position)
+                    .order_by(BlogChange.id)
+                    .limit(self.config.batch_size)
+                )
+            ).all()
+            blog_ids = list({row.blog_id for row in changes})
+            new_rows = {
+                name: await self._fetch(session, name, _primary(name).c.id > self._max_ids[name])
+                for name in self._max_ids
+            }
+            changed_blogs, changed_tags = [], []
+            for start in range(0, len(blog_ids), ID_CHUNK_SIZE):
+                chunk = blog_ids[start:start + ID_CHUNK_SIZE]
+                published = select(blogs.c.id).where(
+                    blogs.c.id.in_(chunk), blogs.c.status == "published"
+                )
+                changed_blogs += await self._fetch(session, "blogs", blogs.c.id.in_(published))
+                changed_tags += await self._fetch(
+                    session, "blog_tags", blog_tags.c.blog_id.in_(published)
+                )
+            views_criteria = []
+            if self._views_watermark is not None:
+                # updated_at с точностью до секунды: строки этой секунды читаются повторно
+                views_criteria.append(blog_views.c.updated_at >= self._views_watermark)
+            views = await self._fetch(session, "blog_views", *views_criteria)
+
+        async with self._engine.begin() as conn:
+            for name, rows in new_rows.items():
+                await self._upsert(conn, name, rows)
+            replica_blogs, replica_blog_tags = _tables["blogs"], _tables["blog_tags"]
+            for start in range(0, len(blog_ids), ID_CHUNK_SIZE):
+                chunk = blog_ids[start:start + ID_CHUNK_SIZE]
+                await conn.execute(
+                    delete(replica_blog_tags).where(replica_blog_tags.c.blog_id.in_(chunk))
+                )
+                await conn.execute(delete(replica_blogs).where(replica_blogs.c.id.in_(chunk)))
+            await self._upsert(conn, "blogs", changed_blogs)
+            await self._upsert(conn, "blog_tags", changed_tags)
+            await self._upsert(conn, "blog_views", views)
+
+        for name, rows in new_rows.items():
+            if rows:
+                self._max_ids[name] = max(self._max_ids[name], max(row["id"] for row in rows))
+        if views:
+            self._views_watermark = max(row["updated_at"] for row in views)
+        if changes:
+            self.position = changes[-1].id
+        if len(changes) < self.config.batch_size:
+            self.synced_at = time.monotonic()
+        return len(changes)
+
+    async def _fetch(self, session: AsyncSession, name: str, *criteria) -> list:
+        query = select(*_source_columns(name)).where(*criteria)
+        return list((await session.execute(query)).mappings().all())
+
+    @staticmethod
+    async def _upsert(conn, name: str, rows: list) -> None:
+        if rows:
+            await conn.execute(insert(_tables[name]).prefix_with("OR REPLACE"), rows)
+
+    def apply(self, events: list[BlogChangeEvent]) -> None:
+        # Данные читаются из основной БД, изменения журнала только будят refresh
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self.refresh() == self.config.batch_size:
+                    pass
+            except Exception as e:
+                logger.error("Ошибка при обновлении копии для чтения: %s" % e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.config.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        # Event привязан к циклу событий: у каждого запуска приложения свой
+        self._wakeup = asyncio.Event()
+        if self.loaded and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.loaded = False
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+        if self._path is not None:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self._path + suffix)
+                except FileNotFoundError:
+                    pass
+            self._path = None
+
+
+read_replica = ReadReplica(settings.replica)
+change_feed.subscribe(read_replica.apply)
+
+
+def read_session_factory() -> async_sessionmaker:
+    """Сессии для чтения опубликованного: копия, если она свежая, иначе основная БД."""
+    if read_replica.fresh():
+        return read_replica.session_factory
+    return db_helper.session_factory
+
+
+async def read_session_dependency():
+    async with read_session_factory()() as session:
+        yield session
@@ -0,0 +1,42 @@
+from importlib.util import find_spec
+from logging import getLogger
+
+import uvicorn
+
+from core.config import ServerConfig
+
+logger = getLogger(__name__)
+
+
+def run_server(config: ServerConfig, app: str = "main:app") -> None:
+    """
+    Запуск uvicorn с параметрами из Settings.
+    Сигнал SIGTERM uvicorn обрабатывает сам: перестаёт принимать соединения
+    и ждёт завершения запросов не дольше timeout_graceful_shutdown.
+    """
+    loop = config.loop if find_spec(config.loop) else "auto"
+    http = config.http if find_spec(config.http) else "auto"
+
+    if config.reload:
+        logger.info("Запуск в режиме разработки с перезагрузкой")
+        uvicorn.run(app, host=config.host, port=config.port, reload=True)
+        return
+
+    logger.info(
+        "Запуск %s воркеров (loop=%s, http=%s) на %s:%s"
+        % (config.workers, loop, http, config.host, config.port)
+    )
+    uvicorn.run(
+        app,
+        host=config.host,
+        port=config.port,
+        workers=config.workers,
+        loop=loop,
+        http=http,
+        backlog=config.backlog,
+        timeout_keep_alive=config.timeout_keep_alive,
+        limit_concurrency=config.limit_concurrency,
+        timeout_graceful_shutdown=config.timeout_graceful_shutdown,
+        proxy_headers=True,
+        access_log=config.access_log,
+    )
@@ -0,0 +1,88 @@
+import asyncio
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class SingleFlightStats:
+    """Счётчики объединения запросов (в пределах одного воркера)."""
+
+    calls: int = 0  # вычислений запущено
+    coalesced: int = 0  # вызовов дождались чужого вычисления
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных чтений: вызовы do() с одним ключом,
+    пришедшие, пока вычисление идёт, ждут его результата, а не запускают своё.
+
+    Вычисление идёт отдельной задачей и должно открывать свою сессию БД:
+    сессия запроса, который его запустил, может закрыться раньше. Результат
+    общий для всех вызовов, поэтому проверки прав делаются после do().
+    Исключение получают все ожидающие, следующий вызов запускает вычисление
+    заново. Отмена одного вызова (клиент отключился) остальных не затрагивает,
+    вычисление отменяется, только когда его больше никто не ждёт.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = SingleFlightStats()
+        self._flights: dict[Hashable, _Flight] = {}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(compute()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._done(key, task))
+            self.stats.calls += 1
+        else:
+            self.stats.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+                # _done сработает только на следующей итерации цикла: пришедший
+                # до неё вызов присоединился бы к отменённому вычислению
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def forget(self, key: Hashable | None = None) -> None:
+        """
+        Новые вызовы с ключом (или все, если key не задан) запустят своё
+        вычисление: идущее уже могло прочитать данные до изменения.
+        Текущие ожидающие получат его результат.
+        """
+        if key is None:
+            self._flights.clear()
+        else:
+            self._flights.pop(key, None)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        flight = self._flights.get(key)
+        if flight is not None and flight.task is task:
+            del self._flights[key]
+        # исключение могло остаться без ожидающих: забираем его, чтобы asyncio не ругался
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("Ошибка вычисления %s %s: %s" % (self.name, key, task.exception()))
+
+    def log_stats(self) -> None:
+        logger.info(
+            "%s: вычислений %s, объединено запросов %s"
+            % (self.name, self.stats.calls, self.stats.coalesced)
+        )
@@ -1,15 +1,20 @@
-from logging import getLogger, basicConfig, INFO, StreamHandler
+import time
+
+_started_at = time.perf_counter()
 
-import uvicorn
+import asyncio
+from contextlib import asynccontextmanager
+from logging import getLogger, basicConfig, INFO, StreamHandler
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import ORJSONResponse
 
-from auth.views import router as auth_router
-from api.views import router as api_router
-from pages.views import router as pages_router
+from core.config import settings as default_settings, Settings
+
+# Подсистемы (БД, индексы, кэши, очередь задач) импортируются в create_app
+# и lifespan: импорт main не создаёт движок, не читает ключи и не тянет numpy
 
 logger = getLogger()
 
@@ -19,31 +24,232 @@ stream_handler = StreamHandler()
 stream_handler.setLevel(INFO)
 basicConfig(level=INFO, format=FORMAT, handlers=[stream_handler])
 
-app = FastAPI(default_response_class=ORJSONResponse)
-app.include_router(auth_router)
-app.include_router(api_router)
-app.include_router(pages_router)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def warm_up() -> None:
+    """
+    Прогрев до приёма трафика: пул соединений с БД, ключи, справочник ролей,
+    словари сжатия текстов, шаблоны и markdown.
+    """
+    from sqlalchemy import text
+
+    from auth.roles import role_registry
+    from auth.utils import load_jwt_keys
+    from core.models.db_helper import db_helper
+    from core.models.types import content_codec
+    from pages.render import render_markdown
+    from pages.views import get_templates
+
+    async def touch_connection():
+        async with db_helper.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(
+        *(touch_connection() for _ in range(db_helper.pool_size))
+    )
+
+    load_jwt_keys()
+
+    async with db_helper.session_factory() as session:
+        await role_registry.load(session)
+        await content_codec.load(session)
+
+    templates = get_templates()
+    for name in templates.env.list_templates():
+        templates.get_template(name)
+
+    render_markdown("# warm up")
+    logger.info("Прогрев приложения завершён")
+
+
+def configure(settings: Settings) -> None:
+    """
+    Настройка подсистем процесса по настройкам приложения. Подсистемы -
+    объекты модулей, общие на процесс, поэтому вызывается при запуске
+    приложения (lifespan), а не в create_app: созданное, но не запущенное
+    приложение не меняет состояние работающего.
+    """
+    from api.counters import view_counter
+    from api.listing_cache import listing_cache
+    from api.stream import published_stream
+    from api.tag_index import tag_index
+    from api.tag_suggest import tag_suggest
+    from auth.roles import role_registry
+    from auth.utils import configure_jwt
+    from core.archive import blog_archive
+    from core.changes import change_feed
+    from core.jobs import job_queue
+    from core.models.db_helper import db_helper
+    from core.models.types import content_codec
+    from core.replica import read_replica
+    from pages.feeds import feed_store
+
+    db_helper.configure_from(settings.db, archive=settings.archive)
+    blog_archive.config = settings.archive
+    content_codec.config = settings.content_compression
+    configure_jwt(settings.auth_jwt)
+    view_counter.config = settings.view_counter
+    job_queue.config = settings.jobs
+    # Расписание - по настройкам приложения, а не по прочитанным при импорте
+    job_queue.schedule("tags.reconcile_stats", every=settings.tag_stats.reconcile_interval)
+    if settings.archive.enabled:
+        job_queue.schedule("blogs.archive", every=settings.archive.interval)
+    else:
+        job_queue.unschedule("blogs.archive")
+    role_registry.config = settings.roles
+    change_feed.config = settings.changes
+    tag_index.config = settings.tag_index
+    tag_suggest.config = settings.tag_suggest
+    listing_cache.config = settings.listing_cache
+    read_replica.config = settings.replica
+    feed_store.config = settings.feeds
+    published_stream.config = settings.stream
+
 
-app.mount('/static', StaticFiles(directory='./static'), name='static')
+# Приложение, запущенное в этом процессе: подсистемы общие, второе
+# одновременно запущенное приложение перенастроило бы их под себя
+_running_app: FastAPI | None = None
 
 
-@app.get("/")
-def home_page():
-    return {"message": "Это стартовое сообщение надеюсь у меня всё получиться"}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _running_app
+    if _running_app is not None:
+        raise RuntimeError(
+            "В процессе уже запущено приложение: подсистемы общие на процесс, "
+            "запускайте приложения по очереди"
+        )
+    _running_app = app
+    try:
+        async with _run_subsystems(app):
+            yield
+    finally:
+        _running_app = None
+
+
+@asynccontextmanager
+async def _run_subsystems(app: FastAPI):
+    from api.blog_reads import blog_reads
+    from api.counters import view_counter
+    from api.listing_cache import listing_cache
+    from api.stream import published_stream
+    from api.tag_index import tag_index
+    from api.tag_suggest import tag_suggest
+    from core.archive import blog_archive
+    from core.changes import change_feed
+    from core.compression import compression_stats
+    from core.jobs import job_queue
+    from core.models.db_helper import db_helper
+    from core.replica import read_replica
+    from pages.feeds import feed_store
+    from pages.render import rendered_blogs
+
+    started = time.perf_counter()
+    configure(app.state.settings)
+    # Файл архива создаётся до первого соединения: его подключают при соединении
+    await blog_archive.prepare()
+    await warm_up()
+    # Позиция журнала берётся до построения индексов: изменения, сделанные
+    # во время построения, будут применены повторно, а не потеряны
+    async with db_helper.session_factory() as session:
+        position = await change_feed.latest_id(session)
+        await tag_index.load(session)
+        await tag_suggest.load(session)
+        await read_replica.load(session)
+        await feed_store.load(session)
+    # Время запуска: его читает benchmarks/startup.py
+    app.state.startup = {
+        "create_app_seconds": app.state.create_app_seconds,
+        "lifespan_seconds": time.perf_counter() - started,
+        "ready_seconds": time.perf_counter() - _started_at,
+    }
+    logger.info(
+        "Приложение готово к приёму запросов через %.3f с после импорта "
+        "(create_app %.3f с, запуск подсистем %.3f с)"
+        % (
+            app.state.startup["ready_seconds"],
+            app.state.startup["create_app_seconds"],
+            app.state.startup["lifespan_seconds"],
+        )
+    )
+    view_counter.start()
+    job_queue.start()
+    change_feed.start(position)
+    read_replica.start()
+    tag_suggest.start()
+    yield
+    await published_stream.stop()
+    await listing_cache.stop()
+    await rendered_blogs.stop()
+    blog_reads.log_stats()
+    listing_cache.flights.log_stats()
+    feed_store.flights.log_stats()
+    published_stream.log_stats()
+    compression_stats.log_stats()
+    # Фоновые задачи останавливаются и дожидаются до закрытия соединений с БД
+    await tag_suggest.stop()
+    await read_replica.stop()
+    await change_feed.stop()
+    await job_queue.stop()
+    await view_counter.stop()
+    await blog_archive.stop()
+    await db_helper.dispose()
+
+
+def create_app(settings: Settings | None = None) -> FastAPI:
+    """
+    Фабрика приложения. Подсистемы только импортируются здесь (вместе
+    с роутерами), а настраиваются, создаются и прогреваются в lifespan
+    (или лениво при первом обращении).
+    """
+    started = time.perf_counter()
+    from api.views import router as api_router
+    from auth.views import router as auth_router
+    from core.admission import AdmissionMiddleware
+    from core.compression import CompressionMiddleware
+    from pages.views import router as pages_router
+
+    settings = settings or default_settings
+
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+    app.state.settings = settings
+
+    app.include_router(auth_router)
+    app.include_router(api_router)
+    app.include_router(pages_router)
+
+    # Последний добавленный middleware - внешний слой
+    app.add_middleware(CompressionMiddleware, config=settings.compression)
+    # Отклонённые запросы не доходят до сжатия и приложения
+    app.add_middleware(AdmissionMiddleware, config=settings.admission)
+    # CORS снаружи: заголовки получают и отказы 503/429, preflight не занимает очередь
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.mount('/static', StaticFiles(directory='./static'), name='static')
+
+    @app.get("/")
+    def home_page():
+        return {"message": "Это стартовое сообщение надеюсь у меня всё получиться"}
+
+    app.state.create_app_seconds = time.perf_counter() - started
+    return app
+
+
+def __getattr__(name: str):
+    # main:app для uvicorn создаётся при первом обращении, а не при импорте main
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app", 
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-    )
\ No newline at end of file
+    from core.server import run_server
+
+    run_server(default_settings.server)
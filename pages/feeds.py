@@ -0,0 +1,318 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from hashlib import blake2b
+from logging import getLogger
+from urllib.parse import urlencode
+from xml.sax.saxutils import escape, quoteattr
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.crud import get_feed_blog_ids, get_feed_blogs, get_sitemap_rows, get_tag_id
+from api.utils import http_date, make_etag
+from core.changes import change_feed, BlogChangeEvent
+from core.config import settings, FeedsConfig
+from core.models.db_helper import db_helper
+from core.replica import read_session_factory
+from core.singleflight import SingleFlight
+
+logger = getLogger(__name__)
+
+# ("all",), ("author", id автора) или ("tag", id тега)
+FeedKey = tuple
+
+
+@dataclass
+class FeedEntry:
+    id: int
+    title: str
+    description: str
+    author_name: str
+    tags: tuple[str, ...]
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass
+class XmlDocument:
+    """Готовое тело ответа с данными для ETag и Last-Modified."""
+
+    body: bytes
+    etag: str
+    last_modified: datetime | None = None
+
+
+def _w3c_date(value: datetime) -> str:
+    # SQLite хранит CURRENT_TIMESTAMP в UTC без указания зоны
+    return value.replace(microsecond=0).isoformat() + "Z"
+
+
+def render_rss(
+    title: str, link: str, self_link: str, base_url: str, entries: list[FeedEntry]
+) -> bytes:
+    items = []
+    for entry in entries:
+        url = escape(f"{base_url}blogs/{entry.id}/")
+        categories = "".join(f"<category>{escape(tag)}</category>" for tag in entry.tags)
+        items.append(
+            f"<item><title>{escape(entry.title)}</title><link>{url}</link>"
+            f'<guid isPermaLink="true">{url}</guid>'
+            f"<description>{escape(entry.description)}</description>"
+            f"<dc:creator>{escape(entry.author_name)}</dc:creator>{categories}"
+            f"<pubDate>{http_date(entry.created_at)}</pubDate></item>"
+        )
+    last_build = max((entry.updated_at for entry in entries), default=None)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+        f"<title>{escape(title)}</title><link>{escape(link)}</link>"
+        f"<description>{escape(title)}</description>"
+        f'<atom:link href={quoteattr(self_link)} rel="self" type="application/rss+xml"/>'
+        + (f"<lastBuildDate>{http_date(last_build)}</lastBuildDate>" if last_build else "")
+        + "".join(items)
+        + "</channel></rss>\n"
+    ).encode()
+
+
+def render_urlset(base_url: str, ids: list[int], lastmod: dict[int, datetime]) -> bytes:
+    urls = "".join(
+        f"<url><loc>{escape(base_url)}blogs/{blog_id}/</loc>"
+        f"<lastmod>{_w3c_date(lastmod[blog_id])}</lastmod></url>"
+        for blog_id in ids
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>\n'
+    ).encode()
+
+
+def render_sitemap_index(base_url: str, parts: list[datetime | None]) -> bytes:
+    sitemaps = "".join(
+        f"<sitemap><loc>{escape(base_url)}sitemap-{number}.xml</loc>"
+        + (f"<lastmod>{_w3c_date(modified)}</lastmod>" if modified else "")
+        + "</sitemap>"
+        for number, modified in enumerate(parts, start=1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f"{sitemaps}</sitemapindex>\n"
+    ).encode()
+
+
+class FeedStore:
+    """
+    Ленты RSS (/feed.xml: общая, по автору, по тегу) и sitemap в памяти
+    воркера в виде готовых байтов, которые отдаются с ETag без обращения к БД.
+
+    Обновляются по журналу изменений (core.changes.ChangeFeed): создание,
+    смена статуса и удаление блога сбрасывают только общую ленту, ленту его
+    автора и ленты его тегов. Лента пересобирается при следующем запросе:
+    один запрос id по индексу, из БД читаются только записи, которых нет
+    в памяти. Sitemap загружается при старте (id и время изменения всех
+    опубликованных блогов, включая архив) и поправляется только по блогам
+    из журнала; пересобираются файлы, начиная с того, где оказалось первое
+    изменение. Больше sitemap_chunk адресов - /sitemap.xml становится
+    индексом файлов /sitemap-N.xml.
+    """
+
+    def __init__(self, config: FeedsConfig):
+        self.config = config
+        self.loaded = False
+        self.flights = SingleFlight("Ленты RSS и sitemap")
+        self._entries: OrderedDict[int, FeedEntry] = OrderedDict()
+        self._feeds: OrderedDict[FeedKey, list[int]] = OrderedDict()
+        self._documents: OrderedDict[tuple, XmlDocument] = OrderedDict()
+        self._tag_ids: dict[str, int] = {}
+        self._lastmod: dict[int, datetime] = {}
+        self._sitemap_ids: list[int] = []  # по возрастанию
+        self._dirty: set[int] = set()  # блоги из журнала, ещё не применённые к sitemap
+        # растёт при каждом изменении: ленту, собранную во время изменения, не сохраняем
+        self._version = 0
+
+    async def load(self, session: AsyncSession) -> None:
+        if not self.config.enabled:
+            return
+        self._lastmod = await get_sitemap_rows(session)
+        self._sitemap_ids = sorted(self._lastmod)
+        self.loaded = True
+        logger.info("Sitemap загружен: %s адресов" % len(self._sitemap_ids))
+
+    def base_url(self, request: Request) -> str:
+        return (self.config.site_url or str(request.base_url)).rstrip("/") + "/"
+
+    def apply(self, events: list[BlogChangeEvent]) -> None:
+        # перенос в архив не меняет ни адрес, ни содержимое блога
+        events = [e for e in events if e.affects_listing and e.kind != "archived"]
+        if not events:
+            return
+        self._version += 1
+        feeds: set[FeedKey] = {("all",)}
+        for event in events:
+            self._entries.pop(event.blog_id, None)
+            self._dirty.add(event.blog_id)
+            if event.author is not None:
+                feeds.add(("author", event.author))
+            feeds.update(("tag", tag_id) for tag_id in event.tag_ids)
+        for key in feeds:
+            self._feeds.pop(key, None)
+        for doc_key in [k for k in self._documents if k[0] == "feed" and k[1] in feeds]:
+            del self._documents[doc_key]
+
+    async def tag_id(self, name: str) -> int | None:
+        name = name.lower()
+        if name not in self._tag_ids:
+            async with read_session_factory()() as session:
+                tag_id = await get_tag_id(session, name)
+            if tag_id is None:
+                return None
+            self._tag_ids[name] = tag_id
+        return self._tag_ids[name]
+
+    def _remember(self, doc_key: tuple, document: XmlDocument) -> None:
+        self._documents[doc_key] = document
+        self._documents.move_to_end(doc_key)
+        while len(self._documents) > self.config.cache_size:
+            self._documents.popitem(last=False)
+
+    async def feed(self, key: FeedKey, title: str, query: dict, base_url: str) -> XmlDocument:
+        doc_key = ("feed", key, base_url)
+        document = self._documents.get(doc_key)
+        if document is not None:
+            self._documents.move_to_end(doc_key)
+            return document
+        return await self.flights.do(
+            doc_key, lambda: self._build_feed(key, title, query, base_url)
+        )
+
+    async def _build_feed(
+        self, key: FeedKey, title: str, query: dict, base_url: str
+    ) -> XmlDocument:
+        version = self._version
+        ids = self._feeds.get(key) if self.config.enabled else None
+        entries = {i: self._entries[i] for i in ids or () if i in self._entries}
+        async with read_session_factory()() as session:
+            if ids is None:
+                ids = await get_feed_blog_ids(
+                    session,
+                    author_id=key[1] if key[0] == "author" else None,
+                    tag_id=key[1] if key[0] == "tag" else None,
+                    limit=self.config.size,
+                )
+            missing = [i for i in ids if i not in entries and i not in self._entries]
+            for blog in await get_feed_blogs(session, missing) if missing else ():
+                entries[blog.id] = FeedEntry(
+                    id=blog.id,
+                    title=blog.title,
+                    description=blog.short_description,
+                    author_name=f"{blog.user.first_name} {blog.user.last_name}",
+                    tags=tuple(sorted(tag.name for tag in blog.tags)),
+                    created_at=blog.created_at,
+                    updated_at=blog.updated_at,
+                )
+        for i in ids:
+            if i not in entries and i in self._entries:
+                entries[i] = self._entries[i]
+        feed = [entries[i] for i in ids if i in entries]
+        if key[0] == "author" and feed:
+            title = f"{title}: {feed[0].author_name}"
+
+        link = f"{base_url}blogs/" + (f"?{urlencode(query)}" if query else "")
+        self_link = f"{base_url}feed.xml" + (f"?{urlencode(query)}" if query else "")
+        document = XmlDocument(
+            body=render_rss(title, link, self_link, base_url, feed),
+            etag=make_etag("feed", key, title, base_url, [(e.id, e.updated_at) for e in feed]),
+            last_modified=max((e.updated_at for e in feed), default=None),
+        )
+        if self.config.enabled and version == self._version:
+            self._feeds[key] = ids
+            self._feeds.move_to_end(key)
+            while len(self._feeds) > self.config.cache_size:
+                self._feeds.popitem(last=False)
+            for entry in feed:
+                self._entries[entry.id] = entry
+                self._entries.move_to_end(entry.id)
+            while len(self._entries) > self.config.entry_cache_size:
+                self._entries.popitem(last=False)
+            self._remember(("feed", key, base_url), document)
+        return document
+
+    async def sitemap(self, part: int | None, base_url: str) -> XmlDocument | None:
+        """
+        part None - /sitemap.xml: все адреса или индекс файлов, если их больше
+        sitemap_chunk; иначе файл /sitemap-{part}.xml. None - такого файла нет.
+        """
+        if not self.loaded:
+            async with read_session_factory()() as session:
+                lastmod = await get_sitemap_rows(session)
+            return self._render_sitemap(part, base_url, sorted(lastmod), lastmod)
+
+        if self._dirty:
+            await self.flights.do("sitemap-sync", self._sync_sitemap)
+        doc_key = ("sitemap", part, base_url)
+        document = self._documents.get(doc_key)
+        if document is None:
+            document = self._render_sitemap(part, base_url, self._sitemap_ids, self._lastmod)
+            if document is not None:
+                self._remember(doc_key, document)
+        return document
+
+    def _render_sitemap(
+        self, part: int | None, base_url: str, ids: list[int], lastmod: dict[int, datetime]
+    ) -> XmlDocument | None:
+        chunk = self.config.sitemap_chunk
+        parts = max(1, (len(ids) + chunk - 1) // chunk)
+        if part is None and parts > 1:
+            modified = [
+                max(lastmod[i] for i in ids[start:start + chunk])
+                for start in range(0, len(ids), chunk)
+            ]
+            body = render_sitemap_index(base_url, modified)
+            last_modified = max(modified)
+        else:
+            number = part or 1
+            if not 1 <= number <= parts:
+                return None
+            window = ids[(number - 1) * chunk:number * chunk]
+            body = render_urlset(base_url, window, lastmod)
+            last_modified = max((lastmod[i] for i in window), default=None)
+        etag = make_etag("sitemap", part, blake2b(body, digest_size=16).digest())
+        return XmlDocument(body=body, etag=etag, last_modified=last_modified)
+
+    async def _sync_sitemap(self) -> None:
+        dirty, self._dirty = self._dirty, set()
+        try:
+            async with db_helper.session_factory() as session:
+                rows = await get_sitemap_rows(session, list(dirty))
+        except Exception:
+            self._dirty |= dirty
+            raise
+        ids = self._sitemap_ids
+        first = None  # позиция первого изменившегося адреса
+        for blog_id in sorted(dirty):
+            i = bisect_left(ids, blog_id)
+            present = i < len(ids) and ids[i] == blog_id
+            if blog_id in rows:
+                if not present:
+                    ids.insert(i, blog_id)
+                if not present or self._lastmod.get(blog_id) != rows[blog_id]:
+                    first = i if first is None else min(first, i)
+                self._lastmod[blog_id] = rows[blog_id]
+            elif present:
+                del ids[i]
+                del self._lastmod[blog_id]
+                first = i if first is None else min(first, i)
+        if first is None:
+            return
+        # файлы до первого изменения остались прежними
+        first_part = first // self.config.sitemap_chunk + 1
+        for doc_key in [k for k in self._documents if k[0] == "sitemap"]:
+            if doc_key[1] is None or doc_key[1] >= first_part:
+                del self._documents[doc_key]
+
+
+feed_store = FeedStore(settings.feeds)
+change_feed.subscribe(feed_store.apply)
@@ -0,0 +1,94 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import suppress
+from datetime import datetime
+from logging import getLogger
+
+from sqlalchemy import select
+
+from core.changes import change_feed, BlogChangeEvent
+from core.models.base import Blog
+from core.models.db_helper import db_helper
+
+logger = getLogger(__name__)
+
+# HTML уже отрендеренных блогов; версия записи (updated_at) входит в ключ
+RENDER_CACHE_SIZE = 256
+
+
+def render_markdown(content: str) -> str:
+    import markdown2  # нужен только странице блога
+
+    return markdown2.markdown(content, extras=['fenced-code-blocks', 'tables'])
+
+
+class RenderedBlogs:
+    """
+    LRU HTML блогов в памяти воркера.
+
+    Кэш у каждого воркера свой, поэтому его обслуживает журнал изменений
+    (core.changes.ChangeFeed), который приходит во все воркеры, а не очередь
+    задач, где задачу выполнил бы один случайный воркер: опубликованный блог
+    рендерится заранее, удалённый убирается из кэша.
+    """
+
+    def __init__(self, size: int = RENDER_CACHE_SIZE):
+        self.size = size
+        self._html: OrderedDict[tuple[int, datetime], str] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+    def render(self, blog_id: int, updated_at: datetime, content: str) -> str:
+        key = (blog_id, updated_at)
+        html = self._html.get(key)
+        if html is not None:
+            self._html.move_to_end(key)
+            return html
+        html = render_markdown(content)
+        self._html[key] = html
+        if len(self._html) > self.size:
+            self._html.popitem(last=False)
+        return html
+
+    def purge(self, blog_ids: set[int]) -> None:
+        for key in [key for key in self._html if key[0] in blog_ids]:
+            del self._html[key]
+
+    def apply(self, events: list[BlogChangeEvent]) -> None:
+        self.purge({event.blog_id for event in events if event.kind == "deleted"})
+        # перенесённый в архив блог из blogs уже не прочитать
+        published = [
+            event.blog_id for event in events if event.published and event.kind != "archived"
+        ]
+        if published:
+            task = asyncio.create_task(self._prerender(published))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _prerender(self, blog_ids: list[int]) -> None:
+        """Рендер markdown опубликованных блогов до первого просмотра."""
+        try:
+            # основная БД: копия для чтения могла ещё не получить изменение
+            async with db_helper.session_factory() as session:
+                query = select(Blog.id, Blog.updated_at, Blog.content).where(
+                    Blog.id.in_(blog_ids), Blog.status == "published"
+                )
+                rows = (await session.execute(query)).all()
+            for row in rows:
+                self.render(row.id, row.updated_at, row.content)
+                # рендер - работа CPU: между блогами отдаём цикл запросам
+                await asyncio.sleep(0)
+        except Exception as e:
+            logger.error("Ошибка при рендере блогов %s: %s" % (blog_ids, e))
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._html.clear()
+
+
+rendered_blogs = RenderedBlogs()
+change_feed.subscribe(rendered_blogs.apply)
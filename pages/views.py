@@ -1,47 +1,124 @@
+import math
+from functools import lru_cache
 from logging import getLogger
+from typing import TYPE_CHECKING
 
-from fastapi import APIRouter, Depends, Request
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.schemes import BlogFullResponse, BlogNotFind
-from api.views import get_blog_info
+from api.schemes import BlogFullResponse
 from api.dependencies import get_current_user_optional
-from api.crud import get_blog_list
-import markdown2
+from api.crud import get_blog_meta, get_blog_titles, get_top_tags
+from api.listing import BlogListFilters
+from api.listing_cache import listing_cache
+from api.utils import make_etag, cache_headers, is_not_modified
+from api.blog_reads import get_full_blog_info_shared
+from api.counters import view_counter
+from api.tag_index import related_blog_ids
+from pages.feeds import feed_store, XmlDocument
+from pages.render import rendered_blogs
 
+from core.config import settings
 from core.models.base import User
 from core.models.db_helper import db_helper
 from auth.views import auth_user
 
 logger = getLogger(__name__)
 
+if TYPE_CHECKING:
+    from fastapi.templating import Jinja2Templates
+
 router = APIRouter(tags=['ФРОНТЕНД'])
 
-templates = Jinja2Templates(directory='templates')
+
+@lru_cache
+def get_templates() -> "Jinja2Templates":
+    # Jinja импортируется и настраивается при первом рендере (или при прогреве)
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory='templates')
+
+
+# Сколько похожих блогов показывать под статьёй
+RELATED_LIMIT = 5
+
 
 @router.get('/blogs/{blog_id}/')
 async def get_blog_post(
         request: Request,
         blog_id: int,
-        blog_info: BlogFullResponse | BlogNotFind = Depends(get_blog_info),
+        session: AsyncSession = Depends(db_helper.session_dependency),
         user_data: User | None = Depends(get_current_user_optional)
 ):
+    current_user_id = user_data.id if user_data else None
+
+    meta = await get_blog_meta(session=session, blog_id=blog_id)
+    headers = {}
+    related_ids = []
+    if meta and (meta.status == "published" or meta.author == current_user_id):
+        related_ids = await related_blog_ids(session, blog_id, RELATED_LIMIT)
+        # Страница зависит от текущего пользователя (кнопки автора), поэтому
+        # он входит в ETag, а для авторизованных ответ не должен попадать в общий кэш.
+        # Блок похожих блогов меняется без изменения самого блога - его id тоже в ETag
+        etag = make_etag(
+            "page", meta.id, meta.updated_at, meta.status, current_user_id, related_ids
+        )
+        headers = cache_headers(
+            etag,
+            meta.updated_at,
+            private=meta.status != "published" or current_user_id is not None,
+        )
+        if is_not_modified(request, etag, meta.updated_at):
+            # проверка актуальности кэша - не просмотр
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        if meta.status == "published":
+            view_counter.hit(blog_id)
+
+    # соединение сессии страницы не держим, пока общее чтение ждёт своё
+    await session.close()
+    blog_info = await get_full_blog_info_shared(
+        blog_id=blog_id, author_id=current_user_id
+    )
     if isinstance(blog_info, dict):
-        return templates.TemplateResponse(
+        return get_templates().TemplateResponse(
             "404.html", {"request": request, "blog_id": blog_id}
         )
     else:
         blog = BlogFullResponse.model_validate(blog_info).model_dump()
         # Преобразование Markdown в HTML
-        blog['content'] = markdown2.markdown(blog['content'], extras=['fenced-code-blocks', 'tables'])
+        blog['content'] = rendered_blogs.render(blog_id, blog_info.updated_at, blog['content'])
+        related = await get_blog_titles(session=session, ids=related_ids)
         logger.info("blogs_id: %s" % blog_id)
-        return templates.TemplateResponse(
+        return get_templates().TemplateResponse(
             "post.html",
-            {"request": request, "article": blog, "current_user_id": user_data.id if user_data else None}
+            {
+                "request": request,
+                "article": blog,
+                "related": related,
+                "current_user_id": current_user_id,
+            },
+            headers=headers,
         )
     
 
+def tag_cloud_weights(tags) -> list[dict]:
+    """Размер шрифта тега (1-5) в облаке по логарифму числа блогов, по алфавиту."""
+    if not tags:
+        return []
+    low = math.log(min(t.count for t in tags))
+    high = math.log(max(t.count for t in tags))
+    spread = (high - low) or 1.0
+    cloud = [
+        {
+            "name": t.name,
+            "count": t.count,
+            "weight": 1 + round(4 * (math.log(t.count) - low) / spread),
+        }
+        for t in tags
+    ]
+    return sorted(cloud, key=lambda t: t["name"])
+
+
 @router.get('/blogs/')
 async def get_blog_posts(
         request: Request,
@@ -51,29 +128,85 @@ async def get_blog_posts(
         page_size: int = 3,
         session: AsyncSession = Depends(db_helper.session_dependency),
 ):
-    blogs = await get_blog_list(
-        session=session,
-        author_id=author_id,
-        tag=tag,
-        page=page,
-        page_size=page_size
+    filters = BlogListFilters(author_id=author_id, tag=tag)
+    # Облако тегов - короткий запрос по индексу tag_stats; оно тоже входит в ETag
+    tag_cloud = await get_top_tags(session=session, limit=settings.tag_stats.cloud_size)
+    cloud_part = [tuple(t) for t in tag_cloud]
+    # лента читается в своей сессии - соединение этой отдаём обратно в пул
+    await session.close()
+    cached = await listing_cache.get(
+        filters,
+        page,
+        page_size,
+        unchanged=lambda parts: is_not_modified(
+            request, make_etag("page-blogs", *parts, cloud_part)
+        ),
     )
+    etag = make_etag("page-blogs", *cached.etag_parts, cloud_part)
+    headers = cache_headers(etag, cached.last_modified)
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    blogs = cached.data
     logger.info("blogs: %s" % blogs)
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "posts.html",
         {
             "request": request,
             "article": blogs,
+            "tag_cloud": tag_cloud_weights(tag_cloud),
             "filters": {
                 "author_id": author_id,
                 "tag": tag,
             }
-        }
+        },
+        headers=headers,
     )
 
+def xml_response(request: Request, document: XmlDocument, media_type: str) -> Response:
+    headers = cache_headers(document.etag, document.last_modified)
+    if is_not_modified(request, document.etag, document.last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(document.body, media_type=media_type, headers=headers)
+
+
+@router.get('/feed.xml')
+async def get_feed(
+        request: Request,
+        author_id: int | None = None,
+        tag: str | None = None,
+):
+    title = settings.feeds.title
+    if tag is not None:
+        tag_id = await feed_store.tag_id(tag)
+        if tag_id is None:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+        key, query, title = ("tag", tag_id), {"tag": tag.lower()}, f"{title}: #{tag.lower()}"
+    elif author_id is not None:
+        key, query = ("author", author_id), {"author_id": author_id}
+    else:
+        key, query = ("all",), {}
+    document = await feed_store.feed(key, title, query, feed_store.base_url(request))
+    return xml_response(request, document, "application/rss+xml")
+
+
+@router.get('/sitemap.xml')
+async def get_sitemap(request: Request):
+    document = await feed_store.sitemap(None, feed_store.base_url(request))
+    return xml_response(request, document, "application/xml")
+
+
+@router.get('/sitemap-{part}.xml')
+async def get_sitemap_part(request: Request, part: int):
+    document = await feed_store.sitemap(part, feed_store.base_url(request))
+    if document is None:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    return xml_response(request, document, "application/xml")
+
+
 @router.get("/login/")
 async def login(request: Request):
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "login.html",
         {
             "request": request,
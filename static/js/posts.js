@@ -0,0 +1,29 @@
+// Уведомление о новых публикациях без опроса /api/blogs/: поток SSE с теми же фильтрами
+document.addEventListener('DOMContentLoaded', () => {
+    const notice = document.querySelector('.new-posts-notice');
+    if (!notice || !window.EventSource) {
+        return;
+    }
+
+    const params = new URLSearchParams();
+    if (notice.dataset.authorId) {
+        params.set('author_id', notice.dataset.authorId);
+    }
+    if (notice.dataset.tag) {
+        params.set('tag', notice.dataset.tag);
+    }
+
+    // При обрыве EventSource сам переподключается с Last-Event-ID
+    const source = new EventSource(`/api/blogs/stream?${params}`);
+    const seen = new Set();
+    const show = () => {
+        notice.querySelector('.new-posts-count').textContent = seen.size;
+        notice.hidden = false;
+    };
+    source.addEventListener('published', (event) => {
+        seen.add(JSON.parse(event.data).blog_id);
+        show();
+    });
+    // Пропущено слишком много событий: достаточно предложить обновить страницу
+    source.addEventListener('reset', show);
+});
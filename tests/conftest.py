@@ -0,0 +1,139 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.testclient import TestClient
+
+from core.config import (
+    AdmissionConfig,
+    ArchiveConfig,
+    AuthJWT,
+    DataBaseConfig,
+    JobsConfig,
+    Settings,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def migrated_db(tmp_path_factory) -> Path:
+    """Пустая БД со всеми миграциями; тесты получают её копию."""
+    path = tmp_path_factory.mktemp("template") / "db_sql.db"
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=ROOT,
+        env={**os.environ, "DB__URL": f"sqlite+aiosqlite:///{path}", "DB__ECHO": "false"},
+        check=True,
+        capture_output=True,
+    )
+    # справочник ролей миграции не заполняют; id - как в db_sql.db
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO roles (id, name) VALUES (?, ?)",
+            [(1, "user"), (2, "admin"), (3, "super_admin")],
+        )
+    conn.close()
+    return path
+
+
+@pytest.fixture(scope="session")
+def jwt_keys(tmp_path_factory) -> AuthJWT:
+    """Ключи RS256 для токенов: каталога cert/ в репозитории нет."""
+    folder = tmp_path_factory.mktemp("cert")
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private = folder / "private.pem"
+    public = folder / "public.pem"
+    private.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    public.write_bytes(
+        key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+    )
+    return AuthJWT(private_key_path=private, public_key_path=public)
+
+
+@pytest.fixture
+def db_config(migrated_db, tmp_path) -> DataBaseConfig:
+    path = tmp_path / "db_sql.db"
+    shutil.copy(migrated_db, path)
+    return DataBaseConfig(url=f"sqlite+aiosqlite:///{path}", echo=False)
+
+
+@pytest.fixture
+def settings(db_config, jwt_keys, tmp_path) -> Settings:
+    return Settings(
+        db=db_config,
+        auth_jwt=jwt_keys,
+        admission=AdmissionConfig(enabled=False),
+        archive=ArchiveConfig(path=tmp_path / "db_archive.db"),
+        # фоновые задачи проверяются отдельно, в test_jobs.py
+        jobs=JobsConfig(enabled=False),
+    )
+
+
+@pytest.fixture
+def client(settings):
+    from main import create_app
+
+    with TestClient(create_app(settings)) as client:
+        yield client
+
+
+@pytest.fixture
+async def database(db_config):
+    """db_helper на копии БД - для тестов подсистем без приложения."""
+    from core.models.db_helper import db_helper
+
+    db_helper.configure_from(db_config)
+    yield db_helper
+    await db_helper.dispose()
+
+
+def login(client: TestClient, email: str, password: str = "secret1") -> None:
+    """Регистрирует пользователя и входит: cookie access_token остаётся в client."""
+    client.post(
+        "/auth/register/",
+        json={
+            "email": email,
+            "phone_number": "+7%010d" % (zlib.crc32(email.encode()) % 10**10),
+            "first_name": "Test",
+            "last_name": "User",
+            "password": password,
+            "confirm_password": password,
+        },
+    )
+    response = client.post("/auth/login/", data={"email": email, "password": password})
+    assert response.status_code == 200, response.text
+
+
+def add_post(client: TestClient, title: str, tags: list[str] | None = None, content: str = "Текст") -> int:
+    response = client.post(
+        "/api/add_post/",
+        json={
+            "title": title,
+            "content": content,
+            "short_description": "Описание",
+            "tags": tags or [],
+        },
+    )
+    assert response.status_code == 200, response.text
+    return int(response.json()["message"].split("ID ")[1].split()[0])
@@ -0,0 +1,57 @@
+from conftest import add_post, login
+
+MISSING_ID = 10_000
+
+
+def test_bulk_status_report(client):
+    login(client, "other@example.com")
+    foreign = add_post(client, "Чужой блог")
+    login(client, "author@example.com")
+    first = add_post(client, "Первый блог автора")
+    second = add_post(client, "Второй блог автора")
+
+    response = client.put(
+        "/api/blogs/bulk_status",
+        json={"ids": [first, second, first, foreign, MISSING_ID], "new_status": "draft"},
+    )
+    assert response.status_code == 200
+    report = response.json()
+    # повтор id в запросе не дублирует его в отчёте
+    assert sorted(report["updated"]) == [first, second]
+    assert report["forbidden"] == [foreign]
+    assert report["not_found"] == [MISSING_ID]
+    assert report["unchanged"] == []
+
+    again = client.put(
+        "/api/blogs/bulk_status", json={"ids": [first, second], "new_status": "draft"}
+    ).json()
+    assert again["updated"] == []
+    assert sorted(again["unchanged"]) == [first, second]
+
+
+def test_bulk_status_rejects_unknown_status(client):
+    login(client, "author@example.com")
+    blog_id = add_post(client, "Блог автора")
+
+    response = client.put(
+        "/api/blogs/bulk_status", json={"ids": [blog_id], "new_status": "archived"}
+    )
+    assert response.status_code == 400
+
+
+def test_bulk_delete_report(client):
+    login(client, "other@example.com")
+    foreign = add_post(client, "Чужой блог")
+    login(client, "author@example.com")
+    own = add_post(client, "Блог автора", tags=["python"])
+
+    response = client.post("/api/blogs/bulk_delete", json={"ids": [own, foreign, MISSING_ID]})
+    assert response.status_code == 200
+    report = response.json()
+    assert report["deleted"] == [own]
+    assert report["forbidden"] == [foreign]
+    assert report["not_found"] == [MISSING_ID]
+    assert "unchanged" not in report
+
+    assert client.get(f"/api/get_blog/{own}").json()["status"] == "error"
+    assert client.get(f"/api/get_blog/{foreign}").status_code == 200
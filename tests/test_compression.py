@@ -0,0 +1,70 @@
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+from conftest import add_post, login
+from core.config import CompressionConfig
+from core.compression import CompressionMiddleware
+
+GZIP = {"Accept-Encoding": "gzip"}
+LONG_TEXT = "Длинный текст блога, который стоит сжимать. " * 100
+
+
+def test_blog_compressed_and_revalidated(client):
+    login(client, "author@example.com")
+    blog_id = add_post(client, "Длинный блог", content=LONG_TEXT)
+
+    plain = client.get(f"/api/get_blog/{blog_id}", headers={"Accept-Encoding": "identity"})
+    compressed = client.get(f"/api/get_blog/{blog_id}", headers=GZIP)
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert int(compressed.headers["content-length"]) < len(plain.content)
+    assert compressed.json()["content"] == plain.json()["content"]
+    # ETag слабый: сжатое и несжатое представления равнозначны
+    assert compressed.headers["etag"] == plain.headers["etag"]
+
+    revalidated = client.get(
+        f"/api/get_blog/{blog_id}", headers={**GZIP, "If-None-Match": compressed.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+    assert "content-encoding" not in revalidated.headers
+
+
+def make_client(body: list[bytes]) -> TestClient:
+    """Приложение с постоянным ETag и телом, которое тест меняет (как счётчик просмотров)."""
+
+    async def endpoint(request):
+        return Response(
+            body[0],
+            media_type="application/json",
+            headers={"ETag": 'W/"same"', "Cache-Control": "public, no-cache"},
+        )
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    return TestClient(CompressionMiddleware(app, CompressionConfig(minimum_size=10)))
+
+
+def test_cached_compression_follows_body():
+    body = [b'{"views": 1, "text": "' + b"x" * 2000 + b'"}']
+    client = make_client(body)
+
+    first = client.get("/", headers=GZIP)
+    body[0] = body[0].replace(b'"views": 1', b'"views": 2')
+    second = client.get("/", headers=GZIP)
+
+    # тело изменилось при том же ETag - кэш сжатых тел не должен отдать старое
+    assert first.json()["views"] == 1
+    assert second.json()["views"] == 2
+
+
+def test_identical_body_served_from_cache():
+    client = make_client([b'{"text": "' + b"y" * 2000 + b'"}'])
+
+    first = client.get("/", headers=GZIP)
+    second = client.get("/", headers=GZIP)
+
+    assert "cache-hit" not in first.headers["server-timing"]
+    assert "cache-hit" in second.headers["server-timing"]
+    assert second.content == first.content
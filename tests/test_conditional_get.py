@@ -0,0 +1,67 @@
+from conftest import add_post, login
+
+# без сжатия: его проверяет test_compression.py
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+def test_blog_not_modified_by_etag(client):
+    login(client, "author@example.com")
+    blog_id = add_post(client, "Блог для ETag")
+
+    response = client.get(f"/api/get_blog/{blog_id}", headers=IDENTITY)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "public, no-cache"
+
+    revalidated = client.get(
+        f"/api/get_blog/{blog_id}", headers={**IDENTITY, "If-None-Match": etag}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+
+def test_blog_not_modified_since(client):
+    login(client, "author@example.com")
+    blog_id = add_post(client, "Блог для Last-Modified")
+
+    response = client.get(f"/api/get_blog/{blog_id}", headers=IDENTITY)
+    last_modified = response.headers["last-modified"]
+
+    revalidated = client.get(
+        f"/api/get_blog/{blog_id}", headers={**IDENTITY, "If-Modified-Since": last_modified}
+    )
+    assert revalidated.status_code == 304
+
+
+def test_blog_etag_changes_with_status(client):
+    login(client, "author@example.com")
+    blog_id = add_post(client, "Блог, снятый с публикации")
+    etag = client.get(f"/api/get_blog/{blog_id}", headers=IDENTITY).headers["etag"]
+
+    client.put(f"/api/change_blog_status/{blog_id}", params={"new_status": "draft"})
+
+    response = client.get(
+        f"/api/get_blog/{blog_id}", headers={**IDENTITY, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    # черновик видит только автор: общим кэшам его хранить нельзя
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_listing_not_modified_until_new_blog(client):
+    login(client, "author@example.com")
+    add_post(client, "Первый блог ленты")
+
+    response = client.get("/api/blogs/", headers=IDENTITY)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert client.get("/api/blogs/", headers={**IDENTITY, "If-None-Match": etag}).status_code == 304
+
+    add_post(client, "Второй блог ленты")
+
+    response = client.get("/api/blogs/", headers={**IDENTITY, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["total_result"] == 2
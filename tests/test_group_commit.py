@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models.base import Tag
+from core.models.db_helper import DBHelper
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def writer_db(db_config):
+    # linger с запасом: все единицы теста попадают в одну пачку
+    helper = DBHelper(
+        url=db_config.url, journal_mode="wal", group_commit=True, write_linger=0.05
+    )
+    yield helper
+    await helper.dispose()
+
+
+def add_tag(name: str):
+    async def unit(session: AsyncSession) -> str:
+        await session.execute(insert(Tag).values(name=name))
+        return name
+
+    return unit
+
+
+def rollback_after(name: str):
+    async def unit(session: AsyncSession) -> None:
+        await session.execute(insert(Tag).values(name=name))
+        await session.rollback()
+
+    return unit
+
+
+async def tag_names(helper: DBHelper) -> set[str]:
+    async with helper.session_factory() as session:
+        return set((await session.execute(select(Tag.name))).scalars())
+
+
+async def test_failed_unit_rolls_back_only_itself(writer_db):
+    await writer_db.write(add_tag("taken"))
+
+    first, duplicate, last = await asyncio.gather(
+        writer_db.write(add_tag("first")),
+        writer_db.write(add_tag("taken")),
+        writer_db.write(add_tag("last")),
+        return_exceptions=True,
+    )
+
+    assert (first, last) == ("first", "last")
+    assert isinstance(duplicate, IntegrityError)
+    assert await tag_names(writer_db) == {"taken", "first", "last"}
+
+
+async def test_unit_ending_transaction_fails_whole_batch(writer_db):
+    results = await asyncio.gather(
+        writer_db.write(add_tag("first")),
+        writer_db.write(rollback_after("rollback")),
+        writer_db.write(add_tag("last")),
+        return_exceptions=True,
+    )
+
+    # rollback() откатил пачку целиком: успех нельзя сообщать никому
+    assert all(isinstance(result, Exception) for result in results)
+    assert await tag_names(writer_db) == set()
+
+    # писатель продолжает работать после неудачной пачки
+    assert await writer_db.write(add_tag("after")) == "after"
+    assert await tag_names(writer_db) == {"after"}
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from core.config import JobsConfig
+from core.jobs import JobQueue, _utcnow
+from core.models.base import Job
+
+pytestmark = pytest.mark.anyio
+
+
+class FailingHandler:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self, payload: dict) -> None:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("сбой %s" % self.calls)
+
+
+async def enqueue(database, queue: JobQueue, job_type: str, key: str | None = None) -> None:
+    async with database.session_factory() as session:
+        await queue.enqueue(session, job_type, {"blog_id": 1}, idempotency_key=key)
+        await session.commit()
+
+
+async def run_pass(queue: JobQueue) -> None:
+    """Один проход поллера: захват задач и ожидание их завершения."""
+    await queue._claim_and_run()
+    if queue._running:
+        await asyncio.wait(queue._running)
+
+
+async def all_jobs(database) -> list[Job]:
+    async with database.session_factory() as session:
+        return list((await session.execute(select(Job).order_by(Job.id))).scalars())
+
+
+async def test_failed_job_retried_after_backoff(database):
+    queue = JobQueue(JobsConfig(backoff_base=60))
+    handler = FailingHandler(failures=1)
+    queue.register("test.job")(handler)
+    await enqueue(database, queue, "test.job")
+
+    await run_pass(queue)
+    [job] = await all_jobs(database)
+    assert job.status == "pending"
+    assert job.attempts == 1
+    assert "сбой 1" in job.last_error
+    assert job.run_after > _utcnow() + timedelta(seconds=50)
+
+    # задержка повтора ещё не прошла
+    await run_pass(queue)
+    assert handler.calls == 1
+
+
+async def test_job_failed_after_max_attempts(database):
+    queue = JobQueue(JobsConfig(backoff_base=0))
+    handler = FailingHandler(failures=10)
+    queue.register("test.job", max_attempts=2)(handler)
+    await enqueue(database, queue, "test.job")
+
+    for _ in range(3):
+        await run_pass(queue)
+
+    [job] = await all_jobs(database)
+    assert handler.calls == 2
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert job.locked_until is None
+
+
+async def test_expired_lease_claimed_again(database):
+    queue = JobQueue(JobsConfig())
+    handler = FailingHandler(failures=0)
+    queue.register("test.job")(handler)
+    await enqueue(database, queue, "test.job", key="expired")
+    await enqueue(database, queue, "test.job", key="leased")
+
+    # обе задачи захвачены упавшим воркером; аренда первой истекла
+    now = _utcnow()
+    async with database.session_factory() as session:
+        for key, locked_until in (
+            ("expired", now - timedelta(seconds=1)),
+            ("leased", now + timedelta(minutes=5)),
+        ):
+            await session.execute(
+                update(Job)
+                .where(Job.idempotency_key == key)
+                .values(status="running", attempts=1, locked_until=locked_until)
+            )
+        await session.commit()
+
+    await run_pass(queue)
+
+    expired, leased = await all_jobs(database)
+    assert handler.calls == 1
+    assert (expired.status, expired.attempts) == ("done", 2)
+    assert (leased.status, leased.attempts) == ("running", 1)
+
+
+async def test_cleanup_expires_done_and_failed_jobs(database):
+    queue = JobQueue(JobsConfig(retention_hours=24, failed_retention_hours=168))
+    ages = {
+        "done-old": ("done", 25),
+        "done-new": ("done", 1),
+        "failed-old": ("failed", 169),
+        "failed-new": ("failed", 25),
+    }
+    for key in ages:
+        await enqueue(database, queue, "test.job", key=key)
+    async with database.session_factory() as session:
+        for key, (status, hours) in ages.items():
+            await session.execute(
+                update(Job)
+                .where(Job.idempotency_key == key)
+                .values(status=status, updated_at=_utcnow() - timedelta(hours=hours))
+            )
+        await session.commit()
+
+    await queue._cleanup()
+
+    assert [job.idempotency_key for job in await all_jobs(database)] == ["done-new", "failed-new"]
@@ -0,0 +1,99 @@
+import pytest
+
+import api.listing_cache
+from conftest import add_post, login
+from core.config import ListingCacheConfig
+
+
+@pytest.fixture
+def settings(settings):
+    # кэшируется только первая страница: вторая проверяет некэшируемый путь
+    settings.listing_cache = ListingCacheConfig(max_page=1)
+    return settings
+
+
+@pytest.fixture
+def page_loads(monkeypatch) -> list[int]:
+    """Номера страниц ленты, прочитанных из БД."""
+    loads = []
+    load_page = api.listing_cache.get_blog_listing_page
+
+    async def counting(session, listing, page, page_size):
+        loads.append(page)
+        return await load_page(session=session, listing=listing, page=page, page_size=page_size)
+
+    monkeypatch.setattr(api.listing_cache, "get_blog_listing_page", counting)
+    return loads
+
+
+def titles(response) -> list[str]:
+    return [blog["title"] for blog in response.json().get("blogs", [])]
+
+
+def test_cached_page_reset_by_new_blog(client, page_loads):
+    login(client, "author@example.com")
+    add_post(client, "Первый")
+
+    assert titles(client.get("/api/blogs/")) == ["Первый"]
+    assert titles(client.get("/api/blogs/")) == ["Первый"]
+    assert page_loads == [1]
+
+    add_post(client, "Второй")
+
+    assert sorted(titles(client.get("/api/blogs/"))) == ["Второй", "Первый"]
+    assert page_loads == [1, 1]
+
+
+def test_cached_page_reset_by_status_and_delete(client, page_loads):
+    login(client, "author@example.com")
+    draft = add_post(client, "Станет черновиком")
+    deleted = add_post(client, "Будет удалён")
+    add_post(client, "Останется")
+    assert len(titles(client.get("/api/blogs/"))) == 3
+
+    client.put(f"/api/change_blog_status/{draft}", params={"new_status": "draft"})
+    assert sorted(titles(client.get("/api/blogs/"))) == ["Будет удалён", "Останется"]
+
+    client.delete(f"/api/delete_blog/{deleted}")
+    assert titles(client.get("/api/blogs/")) == ["Останется"]
+    assert page_loads == [1, 1, 1]
+
+
+def test_author_page_kept_when_other_author_writes(client, page_loads):
+    login(client, "author@example.com")
+    add_post(client, "Блог автора")
+    author_id = client.get("/auth/me/").json()["id"]
+    client.get("/api/blogs/", params={"author_id": author_id})
+
+    login(client, "other@example.com")
+    add_post(client, "Блог другого автора")
+
+    assert titles(client.get("/api/blogs/", params={"author_id": author_id})) == ["Блог автора"]
+    assert page_loads == [1]
+
+
+def test_tag_page_reset_by_new_matching_tag(client, page_loads):
+    login(client, "author@example.com")
+    add_post(client, "Про JavaScript", tags=["javascript"])
+    assert titles(client.get("/api/blogs/", params={"tag": "py"})) == []
+
+    # тега python ещё не было: фильтр-подстрока должен его учесть
+    add_post(client, "Про Python", tags=["python"])
+
+    assert titles(client.get("/api/blogs/", params={"tag": "py"})) == ["Про Python"]
+    assert page_loads == [1, 1]
+
+
+def test_uncacheable_page_not_modified_without_loading(client, page_loads):
+    login(client, "author@example.com")
+    for number in range(11):
+        add_post(client, f"Блог {number}")
+
+    response = client.get("/api/blogs/", params={"page": 2})
+    assert titles(response) == ["Блог 10"]
+    etag = response.headers["etag"]
+
+    revalidated = client.get("/api/blogs/", params={"page": 2}, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    # совпадение ETag проверено по состоянию ленты, страница не читалась
+    assert page_loads == [2]